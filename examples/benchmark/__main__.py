@@ -0,0 +1,234 @@
+"""
+Reproducible benchmark of ingest and query throughput.
+
+Synthetic corpora of each size (10^3 to 10^6 chunks) are embedded with
+a deterministic fake embedding model and answered by a fake chat model,
+so the benchmark runs offline and every run sees the same data. The
+scenarios are:
+
+    ingest           embed and write the corpus in batches
+    ingest_pdf       the whole ingest pipeline over a synthetic PDF
+    retrieval        embed and search one query at a time
+    retrieval_batch  embed and search the queries in batches
+    mmr              maximal marginal relevance search
+    chat             `ChatService.send_message`, end to end
+
+Each size runs in its own process, so its peak RSS is not inflated by
+the sizes before it. The throughput, the p50 and p99 latency of each
+call and the peak RSS go to a JSON file, along with the commit and the
+settings, and can be compared with an earlier run:
+
+    python -m examples.benchmark --sizes 1000 10000 100000
+    python -m examples.benchmark --baseline benchmark_results/old.json
+
+Run from the repository root. The exit status is 1 when a result is
+worse than the baseline by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+from src.core import settings
+
+from .suite import BACKENDS, SCENARIOS, run
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m examples.benchmark",
+        description="Offline benchmark of ingest and query throughput.",
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+        help="corpus sizes, in chunks",
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS,
+    )
+    parser.add_argument("--backend", choices=BACKENDS, default="numpy")
+    parser.add_argument("--dimensions", type=int, default=128)
+    parser.add_argument(
+        "--queries", type=int, default=200,
+        help="timed queries per query scenario",
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=10,
+        help="untimed queries before each query scenario",
+    )
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_K)
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument(
+        "--batch-size", type=int, default=1_000,
+        help="chunks per ingest batch",
+    )
+    parser.add_argument(
+        "--query-batch-size", type=int, default=32,
+        help="queries per call in retrieval_batch",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--model-latency", type=float, default=0.0,
+        help="seconds the fake chat model takes per call",
+    )
+    parser.add_argument(
+        "--embed-latency", type=float, default=0.0,
+        help="seconds the fake embedding model takes per call",
+    )
+    parser.add_argument(
+        "--pdf-max-chunks", type=int, default=10_000,
+        help="largest PDF ingested by ingest_pdf",
+    )
+    parser.add_argument(
+        "--output",
+        help="JSON file of the results, by default under benchmark_results",
+    )
+    parser.add_argument("--baseline", help="JSON file of an earlier run")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="relative change from the baseline reported as a regression",
+    )
+    parser.add_argument(
+        "--in-process", action="store_true",
+        help="run every size in this process, e.g. under a profiler",
+    )
+    return parser.parse_args()
+
+
+def environment() -> dict:
+    """
+    What the results depend on besides the options: the commit, the
+    interpreter, the machine and the settings of the pipeline.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            name: getattr(settings, name)
+            for name in (
+                "CHUNK_SIZE",
+                "CHUNK_OVERLAP",
+                "RETRIEVAL_K",
+                "RETRIEVAL_OVERSAMPLING",
+                "RERANK_ENABLED",
+                "HYBRID_SEARCH_ENABLED",
+                "FACT_INDEX_ENABLED",
+                "CONTEXT_COMPRESSION_ENABLED",
+                "CONTEXT_MAX_TOKENS",
+            )
+        },
+    }
+
+
+def compare(
+    baseline: list[dict],
+    results: list[dict],
+    tolerance: float
+) -> bool:
+    """
+    Print the change of throughput and p99 latency of every result that
+    is also in the baseline.
+
+    Returns:
+        bool: Whether any result is worse by more than `tolerance`.
+    """
+    before = {(item["scenario"], item["chunks"]): item for item in baseline}
+    regressed = False
+    for item in results:
+        old = before.get((item["scenario"], item["chunks"]))
+        if old is None or not old["throughput"] or not old["p99_ms"]:
+            continue
+        throughput = item["throughput"] / old["throughput"] - 1
+        p99 = item["p99_ms"] / old["p99_ms"] - 1
+        worse = throughput < -tolerance or p99 > tolerance
+        regressed = regressed or worse
+        print(
+            f"{item['scenario']:<16} {item['chunks']:>9} "
+            f"throughput {throughput:+7.1%}  p99 {p99:+7.1%}"
+            + ("  REGRESSION" if worse else "")
+        )
+    return regressed
+
+
+def main() -> int:
+    arguments = parse_arguments()
+    options = {
+        "scenarios": arguments.scenarios,
+        "backend": arguments.backend,
+        "dimensions": arguments.dimensions,
+        "queries": arguments.queries,
+        "warmup": arguments.warmup,
+        "k": arguments.k,
+        "fetch_k": arguments.fetch_k,
+        "batch_size": arguments.batch_size,
+        "query_batch_size": arguments.query_batch_size,
+        "seed": arguments.seed,
+        "model_latency": arguments.model_latency,
+        "embed_latency": arguments.embed_latency,
+        "pdf_max_chunks": arguments.pdf_max_chunks,
+    }
+    report = {**environment(), "options": options, "results": []}
+
+    print(
+        f"{'scenario':<16} {'chunks':>9} {'throughput':>20} "
+        f"{'p50 ms':>9} {'p99 ms':>9} {'peak MiB':>9}"
+    )
+    for size in arguments.sizes:
+        if arguments.in_process:
+            results = run({**options, "size": size})
+        else:
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=get_context("spawn")
+            ) as pool:
+                results = pool.submit(run, {**options, "size": size}).result()
+        for item in results:
+            throughput = f"{item['throughput']:,.0f} {item['unit']}/s"
+            print(
+                f"{item['scenario']:<16} {item['chunks']:>9} "
+                f"{throughput:>20} {item['p50_ms']:>9.2f} "
+                f"{item['p99_ms']:>9.2f} {item['peak_rss_mb'] or 0:>9.0f}"
+            )
+        report["results"].extend(results)
+
+    output = arguments.output or os.path.join(
+        "benchmark_results",
+        "{}-{}.json".format(
+            datetime.now().strftime("%Y%m%d-%H%M%S"),
+            (report["commit"] or "unknown")[:8],
+        ),
+    )
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
+
+    if arguments.baseline:
+        with open(arguments.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        print(f"Compared with {arguments.baseline}:")
+        if compare(baseline, report["results"], arguments.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Synthetic corpora for the benchmark: chunks of text with the word
+statistics of natural language, queries over the same vocabulary, and
+PDF files holding the text.
+"""
+import textwrap
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class SyntheticCorpus:
+    """
+    Reproducible text whose words follow a Zipf distribution over a
+    fixed vocabulary, as in natural text, so the lexical index and the
+    embeddings see a few frequent words and a long tail of rare ones.
+
+    Every batch of chunks is drawn from a generator seeded with the seed
+    of the corpus and the position of the batch, so a chunk only depends
+    on the seed, its position and the batch size.
+
+    Attributes:
+        seed (int): Seed of the generators.
+        vocabulary (int): Number of distinct words.
+        words_per_chunk (int): Number of words in a chunk.
+        words_per_sentence (int): Number of words in a sentence.
+        chunks_per_page (int): Chunks attributed to each page in the
+            metadata.
+
+    Methods:
+        chunks(start: int, size: int) -> list[Document]:
+            The chunks at positions [start, start + size).
+        queries(count: int) -> list[str]:
+            Questions over the vocabulary.
+        pages(count: int, page_chars: int) -> list[str]:
+            Text of the pages of a document.
+        write_pdf(path: str, pages: list[str]) -> None:
+            Write pages of text as a PDF file.
+    """
+    def __init__(
+        self,
+        seed: int = 0,
+        vocabulary: int = 50_000,
+        words_per_chunk: int = 60,
+        words_per_sentence: int = 12,
+        chunks_per_page: int = 4,
+    ):
+        self.seed = seed
+        self.vocabulary = vocabulary
+        self.words_per_chunk = words_per_chunk
+        self.words_per_sentence = words_per_sentence
+        self.chunks_per_page = chunks_per_page
+        self._words = np.array([f"w{i}" for i in range(vocabulary)])
+
+    def chunks(self, start: int, size: int) -> list[Document]:
+        """
+        The chunks at positions [start, start + size).
+
+        Args:
+            start (int): Position of the first chunk.
+            size (int): Number of chunks.
+
+        Returns:
+            list[Document]: The chunks, with IDs "chunk-<position>".
+        """
+        rng = np.random.default_rng([self.seed, 0, start])
+        texts = self._texts(rng, size, self.words_per_chunk)
+        return [
+            Document(
+                page_content=text,
+                metadata={
+                    "source": "synthetic",
+                    "page": (start + offset) // self.chunks_per_page,
+                },
+                id=f"chunk-{start + offset}",
+            )
+            for offset, text in enumerate(texts)
+        ]
+
+    def queries(self, count: int) -> list[str]:
+        """
+        Questions made of a few words drawn like the words of the chunks.
+
+        Args:
+            count (int): Number of questions.
+
+        Returns:
+            list[str]: The questions, the same for every corpus size.
+        """
+        rng = np.random.default_rng([self.seed, 1])
+        return [
+            f"What is said about {words}?"
+            for words in (
+                " ".join(self._words[self._draw(rng, 4)])
+                for _ in range(count)
+            )
+        ]
+
+    def pages(self, count: int, page_chars: int = 3000) -> list[str]:
+        """
+        Text of the pages of a document, about `page_chars` characters
+        each.
+
+        Args:
+            count (int): Number of pages.
+            page_chars (int): Characters per page.
+
+        Returns:
+            list[str]: The text of each page.
+        """
+        rng = np.random.default_rng([self.seed, 2])
+        # words have at least two characters and a separator, so the
+        # text is long enough to be cut at the last sentence that fits
+        texts = self._texts(rng, count, max(page_chars // 3, 1))
+        return [
+            text[:page_chars].rsplit(". ", 1)[0] + "." for text in texts
+        ]
+
+    @staticmethod
+    def write_pdf(path: str, pages: list[str], line_chars: int = 90) -> None:
+        """
+        Write pages of text as a PDF file, one text line per
+        `line_chars` characters, with a standard font, so the PDF
+        loader extracts the text back.
+
+        Args:
+            path (str): The file to write.
+            pages (list[str]): The text of each page.
+            line_chars (int): Characters per line.
+        """
+        # catalog, page tree and font, then a page and its content for
+        # each page
+        objects = [
+            "<< /Type /Catalog /Pages 2 0 R >>",
+            "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+                " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))),
+                len(pages),
+            ),
+            "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        ]
+        for index, text in enumerate(pages):
+            lines = [
+                line.replace("\\", "\\\\")
+                .replace("(", "\\(")
+                .replace(")", "\\)")
+                for line in textwrap.wrap(text, line_chars)
+            ]
+            stream = "\n".join([
+                "BT /F1 9 Tf 36 806 Td 11 TL",
+                *(f"({line}) Tj T*" for line in lines),
+                "ET",
+            ])
+            objects.append(
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                "/Resources << /Font << /F1 3 0 R >> >> "
+                f"/Contents {5 + 2 * index} 0 R >>"
+            )
+            objects.append(
+                f"<< /Length {len(stream)} >>\n"
+                f"stream\n{stream}\nendstream"
+            )
+
+        parts = ["%PDF-1.4\n"]
+        offsets = []
+        size = len(parts[0])
+        for number, body in enumerate(objects, start=1):
+            offsets.append(size)
+            parts.append(f"{number} 0 obj\n{body}\nendobj\n")
+            size += len(parts[-1])
+        parts.append(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n")
+        parts.extend(f"{offset:010d} 00000 n \n" for offset in offsets)
+        parts.append(
+            f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{size}\n%%EOF\n"
+        )
+        with open(path, "w", encoding="latin-1") as file:
+            file.write("".join(parts))
+
+    def _draw(self, rng: np.random.Generator, shape) -> np.ndarray:
+        return np.minimum(rng.zipf(1.2, size=shape), self.vocabulary) - 1
+
+    def _texts(
+        self,
+        rng: np.random.Generator,
+        count: int,
+        words: int
+    ) -> list[str]:
+        """
+        Texts of `words` words each, cut into capitalized sentences.
+        """
+        step = self.words_per_sentence
+        rows = self._words[self._draw(rng, (count, words))].tolist()
+        return [
+            " ".join(
+                " ".join(row[start:start + step]).capitalize() + "."
+                for start in range(0, words, step)
+            )
+            for row in rows
+        ]
+
+
+__all__ = ["SyntheticCorpus"]
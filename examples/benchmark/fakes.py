@@ -0,0 +1,140 @@
+"""
+Deterministic stand-ins for the embedding and chat models, so the
+benchmark runs offline and two runs see the same vectors and answers.
+"""
+import time
+import zlib
+from collections.abc import Iterator
+from threading import Lock
+from typing import Any
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import (
+    ChatGeneration,
+    ChatGenerationChunk,
+    ChatResult,
+)
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Bag-of-words embeddings from seeded random word vectors.
+
+    The vector of a word is drawn from a generator seeded with the CRC32
+    of the word, so it is the same in every process, and the vector of a
+    text is the normalized sum of the vectors of its words. Texts sharing
+    words are close, so retrieval, reranking and MMR see realistic
+    neighbourhoods, and a batch costs one gather and one segmented sum.
+
+    Attributes:
+        dimensions (int): Size of the vectors.
+        latency (float): Seconds each call sleeps, to simulate a model
+            server.
+
+    Methods:
+        embed_documents(texts: list[str]) -> list[list[float]]:
+            Embed a batch of texts.
+        embed_query(text: str) -> list[float]:
+            Embed one text.
+    """
+    def __init__(self, dimensions: int = 128, latency: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self._words: dict[str, int] = {}
+        # row 0 is a zero vector, added to every text so that empty
+        # texts still have a segment in the sum
+        self._table = np.zeros((1024, dimensions), dtype=np.float32)
+        self._lock = Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text])[0].tolist()
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        if self.latency:
+            time.sleep(self.latency)
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        rows: list[int] = []
+        offsets: list[int] = []
+        with self._lock:
+            for text in texts:
+                offsets.append(len(rows))
+                rows.append(0)
+                rows.extend(
+                    self._row(word) for word in text.lower().split()
+                )
+            table = self._table
+        vectors = np.add.reduceat(table[rows], offsets, axis=0)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _row(self, word: str) -> int:
+        row = self._words.get(word)
+        if row is None:
+            row = self._words[word] = len(self._words) + 1
+            if row == len(self._table):
+                table = np.zeros(
+                    (2 * len(self._table), self.dimensions), np.float32
+                )
+                table[:row] = self._table
+                self._table = table
+            rng = np.random.default_rng(zlib.crc32(word.encode()))
+            self._table[row] = rng.standard_normal(self.dimensions)
+        return row
+
+
+class EchoChatModel(BaseChatModel):
+    """
+    Chat model answering with the first words of the context it was
+    given, after an optional fixed latency, so a benchmark measures the
+    pipeline around the model.
+
+    Attributes:
+        latency (float): Seconds each call sleeps before answering.
+        words (int): Number of words in each answer.
+    """
+    latency: float = 0.0
+    words: int = 32
+
+    @property
+    def _llm_type(self) -> str:
+        return "echo"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        answer = " ".join(self._answer(messages))
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=answer))]
+        )
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for word in self._answer(messages):
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content=f"{word} ")
+            )
+
+    def _answer(self, messages: list[BaseMessage]) -> list[str]:
+        if self.latency:
+            time.sleep(self.latency)
+        return str(messages[0].content).split()[:self.words]
+
+
+__all__ = ["EchoChatModel", "HashEmbeddings"]
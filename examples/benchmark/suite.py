@@ -0,0 +1,367 @@
+"""
+Scenarios of the benchmark. `run` builds the stores for one corpus size
+and times each selected scenario against them.
+"""
+import math
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+
+import numpy as np
+from langchain_core.vectorstores import VectorStore
+
+from src.core import settings
+from src.core.cache import SummaryCache
+from src.db import BM25Index, FactIndex, FingerprintIndex, NumpyVectorStore
+from src.services import ChatService, IngestService, SummaryService
+from src.utils.handlers import VectorHandler
+
+from .corpus import SyntheticCorpus
+from .fakes import EchoChatModel, HashEmbeddings
+
+
+SCENARIOS = [
+    "ingest",
+    "ingest_pdf",
+    "retrieval",
+    "retrieval_batch",
+    "mmr",
+    "chat",
+]
+BACKENDS = ["numpy", "faiss", "chroma"]
+
+
+def peak_rss_mb() -> float | None:
+    """
+    Peak resident memory of the process so far, in MiB, None where the
+    platform does not report it.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def result(
+    scenario: str,
+    chunks: int,
+    operations: int,
+    unit: str,
+    latencies: list[float]
+) -> dict:
+    """
+    Result of a scenario, from the duration of each timed call.
+
+    Args:
+        scenario (str): Name of the scenario.
+        chunks (int): Size of the corpus.
+        operations (int): Work done, e.g. chunks written or queries
+            answered.
+        unit (str): What an operation is.
+        latencies (list[float]): Seconds each timed call took.
+
+    Returns:
+        dict: The throughput in operations per second, the p50 and p99
+            latency of a call and the peak RSS of the process so far.
+    """
+    seconds = sum(latencies)
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {
+        "scenario": scenario,
+        "chunks": chunks,
+        "operations": operations,
+        "unit": unit,
+        "calls": len(latencies),
+        "seconds": round(seconds, 4),
+        "throughput": round(operations / seconds, 2) if seconds else None,
+        "p50_ms": round(float(p50), 3),
+        "p99_ms": round(float(p99), 3),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def timed(calls: list[Callable[[], object]]) -> list[float]:
+    """
+    Seconds each call took.
+    """
+    latencies = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def build_store(
+    backend: str,
+    embeddings: HashEmbeddings,
+    directory: str
+) -> VectorStore:
+    """
+    An empty vector store of the backend, persisted (when the backend
+    needs a directory) under `directory`.
+    """
+    if backend == "faiss":
+        from src.db import FaissVectorStore
+
+        return FaissVectorStore(
+            embedding_function=embeddings,
+            index_type=settings.FAISS_INDEX_TYPE,
+            nlist=settings.FAISS_NLIST,
+            pq_m=settings.FAISS_PQ_M,
+            hnsw_m=settings.FAISS_HNSW_M,
+            ef_construction=settings.FAISS_EF_CONSTRUCTION,
+            nprobe=settings.FAISS_NPROBE,
+            ef_search=settings.FAISS_EF_SEARCH,
+        )
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+
+        return Chroma(
+            collection_name="benchmark",
+            embedding_function=embeddings,
+            persist_directory=os.path.join(directory, "chroma"),
+        )
+    return NumpyVectorStore(embedding_function=embeddings)
+
+
+def ingest(
+    store: VectorStore,
+    lexical: BM25Index | None,
+    corpus: SyntheticCorpus,
+    size: int,
+    batch_size: int
+) -> dict:
+    """
+    Embed the corpus and write it to the vector store and the lexical
+    index in batches, as the write stage of the ingest pipeline does.
+    Generating the text is not timed.
+    """
+    latencies = []
+    for start in range(0, size, batch_size):
+        documents = corpus.chunks(start, min(batch_size, size - start))
+        ids = [document.id for document in documents]
+        texts = [document.page_content for document in documents]
+        started = time.perf_counter()
+        VectorHandler.save_embeddings_on_vector_store(
+            vector_store=store,
+            documents=documents,
+            embeddings=store.embeddings.embed_documents(texts),
+            ids=ids,
+        )
+        if lexical is not None:
+            lexical.add(ids, texts)
+        latencies.append(time.perf_counter() - started)
+    return result("ingest", size, size, "chunks", latencies)
+
+
+def ingest_pdf(
+    backend: str,
+    corpus: SyntheticCorpus,
+    size: int,
+    directory: str,
+    dimensions: int,
+    embed_latency: float
+) -> dict:
+    """
+    Run the whole ingest pipeline (load, split, embed, write, facts and
+    lexical index) for a PDF of about `size` chunks, into fresh stores.
+    Writing the PDF is not timed.
+    """
+    path = os.path.join(directory, "corpus.pdf")
+    corpus.write_pdf(
+        path,
+        corpus.pages(
+            math.ceil(size / corpus.chunks_per_page),
+            page_chars=corpus.chunks_per_page * (
+                settings.CHUNK_SIZE - settings.CHUNK_OVERLAP
+            ),
+        ),
+    )
+    embeddings = HashEmbeddings(dimensions, latency=embed_latency)
+    service = IngestService(
+        build_store(backend, embeddings, os.path.join(directory, "pdf")),
+        fingerprints=FingerprintIndex(),
+        facts=FactIndex() if settings.FACT_INDEX_ENABLED else None,
+        lexical=BM25Index() if settings.HYBRID_SEARCH_ENABLED else None,
+    )
+    written: list[str] = []
+    latencies = timed([lambda: written.extend(service.ingest_pdf(path))])
+    return result("ingest_pdf", size, len(written), "chunks", latencies)
+
+
+def retrieval(
+    store: VectorStore,
+    chunks: int,
+    queries: list[str],
+    k: int
+) -> dict:
+    """
+    Embed each query and search the vector store, one query per call.
+    """
+    latencies = timed([
+        lambda query=query: VectorHandler.find_documents_by_vector(
+            store,
+            VectorHandler.map_text_to_vector(query, store.embeddings),
+            k=k,
+        )
+        for query in queries
+    ])
+    return result("retrieval", chunks, len(queries), "queries", latencies)
+
+
+def retrieval_batch(
+    store: VectorStore,
+    chunks: int,
+    queries: list[str],
+    k: int,
+    batch_size: int
+) -> dict:
+    """
+    Embed and search the queries in batches, one embedding call and one
+    search per batch.
+    """
+    latencies = timed([
+        lambda batch=queries[start:start + batch_size]: (
+            VectorHandler.find_documents_by_vectors(
+                store,
+                VectorHandler.map_texts_to_vectors(batch, store.embeddings),
+                k=k,
+            )
+        )
+        for start in range(0, len(queries), batch_size)
+    ])
+    return result(
+        "retrieval_batch", chunks, len(queries), "queries", latencies
+    )
+
+
+def mmr(
+    store: VectorStore,
+    chunks: int,
+    queries: list[str],
+    k: int,
+    fetch_k: int
+) -> dict:
+    """
+    Embed each query and select diverse results with maximal marginal
+    relevance.
+    """
+    latencies = timed([
+        lambda query=query: VectorHandler.find_documents_by_mmr(
+            store,
+            VectorHandler.map_text_to_vector(query, store.embeddings),
+            k=k,
+            fetch_k=fetch_k,
+        )
+        for query in queries
+    ])
+    return result("mmr", chunks, len(queries), "queries", latencies)
+
+
+def chat(
+    store: VectorStore,
+    chunks: int,
+    lexical: BM25Index | None,
+    queries: list[str],
+    model_latency: float
+) -> dict:
+    """
+    Answer each query with `ChatService.send_message`: retrieval, hybrid
+    fusion, reranking, context compression and assembly, and the model.
+    The answer cache is off, so repeated queries are answered again.
+    """
+    model = EchoChatModel(latency=model_latency)
+    service = ChatService(
+        store,
+        model,
+        FingerprintIndex(),
+        summaries=SummaryService(model, SummaryCache()),
+        lexical=lexical,
+    )
+    service.answers = None
+    latencies = timed([
+        lambda query=query: service.send_message(query)
+        for query in queries
+    ])
+    return result("chat", chunks, len(queries), "queries", latencies)
+
+
+def run(options: dict) -> list[dict]:
+    """
+    Run the selected scenarios for one corpus size.
+
+    Args:
+        options (dict): "size", "scenarios", "backend", "dimensions",
+            "queries", "warmup", "k", "fetch_k", "batch_size",
+            "query_batch_size", "seed", "model_latency", "embed_latency"
+            and "pdf_max_chunks".
+
+    Returns:
+        list[dict]: The result of each scenario, see `result`.
+    """
+    size = options["size"]
+    scenarios = options["scenarios"]
+    corpus = SyntheticCorpus(seed=options["seed"])
+    queries = corpus.queries(options["warmup"] + options["queries"])
+    warmup, queries = (
+        queries[:options["warmup"]], queries[options["warmup"]:]
+    )
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        if "ingest_pdf" in scenarios:
+            results.append(
+                ingest_pdf(
+                    options["backend"],
+                    corpus,
+                    min(size, options["pdf_max_chunks"]),
+                    directory,
+                    options["dimensions"],
+                    options["embed_latency"],
+                )
+            )
+        if not set(scenarios) - {"ingest_pdf"}:
+            return results
+
+        embeddings = HashEmbeddings(
+            options["dimensions"], latency=options["embed_latency"]
+        )
+        store = build_store(options["backend"], embeddings, directory)
+        lexical = BM25Index() if settings.HYBRID_SEARCH_ENABLED else None
+        # the query scenarios need the corpus, so it is always ingested
+        ingested = ingest(store, lexical, corpus, size, options["batch_size"])
+        if "ingest" in scenarios:
+            results.append(ingested)
+
+        runs = {
+            "retrieval": lambda queries: retrieval(
+                store, size, queries, options["k"]
+            ),
+            "retrieval_batch": lambda queries: retrieval_batch(
+                store,
+                size,
+                queries,
+                options["k"],
+                options["query_batch_size"],
+            ),
+            "mmr": lambda queries: mmr(
+                store, size, queries, options["k"], options["fetch_k"]
+            ),
+            "chat": lambda queries: chat(
+                store, size, lexical, queries, options["model_latency"]
+            ),
+        }
+        for scenario, run_scenario in runs.items():
+            if scenario in scenarios:
+                if warmup:
+                    run_scenario(warmup)
+                results.append(run_scenario(queries))
+    return results
+
+
+__all__ = ["BACKENDS", "peak_rss_mb", "run", "SCENARIOS"]
@@ -0,0 +1,92 @@
+"""
+Example of the batched, concurrent embedding executor against a local
+fake Ollama server.
+
+The fake server answers `POST /api/embed` with deterministic vectors and
+simulates a fixed per-request overhead plus a per-text cost, which is
+the shape that makes batching pay off. The executor starts with small
+batches and grows them while throughput improves.
+
+Run from the repository root:
+
+    python -m examples.embeddings.09
+"""
+import hashlib
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from langchain_ollama import OllamaEmbeddings
+
+from src.core.executor import EmbeddingExecutor
+
+
+DIMENSIONS = 64
+REQUEST_OVERHEAD = 0.05
+SECONDS_PER_TEXT = 0.002
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        texts = body["input"]
+        if isinstance(texts, str):
+            texts = [texts]
+        time.sleep(REQUEST_OVERHEAD + SECONDS_PER_TEXT * len(texts))
+
+        embeddings = []
+        for text in texts:
+            digest = hashlib.sha256(text.encode("utf-8")).digest()
+            embeddings.append(
+                [digest[i % len(digest)] / 255 for i in range(DIMENSIONS)]
+            )
+        payload = json.dumps(
+            {"model": body["model"], "embeddings": embeddings}
+        ).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+Thread(target=server.serve_forever, daemon=True).start()
+
+embeddings = OllamaEmbeddings(
+    model="embeddinggemma",
+    base_url=f"http://127.0.0.1:{server.server_port}",
+)
+
+texts = [f"chunk number {i}" for i in range(2000)]
+
+# One text per request, one request at a time
+
+start = time.perf_counter()
+for text in texts[:200]:
+    embeddings.embed_documents([text])
+sequential = 200 / (time.perf_counter() - start)
+print(f"Sequential, unbatched: {sequential:.0f} chunks/s")
+
+# Adaptive batches over 4 concurrent requests
+
+executor = EmbeddingExecutor(
+    embeddings,
+    concurrency=4,
+    batch_size=8,
+    target_latency=1.0,
+)
+
+for _ in range(3):
+    vectors = executor.embed_documents(texts)
+    print(executor.stats())
+
+assert len(vectors) == len(texts)
+assert vectors[10] == embeddings.embed_documents([texts[10]])[0]
+
+server.shutdown()
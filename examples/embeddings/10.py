@@ -0,0 +1,90 @@
+"""
+Example of the recall/latency tradeoff of the FAISS index types.
+
+Clustered random vectors stand in for chunk embeddings. The exact `flat`
+index gives the true neighbours of each query, and every approximate
+index is measured against it: recall@k is the share of the true top k it
+returns, and latency is the time per query of a batched search. Each
+index is queried with a few values of its search parameter, `nprobe` for
+IVF and `efSearch` for HNSW.
+
+Run from the repository root:
+
+    python -m examples.embeddings.10
+"""
+import time
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.db.faiss_store import FaissVectorStore
+
+
+DIMENSIONS = 128
+VECTORS = 20_000
+QUERIES = 200
+K = 10
+
+rng = np.random.default_rng(0)
+centers = rng.normal(size=(1000, DIMENSIONS))
+vectors = (
+    centers[rng.integers(0, len(centers), VECTORS)]
+    + 1.0 * rng.normal(size=(VECTORS, DIMENSIONS))
+).astype(np.float32)
+queries = (
+    vectors[rng.integers(0, VECTORS, QUERIES)]
+    + 0.3 * rng.normal(size=(QUERIES, DIMENSIONS))
+).tolist()
+pairs = [(f"chunk {i}", vector) for i, vector in enumerate(vectors)]
+embedding = DeterministicFakeEmbedding(size=DIMENSIONS)
+
+
+def build(**kwargs) -> FaissVectorStore:
+    store = FaissVectorStore(embedding_function=embedding, **kwargs)
+    started = time.perf_counter()
+    store.add_embeddings(pairs, ids=[text for text, _ in pairs])
+    print(
+        f"{kwargs['index_type']}: built in "
+        f"{time.perf_counter() - started:.1f}s {store.stats()}"
+    )
+    return store
+
+
+def search(store: FaissVectorStore) -> tuple[list[set[str]], float]:
+    started = time.perf_counter()
+    results = store.similarity_search_by_vectors(queries, k=K)
+    elapsed = (time.perf_counter() - started) / QUERIES
+    return [{document.id for document in hits} for hits in results], elapsed
+
+
+exact, latency = search(build(index_type="flat"))
+print(f"  exact: {latency * 1000:.3f} ms/query")
+
+stores = [
+    (build(index_type="ivf_flat", nlist=128), "nprobe", [1, 4, 16, 64]),
+    (build(index_type="ivf_pq", nlist=128, pq_m=16), "nprobe", [1, 4, 16]),
+    (build(index_type="hnsw"), "ef_search", [16, 32, 64, 128]),
+]
+
+for store, parameter, values in stores:
+    for value in values:
+        store.set_search_parameters(**{parameter: value})
+        found, latency = search(store)
+        recall = np.mean([
+            len(hits & truth) / K for hits, truth in zip(found, exact)
+        ])
+        print(
+            f"  {parameter}={value}: recall@{K}={recall:.3f} "
+            f"{latency * 1000:.3f} ms/query"
+        )
+
+# Deleting by ID, as `remove_pdf` does
+
+store = stores[-1][0]
+store.delete(ids=[f"chunk {i}" for i in range(8_000)])
+print(store.stats())
+assert not store.get_by_ids(["chunk 0"])
+assert all(
+    int(document.id.split()[1]) >= 8_000
+    for document in store.similarity_search_by_vector(queries[0], k=K)
+)
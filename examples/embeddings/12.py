@@ -0,0 +1,100 @@
+"""
+Benchmark of the BM25 inverted index used for hybrid retrieval.
+
+A synthetic corpus of one million chunks, with words drawn from a Zipf
+distribution like natural text, is indexed in batches. Queries mix
+frequent and rare words, as exact-term queries (part numbers, names) do.
+The benchmark reports indexing throughput, the size of the postings,
+the BM25 query latency percentiles, the cost of fusing the BM25 ranking
+with a vector ranking, and the time to save and load the index.
+
+Run from the repository root:
+
+    python -m examples.embeddings.12
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from src.db.lexical import BM25Index
+from src.utils.handlers import VectorHandler
+
+
+CHUNKS = 1_000_000
+WORDS_PER_CHUNK = 40
+VOCABULARY = 200_000
+BATCH_SIZE = 10_000
+QUERIES = 200
+K = 20
+
+rng = np.random.default_rng(0)
+vocabulary = np.array([f"w{i}" for i in range(VOCABULARY)])
+
+
+def batch(start: int, size: int) -> tuple[list[str], list[str]]:
+    words = np.minimum(
+        rng.zipf(1.1, size=(size, WORDS_PER_CHUNK)), VOCABULARY
+    ) - 1
+    texts = [" ".join(row) for row in vocabulary[words].tolist()]
+    return [f"chunk-{start + i}" for i in range(size)], texts
+
+
+index = BM25Index()
+started = time.perf_counter()
+for start in range(0, CHUNKS, BATCH_SIZE):
+    index.add(*batch(start, BATCH_SIZE))
+elapsed = time.perf_counter() - started
+stats = index.stats()
+print(
+    f"Indexed {CHUNKS} chunks in {elapsed:.1f}s "
+    f"({CHUNKS / elapsed:,.0f} chunks/s), {stats['terms']} terms, "
+    f"{stats['postings_bytes'] / 2**20:.0f} MiB of postings."
+)
+
+queries = [
+    " ".join(
+        vocabulary[
+            np.concatenate([
+                rng.integers(0, 100, 1),
+                rng.integers(100, VOCABULARY, 2),
+            ])
+        ]
+    )
+    for _ in range(QUERIES)
+]
+latencies = []
+rankings = []
+for query in queries:
+    started = time.perf_counter()
+    rankings.append([id for id, _ in index.search(query, k=K)])
+    latencies.append(time.perf_counter() - started)
+p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+print(f"BM25 query: p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms")
+
+dense = [
+    [f"chunk-{i}" for i in rng.integers(0, CHUNKS, K)]
+    for _ in range(QUERIES)
+]
+started = time.perf_counter()
+for lexical, vector in zip(rankings, dense):
+    VectorHandler.fuse_rankings([vector, lexical], k=5)
+print(
+    "Reciprocal rank fusion: "
+    f"{(time.perf_counter() - started) / QUERIES * 1e6:.1f} us/query"
+)
+
+with tempfile.TemporaryDirectory() as directory:
+    index.path = os.path.join(directory, "bm25.npz")
+    index.add(*batch(CHUNKS, 1))
+    started = time.perf_counter()
+    index.save()
+    saved = time.perf_counter() - started
+    started = time.perf_counter()
+    loaded = BM25Index(index.path)
+    print(
+        f"Saved in {saved:.1f}s "
+        f"({os.path.getsize(index.path) / 2**20:.0f} MiB), "
+        f"loaded in {time.perf_counter() - started:.1f}s: {loaded.stats()}"
+    )
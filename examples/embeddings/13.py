@@ -0,0 +1,76 @@
+"""
+Example of the latency of MMR search against plain similarity search.
+
+Random vectors stand in for chunk embeddings in a `NumpyVectorStore`.
+Each query runs a similarity search, the native MMR search of the store,
+which selects from the candidate rows already in memory, and the
+generic LangChain MMR over the same candidates, which compares every
+candidate with every selected one at each step. Batched MMR runs all
+queries in one call.
+
+Run from the repository root:
+
+    python -m examples.embeddings.13
+"""
+import time
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from src.db.numpy_store import NumpyVectorStore
+
+
+DIMENSIONS = 768
+VECTORS = 100_000
+QUERIES = 100
+K = 10
+FETCH_K = 100
+
+rng = np.random.default_rng(0)
+vectors = rng.normal(size=(VECTORS, DIMENSIONS)).astype(np.float32)
+queries = rng.normal(size=(QUERIES, DIMENSIONS)).astype(np.float32)
+store = NumpyVectorStore(DeterministicFakeEmbedding(size=DIMENSIONS))
+store.add_embeddings(
+    [(f"chunk {i}", vector) for i, vector in enumerate(vectors)],
+    ids=[str(i) for i in range(VECTORS)],
+)
+
+
+def measure(name: str, search, batch: int = 1) -> None:
+    latencies = []
+    for start in range(0, QUERIES, batch):
+        started = time.perf_counter()
+        search(queries[start:start + batch].tolist())
+        latencies.append((time.perf_counter() - started) / batch)
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{name}: p50 {p50:.2f} ms, p99 {p99:.2f} ms per query")
+
+
+def langchain_mmr(embeddings: list[list[float]]) -> None:
+    for embedding in embeddings:
+        candidates = store.similarity_search_by_vector(embedding, k=FETCH_K)
+        candidate_vectors = vectors[[int(doc.id) for doc in candidates]]
+        maximal_marginal_relevance(
+            np.asarray(embedding), candidate_vectors.tolist(), k=K
+        )
+
+
+measure(
+    "similarity search",
+    lambda embeddings: store.similarity_search_by_vectors(embeddings, k=K),
+)
+measure(
+    "native MMR",
+    lambda embeddings: store.max_marginal_relevance_search_by_vectors(
+        embeddings, k=K, fetch_k=FETCH_K
+    ),
+)
+measure(
+    "native MMR, batches of 32",
+    lambda embeddings: store.max_marginal_relevance_search_by_vectors(
+        embeddings, k=K, fetch_k=FETCH_K
+    ),
+    batch=32,
+)
+measure("LangChain MMR", langchain_mmr)
@@ -1,7 +1,20 @@
-from src.views import home_view, options_view
+import time
+
+started = time.perf_counter()
+
+from src.core import configure_logging, settings, warmup_async  # noqa: E402
+from src.views import home_view, options_view  # noqa: E402
 
 
 def main() -> None:
+    logger = configure_logging()
+    if settings.STARTUP_REPORT:
+        logger.info(
+            "Startup report",
+            extra={"menu_ms": round((time.perf_counter() - started) * 1000)},
+        )
+    if settings.MODEL_WARMUP:
+        warmup_async()
     home_view()
     exec = True
     while exec:
@@ -1,4 +1,4 @@
-from .chat import ChatController
+from .chat import AsyncChatController, ChatController
 
 
-__all__ = ["ChatController"]
+__all__ = ["AsyncChatController", "ChatController"]
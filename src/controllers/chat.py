@@ -1,28 +1,144 @@
-from src.core import model
-from src.db import vector_db
-from src.services import ChatService
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Iterator
+
+from src.core import get_model, get_registry, settings, tracer
+from src.core.cache import SummaryCache
+from src.db import (
+    get_fact_index,
+    get_fingerprint_index,
+    get_lexical_index,
+    get_vector_db,
+    session_store,
+)
+from src.services import AsyncChatService, ChatService, SummaryService
+
+
+logger = logging.getLogger(__name__)
 
 
 class ChatController:
     def __init__(self):
         self.chat_service = ChatService(
-            vector_db,
-            model
+            get_vector_db(),
+            get_model(),
+            get_fingerprint_index(),
+            facts=get_fact_index(),
+            lexical=get_lexical_index(),
+            sessions=session_store,
+            session_id=settings.SESSION_ID
         )
 
     def load_pdf(self, file_path: str) -> bool:
         try:
-            self.chat_service.add_pdf(file_path)
+            with tracer.span("controller.load_pdf"):
+                self.chat_service.add_pdf(file_path)
             return True
         except Exception as e:
-            print(f"Erro ao carregar PDF: {e}")
+            logger.error("Erro ao carregar PDF: %s", e)
             return False
 
     def list_pdf(self) -> list[str]:
         return self.chat_service.list_pdf()
 
+    def summarize_pdf(self, file_path: str) -> str | None:
+        try:
+            with tracer.span("controller.summarize_pdf"):
+                return self.chat_service.summarize_pdf(file_path)
+        except Exception as e:
+            logger.error("Erro ao resumir PDF: %s", e)
+            return None
+
     def chat(self,  message: str) -> str:
-        return self.chat_service.send_message(message)
+        with tracer.span("controller.chat"):
+            return self.chat_service.send_message(message)
+
+    def chat_stream(self, message: str) -> Iterator[str]:
+        return self.chat_service.stream_message(message)
 
     def clear_session(self) -> None:
         self.chat_service.clear_session()
+
+    def model_stats(self) -> dict[str, dict[str, float]]:
+        return get_registry().stats()
+
+    def trace_stats(self) -> dict[str, dict[str, float]]:
+        return tracer.stats()
+
+
+class AsyncChatController:
+    """
+    Asynchronous controller serving many chat sessions from one event
+    loop. Each session gets its own `AsyncChatService`, sharing the vector
+    store, the model and the summarizer.
+    """
+    def __init__(self):
+        self.sessions: dict[str, AsyncChatService] = {}
+        self.summaries = SummaryService(
+            get_model(), SummaryCache(settings.SUMMARY_CACHE_PATH)
+        )
+
+    def _service(self, session_id: str) -> AsyncChatService:
+        if session_id not in self.sessions:
+            self.sessions[session_id] = AsyncChatService(
+                get_vector_db(),
+                get_model(),
+                get_fingerprint_index(),
+                self.summaries,
+                get_fact_index(),
+                get_lexical_index(),
+                sessions=session_store,
+                session_id=session_id
+            )
+        return self.sessions[session_id]
+
+    async def load_pdf(self, session_id: str, file_path: str) -> bool:
+        try:
+            with tracer.span("controller.load_pdf", session=session_id):
+                await self._service(session_id).aadd_pdf(file_path)
+            return True
+        except Exception as e:
+            logger.error("Erro ao carregar PDF: %s", e)
+            return False
+
+    async def list_pdf(self, session_id: str) -> list[str]:
+        return await self._service(session_id).alist_pdf()
+
+    async def summarize_pdf(
+        self,
+        session_id: str,
+        file_path: str
+    ) -> str | None:
+        try:
+            with tracer.span("controller.summarize_pdf", session=session_id):
+                return await self._service(session_id).asummarize_pdf(
+                    file_path
+                )
+        except Exception as e:
+            logger.error("Erro ao resumir PDF: %s", e)
+            return None
+
+    async def chat(self, session_id: str, message: str) -> str:
+        with tracer.span("controller.chat", session=session_id):
+            return await self._service(session_id).asend_message(message)
+
+    def chat_stream(
+        self,
+        session_id: str,
+        message: str
+    ) -> AsyncIterator[str]:
+        return self._service(session_id).astream_message(message)
+
+    async def clear_session(self, session_id: str) -> None:
+        # restores a stored session that is not in memory, to clear it
+        await self._service(session_id).aclear_session()
+        self.sessions.pop(session_id, None)
+
+    async def warmup(self) -> dict[str, float]:
+        return await asyncio.to_thread(get_registry().warmup)
+
+    def model_stats(self) -> dict[str, dict[str, float]]:
+        return get_registry().stats()
+
+    def trace_stats(self) -> dict[str, dict[str, float]]:
+        return tracer.stats()
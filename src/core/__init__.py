@@ -1,6 +1,31 @@
-from .ai import embeddings, model
+from typing import Any
+
+from .ai import get_embeddings, get_model, get_registry, warmup_async
 from .base import BaseSchema
+from .lazy import Lazy
+from .log import configure_logging
 from .settings import settings
+from .tracing import Tracer, tracer
+
+
+def __getattr__(name: str) -> Any:
+    # `embeddings` and `model` are built on first access, see `ai`
+    if name in ("embeddings", "model"):
+        from . import ai
+
+        return getattr(ai, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-__all__ = ["embeddings", "model", "BaseSchema", "settings"]
+__all__ = [
+    "BaseSchema",
+    "configure_logging",
+    "get_embeddings",
+    "get_model",
+    "get_registry",
+    "Lazy",
+    "settings",
+    "Tracer",
+    "tracer",
+    "warmup_async",
+]
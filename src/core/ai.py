@@ -1,34 +1,149 @@
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
+from __future__ import annotations
 
+from threading import Thread
+from typing import TYPE_CHECKING, Any
 
+from .lazy import Lazy
 from .settings import settings
 
 
-embeddings = OllamaEmbeddings(
-    model=settings.OLLAMA_EMBEDDINGS_MODEL_NAME,
-    num_gpu=settings.NUM_GPU,
-    keep_alive=settings.KEEP_ALIVE,
-    temperature=settings.TEMPERATURE,
-    top_k=settings.TOP_K,
-    top_p=settings.TOP_P,
-)
+# LangChain and the provider clients are imported by the factories, so
+# importing `src.core` stays cheap
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.language_models import BaseChatModel
 
-model_ollama = ChatOllama(
-    model=settings.OLLAMA_CHAT_MODEL_NAME,
-    num_gpu=settings.NUM_GPU,
-    keep_alive=settings.KEEP_ALIVE,
-    temperature=settings.TEMPERATURE,
-    top_k=settings.TOP_K,
-    top_p=settings.TOP_P,
-)
+    from .registry import ModelRegistry
 
-model_google = ChatGoogleGenerativeAI(
-    model="gemini-3-pro-preview",
-    api_key=settings.GOOGLE_API_KEY,
-)
 
-model = model_ollama  # Switch between models as needed
+def _build_embeddings() -> Embeddings:
+    from langchain_ollama import OllamaEmbeddings
 
+    from .cache import CachedEmbeddings, EmbeddingCache
+    from .executor import EmbeddingExecutor
+    from .registry import keep_alive
 
-__all__ = ["model", "embeddings"]
+    registry = get_registry()
+    embeddings: Embeddings = OllamaEmbeddings(
+        model=settings.OLLAMA_EMBEDDINGS_MODEL_NAME,
+        base_url=settings.OLLAMA_BASE_URL,
+        num_gpu=settings.NUM_GPU,
+        keep_alive=keep_alive(settings.KEEP_ALIVE),
+        temperature=settings.TEMPERATURE,
+        top_k=settings.TOP_K,
+        top_p=settings.TOP_P,
+        sync_client_kwargs=registry.client_kwargs("ollama"),
+        async_client_kwargs=registry.async_client_kwargs(),
+    )
+
+    embeddings = EmbeddingExecutor(
+        embeddings,
+        concurrency=settings.EMBEDDING_CONCURRENCY,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+        target_latency=settings.EMBEDDING_TARGET_LATENCY,
+        max_retries=settings.EMBEDDING_MAX_RETRIES,
+    )
+
+    if settings.EMBEDDING_CACHE_ENABLED:
+        embeddings = CachedEmbeddings(
+            embeddings,
+            EmbeddingCache(
+                directory=settings.EMBEDDING_CACHE_DIRECTORY,
+                model_name=settings.OLLAMA_EMBEDDINGS_MODEL_NAME,
+                max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES,
+            ),
+        )
+    return embeddings
+
+
+def _build_registry() -> ModelRegistry:
+    from .registry import ModelRegistry
+
+    return ModelRegistry()
+
+
+_embeddings = Lazy("embeddings", _build_embeddings)
+_registry = Lazy("registry", _build_registry)
+_router = Lazy("router", lambda: get_registry().router())
+
+
+def get_embeddings() -> Embeddings:
+    """
+    The embedding model, built on first use.
+
+    Returns:
+        Embeddings: The Ollama embeddings, behind the concurrent executor
+            and, when enabled, the persistent embedding cache.
+    """
+    return _embeddings.get()
+
+
+def get_registry() -> ModelRegistry:
+    """
+    The registry of the chat model backends, built on first use.
+
+    Returns:
+        ModelRegistry: The registry.
+    """
+    return _registry.get()
+
+
+def get_model(provider: str | None = None) -> BaseChatModel:
+    """
+    A chat model, built on first use. The client library of a backend is
+    only imported when its model is built.
+
+    Args:
+        provider (str | None): "ollama" or "google" for the model of that
+            backend. When None, a model routing each request between
+            `CHAT_MODEL_PROVIDER` and `MODEL_FALLBACK_PROVIDER` by load.
+
+    Returns:
+        BaseChatModel: The chat model.
+
+    Raises:
+        ValueError: If the provider is unknown.
+    """
+    if provider is None:
+        return _router.get()
+    return get_registry().model(provider)
+
+
+def warmup_async() -> Thread:
+    """
+    Build the embeddings and warm the chat models up in a background
+    thread, see `ModelRegistry.warmup`, so startup does not wait for
+    them.
+
+    Returns:
+        Thread: The daemon thread doing the warmup.
+    """
+    def warmup() -> None:
+        get_embeddings()
+        get_registry().warmup()
+
+    thread = Thread(
+        target=warmup,
+        name="model-warmup",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def __getattr__(name: str) -> Any:
+    # `embeddings` and `model` are still importable, built on access
+    if name == "embeddings":
+        return get_embeddings()
+    if name == "model":
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "get_embeddings",
+    "get_model",
+    "get_registry",
+    "warmup_async",
+]
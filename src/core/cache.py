@@ -0,0 +1,559 @@
+import atexit
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed store of embedding vectors.
+
+    Each embedding model gets its own directory, so keys only need to
+    hash the text. Vectors live in a single memory-mapped float32 file,
+    one row per slot, so a lookup reads only the rows it needs. Next to
+    it, an append-only log maps each key to its slot. When the cache is
+    full the least recently used entry is evicted and its slot reused.
+    The log is rewritten in LRU order on `flush`, so recency survives
+    restarts.
+
+    Attributes:
+        directory (str): Directory holding the cache files of the model.
+        max_bytes (int): Maximum size of the vector file.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that were not in the cache.
+
+    Methods:
+        key(text: str) -> str:
+            Content hash of a text, after normalization.
+        get_many(keys: list[str]) -> list[list[float] | None]:
+            Look up several keys at once.
+        put_many(keys: list[str], vectors: list[list[float]]) -> None:
+            Store several vectors at once.
+        flush() -> None:
+            Write pending changes to disk.
+        stats() -> dict[str, float]:
+            Hit rate and size of the cache.
+    """
+    def __init__(self, directory: str, model_name: str, max_bytes: int):
+        self.directory = os.path.join(
+            directory, re.sub(r"[^\w.-]", "_", model_name)
+        )
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._free: list[int] = []
+        self._vectors: np.memmap | None = None
+        self._log_lines = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._log_path = os.path.join(self.directory, "keys.log")
+        self._load()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def key(text: str) -> str:
+        """
+        Content hash of a text, after Unicode and whitespace normalization.
+
+        Args:
+            text (str): The text to hash.
+
+        Returns:
+            str: The hex digest used as cache key.
+        """
+        normalized = _WHITESPACE.sub(
+            " ", unicodedata.normalize("NFC", text)
+        ).strip()
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: list[str]) -> list[list[float] | None]:
+        """
+        Look up several keys at once.
+
+        Args:
+            keys (list[str]): The keys to look up.
+
+        Returns:
+            list[list[float] | None]: The cached vector for each key, or
+                None when the key is not in the cache.
+        """
+        with self._lock:
+            results: list[list[float] | None] = []
+            for key in keys:
+                slot = self._entries.get(key)
+                if slot is None or self._vectors is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                results.append(self._vectors[slot].tolist())
+            return results
+
+    def put_many(self, keys: list[str], vectors: list[list[float]]) -> None:
+        """
+        Store several vectors at once, evicting the least recently used
+        entries when the cache is full.
+
+        Args:
+            keys (list[str]): The keys of the vectors.
+            vectors (list[list[float]]): The vectors to store.
+        """
+        if not keys:
+            return
+        with self._lock:
+            if self._vectors is None:
+                self._create(len(vectors[0]))
+            lines = []
+            for key, vector in zip(keys, vectors):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    continue
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    _, slot = self._entries.popitem(last=False)
+                self._vectors[slot] = vector
+                self._entries[key] = slot
+                lines.append(f"{slot}\t{key}\n")
+            if lines:
+                with open(self._log_path, "a", encoding="utf-8") as log:
+                    log.writelines(lines)
+                self._log_lines += len(lines)
+            if self._log_lines > 2 * len(self._vectors):
+                self._rewrite_log()
+
+    def flush(self) -> None:
+        """
+        Write pending vectors to disk and rewrite the key log in LRU order.
+        """
+        with self._lock:
+            if self._vectors is None:
+                return
+            self._vectors.flush()
+            self._rewrite_log()
+
+    def stats(self) -> dict[str, float]:
+        """
+        Hit rate and size of the cache.
+
+        Returns:
+            dict[str, float]: Hits, misses, hit rate, number of entries
+                and bytes used by the stored vectors.
+        """
+        lookups = self.hits + self.misses
+        row_bytes = 0
+        if self._vectors is not None:
+            row_bytes = self._vectors.shape[1] * self._vectors.itemsize
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": len(self._entries) * row_bytes,
+        }
+
+    def _create(self, dimensions: int) -> None:
+        """
+        Create the vector file for vectors of the given size.
+        """
+        capacity = max(1, self.max_bytes // (dimensions * 4))
+        with open(os.path.join(self.directory, "dimensions"), "w") as file:
+            file.write(str(dimensions))
+        self._vectors = np.memmap(
+            self._vectors_path,
+            dtype=np.float32,
+            mode="w+",
+            shape=(capacity, dimensions),
+        )
+        self._free = list(range(capacity - 1, -1, -1))
+        self._entries.clear()
+        open(self._log_path, "w").close()
+        self._log_lines = 0
+
+    def _load(self) -> None:
+        """
+        Open an existing cache, replaying the key log.
+        """
+        dimensions_path = os.path.join(self.directory, "dimensions")
+        if not (
+            os.path.exists(dimensions_path)
+            and os.path.exists(self._vectors_path)
+        ):
+            return
+        with open(dimensions_path) as file:
+            dimensions = int(file.read())
+        capacity = os.path.getsize(self._vectors_path) // (dimensions * 4)
+        self._vectors = np.memmap(
+            self._vectors_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(capacity, dimensions),
+        )
+
+        # later lines win: a slot may have been reused after an eviction
+        slots: dict[int, str] = {}
+        if os.path.exists(self._log_path):
+            with open(self._log_path, encoding="utf-8") as log:
+                for line in log:
+                    slot_text, key = line.rstrip("\n").split("\t")
+                    slot = int(slot_text)
+                    if slot in slots:
+                        self._entries.pop(slots[slot], None)
+                    if key in self._entries:
+                        slots.pop(self._entries.pop(key))
+                    slots[slot] = key
+                    self._entries[key] = slot
+                    self._log_lines += 1
+        used = set(slots)
+        self._free = [
+            slot for slot in range(capacity - 1, -1, -1) if slot not in used
+        ]
+
+    def _rewrite_log(self) -> None:
+        """
+        Replace the key log by one line per live entry, oldest first.
+        """
+        temporary_path = self._log_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as log:
+            log.writelines(
+                f"{slot}\t{key}\n" for key, slot in self._entries.items()
+            )
+        os.replace(temporary_path, self._log_path)
+        self._log_lines = len(self._entries)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only calls the underlying model for texts it
+    has not embedded before.
+
+    Attributes:
+        embeddings (Embeddings): The wrapped embedding model.
+        cache (EmbeddingCache): The cache holding the vectors of this model.
+
+    Methods:
+        embed_documents(texts: list[str]) -> list[list[float]]:
+            Embed a list of texts, calling the model only for cache misses.
+        embed_query(text: str) -> list[float]:
+            Embed a single text, using the cache.
+        aembed_documents(texts: list[str]) -> list[list[float]]:
+            Asynchronous version of `embed_documents`.
+        aembed_query(text: str) -> list[float]:
+            Asynchronous version of `embed_query`.
+    """
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed a list of texts, calling the model only for cache misses.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: One vector per text.
+        """
+        keys = [self.cache.key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = self._missing(keys, texts, vectors)
+        if not missing:
+            return vectors
+        computed = self.embeddings.embed_documents(list(missing.values()))
+        return self._merge(keys, vectors, missing, computed)
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+        Embed a single text, using the cache.
+
+        Args:
+            text (str): The text to embed.
+
+        Returns:
+            list[float]: The embedding vector.
+        """
+        key = self.cache.key(text)
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many([key], [vector])
+        return vector
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Asynchronously embed a list of texts, calling the model only for
+        cache misses.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: One vector per text.
+        """
+        keys = [self.cache.key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = self._missing(keys, texts, vectors)
+        if not missing:
+            return vectors
+        computed = await self.embeddings.aembed_documents(
+            list(missing.values())
+        )
+        return self._merge(keys, vectors, missing, computed)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """
+        Asynchronously embed a single text, using the cache.
+
+        Args:
+            text (str): The text to embed.
+
+        Returns:
+            list[float]: The embedding vector.
+        """
+        key = self.cache.key(text)
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self.cache.put_many([key], [vector])
+        return vector
+
+    @staticmethod
+    def _missing(
+        keys: list[str],
+        texts: list[str],
+        vectors: list[list[float] | None]
+    ) -> dict[str, str]:
+        """
+        Texts to embed, once per key even if a text is repeated.
+        """
+        missing: dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        return missing
+
+    def _merge(
+        self,
+        keys: list[str],
+        vectors: list[list[float] | None],
+        missing: dict[str, str],
+        computed: list[list[float]]
+    ) -> list[list[float]]:
+        """
+        Store the computed vectors and fill the gaps in `vectors`.
+        """
+        self.cache.put_many(list(missing), computed)
+        by_key = dict(zip(missing, computed))
+        return [
+            vector if vector is not None else by_key[key]
+            for key, vector in zip(keys, vectors)
+        ]
+
+
+class AnswerCache:
+    """
+    In-memory cache of answers keyed on the query embedding.
+
+    A stored answer is returned for a new query when the cosine
+    similarity between both query embeddings reaches `threshold` and
+    both queries retrieved exactly the same set of chunk IDs, so a hit
+    never answers from a context the original answer did not see.
+    Query vectors are kept normalized in a contiguous float32 matrix and
+    compared with a single matrix-vector product. Once `max_entries` is
+    reached the oldest entries are overwritten.
+
+    Attributes:
+        threshold (float): Minimum cosine similarity for a hit.
+        max_entries (int): Maximum number of stored answers.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that were not in the cache.
+
+    Methods:
+        get(embedding: list[float], ids: list[str]) -> str | None:
+            Look up the answer for a query.
+        put(embedding: list[float], ids: list[str], answer: str) -> None:
+            Store the answer for a query.
+        clear() -> None:
+            Drop all answers.
+    """
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1024):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._vectors: np.ndarray | None = None
+        self._ids: list[frozenset[str]] = []
+        self._answers: list[str] = []
+        self._next = 0
+
+    def get(self, embedding: list[float], ids: list[str]) -> str | None:
+        """
+        Look up the answer for a query.
+
+        Args:
+            embedding (list[float]): The query embedding.
+            ids (list[str]): IDs of the chunks retrieved for the query.
+
+        Returns:
+            str | None: The stored answer, or None on a miss.
+        """
+        with self._lock:
+            if self._vectors is None or not self._answers:
+                self.misses += 1
+                return None
+            query = self._normalize(embedding)
+            similarities = self._vectors[:len(self._answers)] @ query
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            retrieved = frozenset(ids)
+            for index in candidates[np.argsort(-similarities[candidates])]:
+                if self._ids[index] == retrieved:
+                    self.hits += 1
+                    return self._answers[index]
+            self.misses += 1
+            return None
+
+    def put(self, embedding: list[float], ids: list[str], answer: str) -> None:
+        """
+        Store the answer for a query.
+
+        Args:
+            embedding (list[float]): The query embedding.
+            ids (list[str]): IDs of the chunks retrieved for the query.
+            answer (str): The generated answer.
+        """
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros(
+                    (self.max_entries, len(embedding)), dtype=np.float32
+                )
+            index = self._next
+            self._vectors[index] = self._normalize(embedding)
+            if index < len(self._answers):
+                self._ids[index] = frozenset(ids)
+                self._answers[index] = answer
+            else:
+                self._ids.append(frozenset(ids))
+                self._answers.append(answer)
+            self._next = (index + 1) % self.max_entries
+
+    def clear(self) -> None:
+        """
+        Drop all answers, e.g. after the document collection changed.
+        """
+        with self._lock:
+            self._ids.clear()
+            self._answers.clear()
+            self._next = 0
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        """
+        Unit-length float32 copy of a vector.
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SummaryCache:
+    """
+    Persistent map from content hashes to summaries.
+
+    Every node of a summary tree is stored under a hash of its input, so
+    a document summarized again only recomputes the nodes whose input
+    changed.
+
+    Attributes:
+        path (str | None): JSON file the cache is persisted to. When None,
+            the cache only lives in memory.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that were not in the cache.
+
+    Methods:
+        get(key: str) -> str | None:
+            Look up a summary.
+        put(key: str, summary: str) -> None:
+            Store a summary.
+        save() -> None:
+            Persist the cache.
+    """
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._summaries: dict[str, str] = {}
+        self._dirty = False
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self._summaries = json.load(file)
+
+    def get(self, key: str) -> str | None:
+        """
+        Look up a summary.
+
+        Args:
+            key (str): Content hash of the summary input.
+
+        Returns:
+            str | None: The summary, or None on a miss.
+        """
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return summary
+
+    def put(self, key: str, summary: str) -> None:
+        """
+        Store a summary.
+
+        Args:
+            key (str): Content hash of the summary input.
+            summary (str): The summary.
+        """
+        with self._lock:
+            self._summaries[key] = summary
+            self._dirty = True
+
+    def save(self) -> None:
+        """
+        Persist the cache, replacing the previous file atomically.
+        """
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary_path = self.path + ".tmp"
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                json.dump(self._summaries, file)
+            os.replace(temporary_path, self.path)
+            self._dirty = False
+
+
+__all__ = [
+    "EmbeddingCache",
+    "CachedEmbeddings",
+    "AnswerCache",
+    "SummaryCache",
+]
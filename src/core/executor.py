@@ -0,0 +1,207 @@
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from threading import Lock
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingExecutor(Embeddings):
+    """
+    Embeddings wrapper that sends `embed_documents` batches to the model
+    over a small pool of concurrent requests.
+
+    The batch size adapts to the measured server behaviour: it doubles
+    while throughput keeps improving and batches finish within
+    `target_latency`, and it shrinks when a batch is too slow, when
+    throughput drops, or when a request fails. Failed batches are retried
+    with exponential backoff.
+
+    Attributes:
+        embeddings (Embeddings): The wrapped embedding model.
+        concurrency (int): Maximum number of requests in flight.
+        batch_size (int): Current number of texts per request.
+        min_batch_size (int): Lower bound for `batch_size`.
+        max_batch_size (int): Upper bound for `batch_size`.
+        target_latency (float): Seconds a batch may take before the
+            batch size is reduced.
+        max_retries (int): Number of retries for a failed batch.
+
+    Methods:
+        embed_documents(texts: list[str]) -> list[list[float]]:
+            Embed a list of texts in concurrent, adaptively sized batches.
+        embed_query(text: str) -> list[float]:
+            Embed a single text.
+        aembed_query(text: str) -> list[float]:
+            Asynchronously embed a single text.
+        stats() -> dict[str, float]:
+            Throughput and batching statistics.
+    """
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        concurrency: int = 4,
+        batch_size: int = 32,
+        min_batch_size: int = 1,
+        max_batch_size: int = 512,
+        target_latency: float = 2.0,
+        max_retries: int = 3,
+    ):
+        self.embeddings = embeddings
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self._lock = Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=concurrency,
+            thread_name_prefix="embedding",
+        )
+        self._best_throughput = 0.0
+        self._chunks = 0
+        self._batches = 0
+        self._retries = 0
+        self._elapsed = 0.0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed a list of texts in concurrent, adaptively sized batches.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: One vector per text, in input order.
+
+        Raises:
+            Exception: The last error of a batch that failed after
+                `max_retries` retries.
+        """
+        results: list[list[float]] = [[] for _ in texts]
+        pending: dict[Future[list[list[float]]], int] = {}
+        offset = 0
+        started = time.perf_counter()
+        try:
+            while offset < len(texts) or pending:
+                while (
+                    offset < len(texts) and len(pending) < self.concurrency
+                ):
+                    batch = texts[offset:offset + self.batch_size]
+                    future = self._pool.submit(self._embed_batch, batch)
+                    pending[future] = offset
+                    offset += len(batch)
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start = pending.pop(future)
+                    vectors = future.result()
+                    results[start:start + len(vectors)] = vectors
+        finally:
+            for future in pending:
+                future.cancel()
+        with self._lock:
+            self._elapsed += time.perf_counter() - started
+            self._chunks += len(texts)
+        return results
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+        Embed a single text.
+
+        Args:
+            text (str): The text to embed.
+
+        Returns:
+            list[float]: The embedding vector.
+        """
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """
+        Asynchronously embed a single text.
+
+        Args:
+            text (str): The text to embed.
+
+        Returns:
+            list[float]: The embedding vector.
+        """
+        return await self.embeddings.aembed_query(text)
+
+    def stats(self) -> dict[str, float]:
+        """
+        Throughput and batching statistics.
+
+        Returns:
+            dict[str, float]: Texts embedded, batches sent, retries,
+                current batch size and throughput in chunks per second.
+        """
+        with self._lock:
+            return {
+                "chunks": self._chunks,
+                "batches": self._batches,
+                "retries": self._retries,
+                "batch_size": self.batch_size,
+                "chunks_per_second": (
+                    self._chunks / self._elapsed if self._elapsed else 0.0
+                ),
+            }
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed one batch, retrying with exponential backoff and adapting
+        the batch size to its latency.
+        """
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception:
+                with self._lock:
+                    self._retries += 1
+                    self._resize(self.batch_size // 2)
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+                attempt += 1
+                continue
+            self._adapt(len(texts), time.perf_counter() - started)
+            return vectors
+
+    def _adapt(self, size: int, latency: float) -> None:
+        """
+        Update the batch size from the latency of a finished batch.
+        """
+        throughput = size / latency if latency > 0 else float("inf")
+        with self._lock:
+            self._batches += 1
+            if size < self.batch_size // 2:
+                # a short tail batch says little about the server
+                return
+            if latency > self.target_latency:
+                self._resize(self.batch_size // 2)
+            elif throughput >= self._best_throughput:
+                self._resize(self.batch_size * 2)
+            elif throughput < 0.8 * self._best_throughput:
+                self._resize(self.batch_size * 3 // 4)
+            # let the reference decay so the size can recover later
+            self._best_throughput = max(
+                throughput, 0.9 * self._best_throughput
+            )
+
+    def _resize(self, batch_size: int) -> None:
+        """
+        Set the batch size within its bounds. The caller holds the lock.
+        """
+        self.batch_size = max(
+            self.min_batch_size, min(self.max_batch_size, batch_size)
+        )
+
+
+__all__ = ["EmbeddingExecutor"]
@@ -0,0 +1,79 @@
+import time
+from collections.abc import Callable
+from threading import Lock
+from typing import ClassVar, Generic, TypeVar
+
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Value built by a factory on first use.
+
+    Models, clients and vector stores pull in large libraries and open
+    connections or files; wrapping them in `Lazy` keeps that cost out of
+    import time, so a process only pays for what it uses. The factory
+    runs once, even when several threads ask for the value at the same
+    time. The time each value took to build, including the values its
+    factory builds in turn, is recorded for the startup report.
+
+    Attributes:
+        name (str): Name of the value in the startup report.
+        factory (Callable[[], T]): Builds the value.
+        elapsed (float | None): Seconds the factory took, None until the
+            value is built.
+
+    Methods:
+        get() -> T:
+            The value, built on the first call.
+        built -> bool:
+            Whether the value was built.
+        report() -> dict[str, float]:
+            Build time of every value built so far.
+    """
+    _built: ClassVar[list["Lazy"]] = []
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self.factory = factory
+        self.elapsed: float | None = None
+        self._value: T | None = None
+        self._lock = Lock()
+
+    def get(self) -> T:
+        """
+        The value, built on the first call.
+
+        Returns:
+            T: The value.
+        """
+        if self.elapsed is None:
+            with self._lock:
+                if self.elapsed is None:
+                    started = time.perf_counter()
+                    self._value = self.factory()
+                    self.elapsed = time.perf_counter() - started
+                    Lazy._built.append(self)
+        return self._value
+
+    @property
+    def built(self) -> bool:
+        """
+        Whether the value was built.
+        """
+        return self.elapsed is not None
+
+    @classmethod
+    def report(cls) -> dict[str, float]:
+        """
+        Build time of every value built so far.
+
+        Returns:
+            dict[str, float]: Seconds each value took to build, by name,
+                in build order.
+        """
+        return {lazy.name: lazy.elapsed for lazy in list(cls._built)}
+
+
+__all__ = ["Lazy"]
@@ -0,0 +1,106 @@
+import json
+import logging
+import sys
+
+from .settings import settings
+
+
+# attributes every log record has, the others come from `extra`
+_RECORD_FIELDS = set(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None))
+) | {"message", "asctime", "taskName"}
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Render log records with the fields passed in `extra`, as
+    `key=value` pairs after the message or as one JSON object per line.
+
+    Attributes:
+        json_lines (bool): Whether records are rendered as JSON.
+
+    Methods:
+        format(record: logging.LogRecord) -> str:
+            Render a record.
+    """
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Render a record.
+
+        Args:
+            record (logging.LogRecord): The record.
+
+        Returns:
+            str: The rendered record.
+        """
+        fields = {
+            key: value
+            for key, value in vars(record).items()
+            if key not in _RECORD_FIELDS
+        }
+        if self.json_lines:
+            payload = {
+                "time": self.formatTime(record),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+                **fields,
+            }
+            if record.exc_info:
+                payload["exception"] = self.formatException(record.exc_info)
+            return json.dumps(payload, default=str)
+
+        text = (
+            f"{self.formatTime(record)} {record.levelname} "
+            f"{record.name}: {record.getMessage()}"
+        )
+        if fields:
+            text += " " + " ".join(
+                f"{key}={json.dumps(value, default=str)}"
+                for key, value in fields.items()
+            )
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+def configure_logging(
+    level: str = settings.LOG_LEVEL,
+    format: str = settings.LOG_FORMAT
+) -> logging.Logger:
+    """
+    Send the logs of the application (the `src` loggers) to stderr.
+    Calling it again only changes the level and the format.
+
+    Args:
+        level (str): The lowest level logged, e.g. "INFO" or "DEBUG".
+        format (str): "text" for `key=value` lines, "json" for one JSON
+            object per line.
+
+    Returns:
+        logging.Logger: The `src` logger.
+    """
+    logger = logging.getLogger("src")
+    logger.setLevel(level.upper())
+    handler = next(
+        (
+            handler
+            for handler in logger.handlers
+            if isinstance(handler.formatter, StructuredFormatter)
+        ),
+        None,
+    )
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+        logger.addHandler(handler)
+        # the records are not printed again by the root logger
+        logger.propagate = False
+    handler.setFormatter(StructuredFormatter(json_lines=format == "json"))
+    return logger
+
+
+__all__ = ["configure_logging", "StructuredFormatter"]
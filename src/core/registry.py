@@ -0,0 +1,497 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import (
+    ChatGeneration,
+    ChatGenerationChunk,
+    ChatResult,
+)
+
+from .lazy import Lazy
+from .settings import settings
+from .tracing import LatencyHistogram
+
+
+logger = logging.getLogger(__name__)
+
+
+def keep_alive(value: bool | int | str) -> int | str:
+    """
+    Ollama `keep_alive` of a setting. Ollama reads a number as seconds,
+    so a boolean is mapped to "forever" (-1) or "unload now" (0) instead
+    of being sent as 1 or 0 seconds.
+
+    Args:
+        value (bool | int | str): The setting, a boolean, a number of
+            seconds or a duration such as "30m".
+
+    Returns:
+        int | str: The value to send to Ollama.
+    """
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        value = value.lower() == "true"
+    if isinstance(value, bool):
+        return -1 if value else 0
+    return value
+
+
+class BackendMetrics:
+    """
+    Load and latency of the requests sent to one backend. Safe to share
+    between threads.
+
+    Attributes:
+        in_flight (int): Requests sent and not finished yet, the queue
+            depth of the backend as seen by this process.
+        calls (int): Finished requests.
+        errors (int): Failed requests.
+        abandoned (int): Streams closed by the consumer before their
+            end, neither errors nor complete latency samples.
+        warmup (float | None): Seconds the last warmup took.
+
+    Methods:
+        start() -> None:
+            Count a request as in flight.
+        finish(elapsed: float, failed: bool, abandoned: bool) -> None:
+            Record a finished request.
+        snapshot() -> dict[str, float]:
+            Current metrics.
+    """
+    def __init__(self):
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.abandoned = 0
+        self.warmup: float | None = None
+        self._latency = LatencyHistogram()
+        self._lock = Lock()
+
+    def start(self) -> None:
+        """
+        Count a request as in flight.
+        """
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(
+        self,
+        elapsed: float,
+        failed: bool = False,
+        abandoned: bool = False
+    ) -> None:
+        """
+        Record a finished request.
+
+        Args:
+            elapsed (float): Seconds the request took.
+            failed (bool): Whether the request failed.
+            abandoned (bool): Whether the consumer stopped reading the
+                response before its end.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.calls += 1
+            self.errors += failed
+            self.abandoned += abandoned
+            if not failed and not abandoned:
+                self._latency.record(elapsed)
+
+    def snapshot(self) -> dict[str, float]:
+        """
+        Current metrics.
+
+        Returns:
+            dict[str, float]: Requests in flight, finished and failed,
+                abandoned streams, and the p50, p95 and p99 latency of
+                the successful requests, in milliseconds.
+        """
+        with self._lock:
+            latency = self._latency.snapshot()
+            return {
+                "in_flight": self.in_flight,
+                "calls": self.calls,
+                "errors": self.errors,
+                "abandoned": self.abandoned,
+                "p50_ms": latency["p50_ms"],
+                "p95_ms": latency["p95_ms"],
+                "p99_ms": latency["p99_ms"],
+                "warmup_ms": (
+                    self.warmup * 1000 if self.warmup is not None else 0.0
+                ),
+            }
+
+
+class ModelRegistry:
+    """
+    The chat model of each backend, with pooled connections, warmup,
+    load-based routing and metrics.
+
+    Each backend model is built once, on first use. Ollama requests go
+    through one HTTP connection pool per backend, shared by the chat
+    model, the embeddings and the warmup client, whose connections are
+    kept alive between requests. Gemini requests go through the single
+    client of its model, which keeps its own pool.
+
+    `router()` returns a chat model that sends each request to the
+    `primary` backend, or to the `fallback` one while `max_queue_depth`
+    requests are already in flight on the primary. `warmup()` loads the
+    models into the Ollama server before the first query, and every
+    request is recorded in the metrics of its backend.
+
+    Attributes:
+        primary (str): Backend that receives requests by default.
+        fallback (str | None): Backend that takes the overflow of the
+            primary, if any.
+        max_queue_depth (int): Requests in flight on the primary before
+            new ones go to the fallback.
+        metrics (dict[str, BackendMetrics]): Metrics of each backend.
+
+    Methods:
+        model(provider: str) -> BaseChatModel:
+            The chat model of a backend.
+        router() -> BaseChatModel:
+            A chat model routing each request to a backend.
+        route() -> str:
+            The backend the next request should go to.
+        track(provider: str) -> Iterator[None]:
+            Record a request in the metrics of its backend.
+        client_kwargs(provider: str) -> dict[str, Any]:
+            HTTP client arguments sharing the pool of a backend.
+        warmup(providers: list[str] | None) -> dict[str, float]:
+            Load the models of the backends.
+        stats() -> dict[str, dict[str, float]]:
+            Metrics of every backend.
+    """
+    PROVIDERS = ("ollama", "google")
+
+    def __init__(
+        self,
+        primary: str | None = None,
+        fallback: str | None = None,
+        max_queue_depth: int | None = None,
+        factories: dict[str, Callable[[], BaseChatModel]] | None = None,
+    ):
+        self.primary = primary or settings.CHAT_MODEL_PROVIDER
+        self.fallback = fallback or settings.MODEL_FALLBACK_PROVIDER
+        if self.fallback == self.primary:
+            self.fallback = None
+        self.max_queue_depth = (
+            max_queue_depth or settings.MODEL_MAX_QUEUE_DEPTH
+        )
+        factories = factories or {
+            "ollama": self._build_ollama,
+            "google": self._build_google,
+        }
+        self._models = {
+            provider: Lazy(f"model:{provider}", factory)
+            for provider, factory in factories.items()
+        }
+        self.metrics = {
+            provider: BackendMetrics() for provider in self._models
+        }
+        self._pools: dict[str, Any] = {}
+        self._lock = Lock()
+
+    def model(self, provider: str) -> BaseChatModel:
+        """
+        The chat model of a backend, built on first use.
+
+        Args:
+            provider (str): The backend.
+
+        Returns:
+            BaseChatModel: The chat model.
+
+        Raises:
+            ValueError: If the backend is unknown.
+        """
+        if provider not in self._models:
+            raise ValueError(f"Unknown chat model provider: {provider}")
+        return self._models[provider].get()
+
+    def router(self) -> BaseChatModel:
+        """
+        A chat model routing each request to a backend, see `route`.
+
+        Returns:
+            BaseChatModel: The routing chat model.
+        """
+        return RoutedChatModel(registry=self)
+
+    def route(self) -> str:
+        """
+        The backend the next request should go to: the primary, unless
+        it has `max_queue_depth` requests in flight and the fallback has
+        fewer.
+
+        Returns:
+            str: The backend.
+        """
+        if self.fallback is None:
+            return self.primary
+        primary = self.metrics[self.primary].in_flight
+        fallback = self.metrics[self.fallback].in_flight
+        if primary >= self.max_queue_depth and fallback < primary:
+            return self.fallback
+        return self.primary
+
+    @contextmanager
+    def track(self, provider: str) -> Iterator[None]:
+        """
+        Record a request in the metrics of its backend, from entering
+        the block until leaving it. A stream closed or cancelled by its
+        consumer is counted as abandoned, not as an error.
+
+        Args:
+            provider (str): The backend.
+        """
+        metrics = self.metrics[provider]
+        metrics.start()
+        started = time.perf_counter()
+        failed = True
+        abandoned = False
+        try:
+            yield
+            failed = False
+        except (GeneratorExit, asyncio.CancelledError):
+            failed, abandoned = False, True
+            raise
+        finally:
+            metrics.finish(time.perf_counter() - started, failed, abandoned)
+
+    def client_kwargs(self, provider: str) -> dict[str, Any]:
+        """
+        Arguments of a synchronous HTTP client sharing the connection
+        pool of a backend.
+
+        Args:
+            provider (str): The backend.
+
+        Returns:
+            dict[str, Any]: The `httpx.Client` arguments.
+        """
+        import httpx
+
+        with self._lock:
+            if provider not in self._pools:
+                self._pools[provider] = httpx.HTTPTransport(
+                    limits=self._limits()
+                )
+            return {"transport": self._pools[provider]}
+
+    def async_client_kwargs(self) -> dict[str, Any]:
+        """
+        Arguments of an asynchronous HTTP client with the pool limits of
+        the backends. Async pools are bound to their event loop, so each
+        client keeps its own.
+
+        Returns:
+            dict[str, Any]: The `httpx.AsyncClient` arguments.
+        """
+        return {"limits": self._limits()}
+
+    def warmup(self, providers: list[str] | None = None) -> dict[str, float]:
+        """
+        Build the models of the backends and load the Ollama chat and
+        embedding models into the server memory, where `KEEP_ALIVE`
+        keeps them, so the first query does not pay the load. Gemini
+        only builds its client. Failures are reported, not raised.
+
+        Args:
+            providers (list[str] | None): The backends. Defaults to the
+                primary and the fallback.
+
+        Returns:
+            dict[str, float]: Seconds each backend took to warm up.
+        """
+        providers = providers or [
+            provider
+            for provider in (self.primary, self.fallback)
+            if provider is not None
+        ]
+        elapsed = {}
+        for provider in providers:
+            started = time.perf_counter()
+            try:
+                self.model(provider)
+                if provider == "ollama":
+                    self._load_ollama()
+            except Exception as e:
+                logger.warning(
+                    "Warmup of the %s backend failed: %s", provider, e
+                )
+                continue
+            elapsed[provider] = time.perf_counter() - started
+            self.metrics[provider].warmup = elapsed[provider]
+        return elapsed
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """
+        Metrics of every backend, see `BackendMetrics.snapshot`.
+
+        Returns:
+            dict[str, dict[str, float]]: The metrics, by backend.
+        """
+        return {
+            provider: metrics.snapshot()
+            for provider, metrics in self.metrics.items()
+        }
+
+    def _limits(self) -> Any:
+        import httpx
+
+        return httpx.Limits(
+            max_connections=settings.MODEL_POOL_CONNECTIONS,
+            max_keepalive_connections=settings.MODEL_POOL_CONNECTIONS,
+            keepalive_expiry=settings.MODEL_KEEPALIVE_EXPIRY,
+        )
+
+    def _load_ollama(self) -> None:
+        """
+        Load the Ollama models: a generate request without a prompt only
+        loads the model, and a one-word embedding loads the embedder.
+        """
+        import ollama
+
+        client = ollama.Client(
+            host=settings.OLLAMA_BASE_URL, **self.client_kwargs("ollama")
+        )
+        duration = keep_alive(settings.KEEP_ALIVE)
+        client.generate(
+            model=settings.OLLAMA_CHAT_MODEL_NAME, keep_alive=duration
+        )
+        client.embed(
+            model=settings.OLLAMA_EMBEDDINGS_MODEL_NAME,
+            input="warmup",
+            keep_alive=duration,
+        )
+
+    def _build_ollama(self) -> BaseChatModel:
+        from langchain_ollama import ChatOllama
+
+        return ChatOllama(
+            model=settings.OLLAMA_CHAT_MODEL_NAME,
+            base_url=settings.OLLAMA_BASE_URL,
+            num_gpu=settings.NUM_GPU,
+            keep_alive=keep_alive(settings.KEEP_ALIVE),
+            temperature=settings.TEMPERATURE,
+            top_k=settings.TOP_K,
+            top_p=settings.TOP_P,
+            sync_client_kwargs=self.client_kwargs("ollama"),
+            async_client_kwargs=self.async_client_kwargs(),
+        )
+
+    def _build_google(self) -> BaseChatModel:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(
+            model=settings.GOOGLE_CHAT_MODEL_NAME,
+            api_key=settings.GOOGLE_API_KEY,
+        )
+
+
+class RoutedChatModel(BaseChatModel):
+    """
+    Chat model that sends each request to the backend chosen by its
+    registry, recording the request in the metrics of that backend.
+    Streams count as in flight until they are fully read or closed.
+
+    Attributes:
+        registry (ModelRegistry): The registry of the backends.
+    """
+    registry: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        provider = self.registry.route()
+        with self.registry.track(provider):
+            message = self.registry.model(provider).invoke(
+                messages, stop=stop, **kwargs
+            )
+        return _result(message)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        provider = self.registry.route()
+        with self.registry.track(provider):
+            message = await self.registry.model(provider).ainvoke(
+                messages, stop=stop, **kwargs
+            )
+        return _result(message)
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        provider = self.registry.route()
+        with self.registry.track(provider):
+            for chunk in self.registry.model(provider).stream(
+                messages, stop=stop, **kwargs
+            ):
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager is not None:
+                    run_manager.on_llm_new_token(
+                        str(chunk.content), chunk=generation
+                    )
+                yield generation
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        provider = self.registry.route()
+        with self.registry.track(provider):
+            async for chunk in self.registry.model(provider).astream(
+                messages, stop=stop, **kwargs
+            ):
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager is not None:
+                    await run_manager.on_llm_new_token(
+                        str(chunk.content), chunk=generation
+                    )
+                yield generation
+
+
+def _result(message: BaseMessage) -> ChatResult:
+    if not isinstance(message, AIMessage):
+        message = AIMessage(content=message.content)
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+__all__ = [
+    "BackendMetrics",
+    "keep_alive",
+    "ModelRegistry",
+    "RoutedChatModel",
+]
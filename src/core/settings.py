@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,16 +12,90 @@ class Settings(BaseSettings):
         str_strip_whitespace=True,
     )
 
+    VECTOR_BACKEND: Literal[
+        "chroma", "numpy", "faiss", "compressed"
+    ] = "chroma"
     CHROMA_PERSIST_DIRECTORY: str = "./chroma_langchain_db"
     CHROMA_COLLECTION_NAME: str = "default_collection"
+    NUMPY_PERSIST_DIRECTORY: str = "./numpy_db"
+    NUMPY_COMPACTION_RATIO: float = 0.25
+    FAISS_PERSIST_DIRECTORY: str = "./faiss_db"
+    FAISS_INDEX_TYPE: Literal["flat", "ivf_flat", "ivf_pq", "hnsw"] = "hnsw"
+    FAISS_NLIST: int = 1024
+    FAISS_PQ_M: int = 16
+    FAISS_HNSW_M: int = 32
+    FAISS_EF_CONSTRUCTION: int = 80
+    FAISS_NPROBE: int = 16
+    FAISS_EF_SEARCH: int = 64
+    COMPRESSION_PERSIST_DIRECTORY: str = "./compressed_db"
+    COMPRESSION_COMPONENTS: int | None = 128
+    COMPRESSION_QUANTIZATION: Literal["int8", "pq"] = "int8"
+    COMPRESSION_PQ_M: int = 16
+    COMPRESSION_TRAIN_SIZE: int = 4096
+    COMPRESSION_RERANK: bool = True
+    COMPRESSION_RERANK_FACTOR: int = 4
+    FINGERPRINT_INDEX_PATH: str = "./chroma_langchain_db/fingerprints.json"
+    SESSION_DIRECTORY: str = "./chroma_langchain_db/sessions"
+    SESSION_ID: str = "default"
     OLLAMA_EMBEDDINGS_MODEL_NAME: str = "embeddinggemma"
     OLLAMA_CHAT_MODEL_NAME: str = "gpt-oss:20b"
+    OLLAMA_BASE_URL: str | None = None
     NUM_GPU: int | None = None
-    KEEP_ALIVE: bool = True
+    KEEP_ALIVE: bool | int | str = True
     TEMPERATURE: float = 0.9
     TOP_K: int = 40
     TOP_P: float = 0.7
     GOOGLE_API_KEY: str = ""
+    GOOGLE_CHAT_MODEL_NAME: str = "gemini-3-pro-preview"
+    CHAT_MODEL_PROVIDER: Literal["ollama", "google"] = "ollama"
+    MODEL_FALLBACK_PROVIDER: Literal["ollama", "google"] | None = None
+    MODEL_MAX_QUEUE_DEPTH: int = 4
+    MODEL_POOL_CONNECTIONS: int = 16
+    MODEL_KEEPALIVE_EXPIRY: float = 300.0
+    MODEL_WARMUP: bool = True
+    STARTUP_REPORT: bool = False
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["text", "json"] = "text"
+    TRACING_ENABLED: bool = False
+    TRACE_PATH: str = "./traces/trace.json"
+    TRACE_MAX_EVENTS: int = 100_000
+    EMBEDDING_CONCURRENCY: int = 4
+    EMBEDDING_BATCH_SIZE: int = 32
+    EMBEDDING_MAX_BATCH_SIZE: int = 512
+    EMBEDDING_TARGET_LATENCY: float = 2.0
+    EMBEDDING_MAX_RETRIES: int = 3
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIRECTORY: str = "./embedding_cache"
+    EMBEDDING_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_MAX_ENTRIES: int = 1024
+    CONTEXT_COMPRESSION_ENABLED: bool = True
+    CONTEXT_DUPLICATE_THRESHOLD: float = 0.92
+    CONTEXT_MAX_TOKENS: int = 1024
+    SUMMARY_CACHE_PATH: str = "./summary_cache.json"
+    SUMMARY_CONCURRENCY: int = 4
+    SUMMARY_FAN_IN: int = 8
+    SUMMARY_TOKEN_BUDGET: int = 2048
+    FACT_INDEX_ENABLED: bool = True
+    FACT_INDEX_PATH: str = "./chroma_langchain_db/facts.sqlite3"
+    FACT_EXTRACTION_BATCH_SIZE: int = 256
+    FACT_MAX_RESULTS: int = 8
+    HYBRID_SEARCH_ENABLED: bool = True
+    LEXICAL_INDEX_PATH: str = "./chroma_langchain_db/bm25.npz"
+    HYBRID_CANDIDATES: int = 20
+    HYBRID_RRF_K: int = 60
+    RETRIEVAL_K: int = 5
+    RETRIEVAL_OVERSAMPLING: int = 4
+    RERANK_ENABLED: bool = True
+    RERANK_LEXICAL_WEIGHT: float = 0.3
+    BATCH_CONCURRENCY: int = 4
+    CHUNK_SIZE: int = 1000
+    CHUNK_OVERLAP: int = 200
+    INGEST_PAGE_WORKERS: int = 4
+    INGEST_PAGE_BATCH_SIZE: int = 16
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_QUEUE_SIZE: int = 4
 
 
 settings = Settings()
@@ -0,0 +1,357 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from threading import Lock
+from typing import Any, TypeVar
+
+from .settings import settings
+
+
+T = TypeVar("T")
+
+class LatencyHistogram:
+    """
+    Histogram of durations in logarithmic buckets.
+
+    A duration falls in the bucket of its logarithm in base
+    `1 + precision`, so memory does not grow with the number of samples
+    and a percentile is within `precision` of the recorded value.
+
+    Attributes:
+        precision (float): Relative width of a bucket.
+        count (int): Number of samples.
+        total (float): Sum of the samples, in seconds.
+        max (float): Largest sample, in seconds.
+
+    Methods:
+        record(seconds: float) -> None:
+            Add a sample.
+        percentile(q: float) -> float:
+            Duration below which `q` percent of the samples fall.
+        snapshot() -> dict[str, float]:
+            Count, mean, p50, p95, p99 and max, in milliseconds.
+    """
+    def __init__(self, precision: float = 0.02):
+        self.precision = precision
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._min = math.inf
+        self._log_base = math.log1p(precision)
+        self._buckets: dict[int, int] = {}
+
+    def record(self, seconds: float) -> None:
+        """
+        Add a sample.
+
+        Args:
+            seconds (float): The duration.
+        """
+        index = math.floor(math.log(max(seconds, 1e-9)) / self._log_base)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._min = min(self._min, seconds)
+
+    def percentile(self, q: float) -> float:
+        """
+        Duration below which `q` percent of the samples fall.
+
+        Args:
+            q (float): The percentile, from 0 to 100.
+
+        Returns:
+            float: The duration in seconds, 0 without samples.
+        """
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                # middle of the bucket, within the observed range
+                value = math.exp((index + 0.5) * self._log_base)
+                return min(max(value, self._min), self.max)
+        return self.max
+
+    def snapshot(self) -> dict[str, float]:
+        """
+        Summary of the samples.
+
+        Returns:
+            dict[str, float]: The count, and the mean, p50, p95, p99 and
+                max durations in milliseconds.
+        """
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "mean_ms": round(mean * 1000, 3),
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p95_ms": round(self.percentile(95) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class _Span:
+    """
+    Time a block and record it in the tracer on exit.
+    """
+    __slots__ = ("tracer", "name", "attributes", "started")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> "_Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, error, traceback) -> None:
+        if error_type is not None:
+            self.attributes["error"] = error_type.__name__
+        self.tracer.record(
+            self.name,
+            self.started,
+            time.perf_counter(),
+            **self.attributes,
+        )
+
+    def set(self, **attributes: Any) -> None:
+        """
+        Add attributes known only inside the block, e.g. result sizes.
+        """
+        self.attributes.update(attributes)
+
+
+class _NoopSpan:
+    """
+    Span used while tracing is disabled: entering and leaving it does
+    nothing.
+    """
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, error_type, error, traceback) -> None:
+        return None
+
+    def set(self, **attributes: Any) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """
+    Spans and latency histograms of the pipeline stages.
+
+    Each span is timed, added to the histogram of its name and kept as
+    a Chrome trace event, so a run can be opened in `chrome://tracing`
+    or Perfetto, with the spans of each thread nested by time. While
+    tracing is disabled `span` returns a shared no-op span and `record`
+    returns at once, so instrumented code costs one attribute check.
+
+    Attributes:
+        enabled (bool): Whether spans are recorded.
+        path (str | None): File the trace is written to on exit.
+        max_events (int): Number of most recent events kept for the
+            trace file. The histograms count every span.
+
+    Methods:
+        span(name: str, **attributes: Any) -> _Span:
+            Context manager timing a block.
+        record(name: str, started: float, finished: float,
+               **attributes: Any) -> None:
+            Record a span timed by the caller.
+        iterate(name: str, items: Iterable[T]) -> Iterable[T]:
+            Time the production of each item as a span.
+        stats() -> dict[str, dict[str, float]]:
+            Latency percentiles of each span name.
+        export(path: str | None = None) -> str | None:
+            Write the trace file.
+        reset() -> None:
+            Forget the recorded spans.
+    """
+    def __init__(
+        self,
+        enabled: bool = False,
+        path: str | None = None,
+        max_events: int = 100_000
+    ):
+        self.enabled = enabled
+        self.path = path
+        self.max_events = max_events
+        self._origin = time.perf_counter()
+        self._events: deque[dict[str, Any]] = deque(maxlen=max_events)
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._threads: dict[int, str] = {}
+        self._lock = Lock()
+        if path:
+            atexit.register(self.export)
+
+    def span(self, name: str, **attributes: Any) -> _Span | _NoopSpan:
+        """
+        Context manager timing a block as a span.
+
+        Args:
+            name (str): Name of the span, e.g. "ingest.embed". The part
+                before the first dot is its category in the trace.
+            **attributes (Any): Values shown with the span in the trace.
+
+        Returns:
+            _Span | _NoopSpan: The span, a shared no-op span while
+                tracing is disabled.
+        """
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, attributes)
+
+    def record(
+        self,
+        name: str,
+        started: float,
+        finished: float,
+        **attributes: Any
+    ) -> None:
+        """
+        Record a span timed by the caller.
+
+        Args:
+            name (str): Name of the span.
+            started (float): `time.perf_counter()` at the start.
+            finished (float): `time.perf_counter()` at the end.
+            **attributes (Any): Values shown with the span in the trace.
+        """
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": round((started - self._origin) * 1e6, 3),
+            "dur": round((finished - started) * 1e6, 3),
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": attributes,
+        }
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.record(finished - started)
+            self._events.append(event)
+            self._threads[thread.ident] = thread.name
+
+    def iterate(self, name: str, items: Iterable[T]) -> Iterable[T]:
+        """
+        Time the production of each item of a lazy iterable, e.g. the
+        pages of a PDF read on demand, as a span. The time the consumer
+        spends on an item is not included.
+
+        Args:
+            name (str): Name of the spans.
+            items (Iterable[T]): The items.
+
+        Returns:
+            Iterable[T]: The same items, `items` itself while tracing is
+                disabled.
+        """
+        if not self.enabled:
+            return items
+        return self._iterate(name, iter(items))
+
+    def _iterate(self, name: str, items: Iterator[T]) -> Iterator[T]:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            self.record(name, started, time.perf_counter())
+            yield item
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """
+        Latency percentiles of each span name.
+
+        Returns:
+            dict[str, dict[str, float]]: The count, and the mean, p50,
+                p95, p99 and max in milliseconds, by span name.
+        """
+        with self._lock:
+            return {
+                name: histogram.snapshot()
+                for name, histogram in sorted(self._histograms.items())
+            }
+
+    def export(self, path: str | None = None) -> str | None:
+        """
+        Write the recorded spans as a Chrome trace file (JSON object
+        format), with the latency histograms in its metadata.
+
+        Args:
+            path (str | None): The file, by default `path`.
+
+        Returns:
+            str | None: The file written, None when there is no path or
+                no span was recorded.
+        """
+        path = path or self.path
+        with self._lock:
+            if not path or not self._events:
+                return None
+            pid = os.getpid()
+            events = [
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+                for tid, name in self._threads.items()
+            ]
+            events.extend(self._events)
+        trace = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "metadata": {"latency": self.stats()},
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(trace, file, default=str)
+        os.replace(temporary, path)
+        return path
+
+    def reset(self) -> None:
+        """
+        Forget the recorded spans and histograms.
+        """
+        with self._lock:
+            self._events.clear()
+            self._histograms.clear()
+            self._threads.clear()
+
+
+tracer = Tracer(
+    enabled=settings.TRACING_ENABLED,
+    path=settings.TRACE_PATH,
+    max_events=settings.TRACE_MAX_EVENTS,
+)
+
+__all__ = ["LatencyHistogram", "Tracer", "tracer"]
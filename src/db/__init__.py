@@ -1,4 +1,45 @@
-from .vector import vector_db
+from importlib import import_module
+from typing import Any
 
+from .facts import FactIndex, get_fact_index
+from .fingerprint import FingerprintIndex, get_fingerprint_index
+from .lexical import BM25Index, get_lexical_index
+from .numpy_store import NumpyVectorStore
+from .session import SessionStore, session_store
+from .vector import get_vector_db
 
-__all__ = ["vector_db"]
+
+# imported on first access: FAISS is only needed by its backends, and
+# the vector store and the indexes are opened on use
+_LAZY = {
+    "CompressedVectorStore": ".compression",
+    "VectorCompressor": ".compression",
+    "FaissVectorStore": ".faiss_store",
+    "fact_index": ".facts",
+    "fingerprint_index": ".fingerprint",
+    "lexical_index": ".lexical",
+    "vector_db": ".vector",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY:
+        return getattr(import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "BM25Index",
+    "CompressedVectorStore",
+    "FactIndex",
+    "FaissVectorStore",
+    "FingerprintIndex",
+    "get_fact_index",
+    "get_fingerprint_index",
+    "get_lexical_index",
+    "get_vector_db",
+    "NumpyVectorStore",
+    "SessionStore",
+    "session_store",
+    "VectorCompressor",
+]
@@ -0,0 +1,942 @@
+import atexit
+import glob
+import json
+import os
+from collections.abc import Iterable, Sequence
+from threading import RLock
+from typing import Any, Literal
+from uuid import uuid4
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.utils.mmr import maximal_marginal_relevance
+
+
+Quantization = Literal["int8", "pq"]
+
+# bytes of float32 scratch space used per block when scoring codes
+_BLOCK_BYTES = 1 << 24
+# bits per PQ code, so 2 ** _PQ_BITS centroids per sub-quantizer
+_PQ_BITS = 8
+
+
+class VectorCompressor:
+    """
+    Lossy codec for embedding vectors: PCA followed by quantization.
+
+    PCA keeps the `components` directions with the most variance, then
+    each projected vector is quantized either to one int8 per component,
+    scaled per component, or to `pq_m` one-byte product quantization
+    codes. Inner products with a query are estimated directly from the
+    codes, block by block, so the collection is never decoded as a whole.
+
+    Attributes:
+        components (int | None): Number of PCA components to keep. None
+            keeps the full dimension.
+        quantization (Quantization): "int8" or "pq".
+        pq_m (int): Number of PQ sub-quantizers; must divide the number
+            of components.
+
+    Methods:
+        fit(vectors: np.ndarray) -> None:
+            Learn the projection and the quantizer.
+        encode(vectors: np.ndarray) -> np.ndarray:
+            Compress vectors to codes.
+        score(queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+            Estimated inner products between queries and encoded vectors.
+        save(path: str) -> None:
+            Save the fitted parameters.
+        load(path: str) -> VectorCompressor:
+            Load fitted parameters.
+    """
+    def __init__(
+        self,
+        components: int | None = 128,
+        quantization: Quantization = "int8",
+        pq_m: int = 16,
+    ):
+        self.components = components
+        self.quantization = quantization
+        self.pq_m = pq_m
+        self._mean: np.ndarray | None = None
+        self._projection: np.ndarray | None = None
+        self._scale: np.ndarray | None = None
+        self._centroids: np.ndarray | None = None
+
+    @property
+    def fitted(self) -> bool:
+        return self._projection is not None
+
+    @property
+    def code_size(self) -> int:
+        """
+        Bytes per encoded vector.
+        """
+        if self.quantization == "pq":
+            return self.pq_m
+        return len(self._projection) if self.fitted else 0
+
+    def fit(self, vectors: np.ndarray) -> None:
+        """
+        Learn the projection and the quantizer from a sample.
+
+        Args:
+            vectors (np.ndarray): Training vectors, one per row.
+
+        Raises:
+            ValueError: If the number of components is not a multiple of
+                `pq_m` with PQ.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        components = min(
+            self.components or vectors.shape[1], *vectors.shape
+        )
+        if self.quantization == "pq" and components % self.pq_m:
+            raise ValueError(
+                f"{components} components cannot be split into "
+                f"{self.pq_m} PQ sub-quantizers."
+            )
+        mean = vectors.mean(axis=0)
+        _, _, directions = np.linalg.svd(
+            vectors - mean, full_matrices=False
+        )
+        self._mean = mean
+        self._projection = np.ascontiguousarray(directions[:components])
+        projected = self._project(vectors)
+
+        if self.quantization == "pq":
+            quantizer = faiss.ProductQuantizer(
+                components, self.pq_m, _PQ_BITS
+            )
+            quantizer.train(projected)
+            self._centroids = faiss.vector_to_array(
+                quantizer.centroids
+            ).reshape(self.pq_m, quantizer.ksub, quantizer.dsub)
+        else:
+            scale = np.abs(projected).max(axis=0) / 127
+            scale[scale == 0] = 1.0
+            self._scale = scale.astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Compress vectors to codes.
+
+        Args:
+            vectors (np.ndarray): Vectors, one per row.
+
+        Returns:
+            np.ndarray: int8 codes of shape (n, components) or uint8 PQ
+                codes of shape (n, pq_m).
+        """
+        projected = self._project(np.asarray(vectors, dtype=np.float32))
+        if self.quantization != "pq":
+            return np.clip(
+                np.rint(projected / self._scale), -127, 127
+            ).astype(np.int8)
+
+        subvectors = projected.reshape(len(projected), self.pq_m, -1)
+        codes = np.empty((len(projected), self.pq_m), dtype=np.uint8)
+        for m, centroids in enumerate(self._centroids):
+            distances = (
+                (centroids ** 2).sum(axis=1)
+                - 2 * subvectors[:, m] @ centroids.T
+            )
+            codes[:, m] = distances.argmin(axis=1)
+        return codes
+
+    def score(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """
+        Estimated inner products between queries and encoded vectors.
+
+        Args:
+            queries (np.ndarray): Query vectors, one per row.
+            codes (np.ndarray): Codes from `encode`.
+
+        Returns:
+            np.ndarray: Scores of shape (len(queries), len(codes)).
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        bias = queries @ self._mean
+        projected = queries @ self._projection.T
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        block = max(
+            1024, _BLOCK_BYTES // (4 * len(queries) * codes.shape[1])
+        )
+
+        if self.quantization == "pq":
+            # one lookup table per query and sub-quantizer
+            tables = np.einsum(
+                "qmd,mkd->qmk",
+                projected.reshape(len(queries), self.pq_m, -1),
+                self._centroids,
+            )
+            subquantizers = np.arange(self.pq_m)
+            for start in range(0, len(codes), block):
+                chunk = codes[start:start + block]
+                scores[:, start:start + len(chunk)] = tables[
+                    :, subquantizers, chunk
+                ].sum(axis=2)
+        else:
+            weights = projected * self._scale
+            for start in range(0, len(codes), block):
+                chunk = codes[start:start + block].astype(np.float32)
+                scores[:, start:start + len(chunk)] = weights @ chunk.T
+        return scores + bias[:, None]
+
+    def save(self, path: str) -> None:
+        """
+        Save the fitted parameters to a `.npz` file.
+
+        Args:
+            path (str): The file to write.
+        """
+        arrays = {"mean": self._mean, "projection": self._projection}
+        if self.quantization == "pq":
+            arrays["centroids"] = self._centroids
+        else:
+            arrays["scale"] = self._scale
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        quantization: Quantization = "int8",
+        pq_m: int = 16,
+    ) -> "VectorCompressor":
+        """
+        Load parameters saved by `save`.
+
+        Args:
+            path (str): The `.npz` file.
+            quantization (Quantization): The quantization it was fitted
+                with.
+            pq_m (int): The number of PQ sub-quantizers it was fitted
+                with.
+
+        Returns:
+            VectorCompressor: The fitted compressor.
+        """
+        with np.load(path) as arrays:
+            compressor = cls(
+                components=len(arrays["projection"]),
+                quantization=quantization,
+                pq_m=pq_m,
+            )
+            compressor._mean = arrays["mean"]
+            compressor._projection = arrays["projection"]
+            if quantization == "pq":
+                compressor._centroids = arrays["centroids"]
+            else:
+                compressor._scale = arrays["scale"]
+        return compressor
+
+    def _project(self, vectors: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(
+            (vectors - self._mean) @ self._projection.T, dtype=np.float32
+        )
+
+
+class CompressedVectorStore(VectorStore):
+    """
+    Vector store that searches over compressed vectors.
+
+    Only the codes of a `VectorCompressor` are scanned at query time. The
+    full-precision vectors are kept in a memory-mapped file under
+    `persist_directory` and read back only for the few candidates that
+    are reranked exactly, so the resident search data shrinks by the
+    compression ratio. Until `train_size` vectors are stored the
+    compressor cannot be fitted and search is exact; then it is fitted
+    on a random sample and every stored vector is encoded.
+
+    `persist`, which the services call after each ingest and removal,
+    commits the IDs, texts, tombstones and codes to one file that
+    replaces the previous one atomically. Rows of the vector file that
+    committed file refers to are never rewritten: new rows are appended
+    past them, and a compaction writes the kept rows to a new vector
+    file, which the next commit switches to. A crash therefore leaves
+    the last committed store intact.
+
+    Attributes:
+        embedding_function (Embeddings): The embedding model.
+        persist_directory (str | None): Directory the store is saved to.
+            When None, the full-precision vectors stay in memory.
+        compressor (VectorCompressor): The codec.
+        train_size (int): Vectors needed before the compressor is fitted.
+            With PQ it is at least the 39 points per centroid FAISS
+            needs to train the codebooks.
+        rerank (bool): Rerank candidates with full-precision vectors.
+        rerank_factor (int): Candidates per requested result when
+            reranking.
+        compaction_ratio (float): Share of deleted rows that triggers a
+            compaction.
+
+    Methods:
+        add_embeddings(text_embeddings, metadatas, ids) -> list[str]:
+            Add texts whose embeddings were already computed.
+        similarity_search_by_vectors(embeddings, k, filter)
+            -> list[list[Document]]:
+            Search for many query vectors at once.
+        max_marginal_relevance_search_by_vectors(embeddings, k, fetch_k,
+            lambda_mult, filter) -> list[list[Document]]:
+            Diverse search for many query vectors.
+        recall_at_k(embeddings, k) -> float:
+            Share of the exact top k that the compressed search returns.
+        stats() -> dict[str, Any]:
+            Size of the codes against the uncompressed vectors.
+        compact() -> None:
+            Drop deleted rows.
+        persist() -> None:
+            Save the store to `persist_directory`.
+    """
+    def __init__(
+        self,
+        embedding_function: Embeddings,
+        persist_directory: str | None = None,
+        components: int | None = 128,
+        quantization: Quantization = "int8",
+        pq_m: int = 16,
+        train_size: int = 4096,
+        rerank: bool = True,
+        rerank_factor: int = 4,
+        compaction_ratio: float = 0.25,
+    ):
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.compressor = VectorCompressor(components, quantization, pq_m)
+        # FAISS warns below 39 points per centroid
+        self.train_size = (
+            max(train_size, 39 * 2 ** _PQ_BITS)
+            if quantization == "pq"
+            else train_size
+        )
+        self.rerank = rerank
+        self.rerank_factor = rerank_factor
+        self.compaction_ratio = compaction_ratio
+        self._lock = RLock()
+        self._vectors: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self._codes: np.ndarray = np.zeros((0, 0), dtype=np.int8)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._deleted = 0
+        self._ids: list[str] = []
+        self._texts: list[str] = []
+        self._metadatas: list[dict[str, Any]] = []
+        self._rows: dict[str, int] = {}
+        # the vector file in use is vectors.f32, then vectors-<n>.f32
+        # after the n-th compaction
+        self._generation = 0
+        self._dirty = False
+
+        if persist_directory:
+            os.makedirs(persist_directory, exist_ok=True)
+            self._load()
+            atexit.register(self.persist)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(
+            list(zip(texts, vectors)), metadatas=metadatas, ids=ids
+        )
+
+    def add_embeddings(
+        self,
+        text_embeddings: Iterable[tuple[str, list[float]]],
+        metadatas: list[dict] | None = None,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        """
+        Add texts whose embeddings were already computed. Existing IDs are
+        replaced.
+
+        Args:
+            text_embeddings (Iterable[tuple[str, list[float]]]): Pairs of
+                text and embedding.
+            metadatas (list[dict] | None): Optional metadata per text.
+            ids (list[str] | None): Optional IDs; random ones otherwise.
+
+        Returns:
+            list[str]: The IDs of the added texts.
+        """
+        pairs = list(text_embeddings)
+        if not pairs:
+            return []
+        ids = ids or [str(uuid4()) for _ in pairs]
+        metadatas = metadatas or [{} for _ in pairs]
+        vectors = self._normalize(
+            np.asarray([vector for _, vector in pairs], dtype=np.float32)
+        )
+
+        with self._lock:
+            self._mark_deleted([id for id in ids if id in self._rows])
+            self._reserve(self._size + len(pairs), vectors.shape[1])
+            start, stop = self._size, self._size + len(pairs)
+            self._vectors[start:stop] = vectors
+            self._alive[start:stop] = True
+            if self.compressor.fitted:
+                self._codes[start:stop] = self.compressor.encode(vectors)
+            for offset, (id, (text, _), metadata) in enumerate(
+                zip(ids, pairs, metadatas)
+            ):
+                self._rows[id] = start + offset
+                self._ids.append(id)
+                self._texts.append(text)
+                self._metadatas.append(dict(metadata or {}))
+            self._size = stop
+            self._dirty = True
+            if not self.compressor.fitted and (
+                self._size - self._deleted >= self.train_size
+            ):
+                self._fit()
+            self._maybe_compact()
+        return ids
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> None:
+        """
+        Delete documents by ID, leaving tombstones until the next
+        compaction.
+        """
+        if not ids:
+            return
+        with self._lock:
+            self._mark_deleted([id for id in ids if id in self._rows])
+            self._dirty = True
+            self._maybe_compact()
+
+    def update_document(self, document_id: str, document: Document) -> None:
+        """
+        Replace the text and metadata of a document, re-embedding it.
+        """
+        self.add_texts(
+            [document.page_content],
+            metadatas=[document.metadata],
+            ids=[document_id],
+        )
+
+    def get_by_ids(self, ids: Sequence[str], /) -> list[Document]:
+        with self._lock:
+            return [
+                self._document(self._rows[id])
+                for id in ids
+                if id in self._rows
+            ]
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.similarity_search_by_vector(
+            self.embedding_function.embed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[tuple[Document, float]]:
+        """
+        Search for a query, returning the cosine similarity of each hit,
+        exact when reranked and estimated from the codes otherwise.
+        """
+        embedding = self.embedding_function.embed_query(query)
+        with self._lock:
+            return [
+                (self._document(row), score)
+                for row, score in self._search([embedding], k, filter)[0]
+            ]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.similarity_search_by_vectors([embedding], k, filter)[0]
+
+    def similarity_search_by_vectors(
+        self,
+        embeddings: list[list[float]],
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+    ) -> list[list[Document]]:
+        """
+        Search for many query vectors at once.
+
+        Args:
+            embeddings (list[list[float]]): The query vectors.
+            k (int): Number of documents to return per query.
+            filter (dict[str, Any] | None): Optional metadata equality
+                filter applied to all queries.
+
+        Returns:
+            list[list[Document]]: The most similar documents of each
+                query, best first.
+        """
+        with self._lock:
+            return [
+                [self._document(row) for row, _ in hits]
+                for hits in self._search(embeddings, k, filter)
+            ]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query),
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            filter=filter,
+        )
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.max_marginal_relevance_search_by_vectors(
+            [embedding], k, fetch_k, lambda_mult, filter
+        )[0]
+
+    def max_marginal_relevance_search_by_vectors(
+        self,
+        embeddings: list[list[float]],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None,
+    ) -> list[list[Document]]:
+        """
+        Diverse search for many query vectors.
+
+        The `fetch_k` candidates of every query are found in the codes,
+        their full-precision vectors are read from the vector file, and
+        `k` of them are selected with maximal marginal relevance, all
+        queries at once.
+
+        Args:
+            embeddings (list[list[float]]): The query vectors.
+            k (int): Number of documents to return per query.
+            fetch_k (int): Number of candidates per query.
+            lambda_mult (float): 1 for pure relevance, 0 for pure
+                diversity.
+            filter (dict[str, Any] | None): Optional metadata equality
+                filter applied to all queries.
+
+        Returns:
+            list[list[Document]]: The selected documents of each query,
+                in selection order.
+        """
+        with self._lock:
+            hits = self._search(embeddings, max(k, fetch_k), filter)
+            if not hits or not hits[0]:
+                return [[] for _ in embeddings]
+            rows = np.asarray(
+                [[row for row, _ in row_hits] for row_hits in hits],
+                dtype=np.int64,
+            )
+            selected = maximal_marginal_relevance(
+                np.asarray(embeddings, dtype=np.float32),
+                self._vectors[rows],
+                k,
+                lambda_mult,
+            )
+            return [
+                [self._document(row) for row in candidates[indices]]
+                for candidates, indices in zip(rows, selected)
+            ]
+
+    def _select_relevance_score_fn(self):
+        # scores are already cosine similarities
+        return lambda score: score
+
+    def recall_at_k(self, embeddings: list[list[float]], k: int = 10) -> float:
+        """
+        Share of the exact top k that the compressed search returns.
+
+        Args:
+            embeddings (list[list[float]]): Query vectors to measure with.
+            k (int): Number of results per query.
+
+        Returns:
+            float: Mean recall@k over the queries.
+        """
+        with self._lock:
+            found = self._search(embeddings, k, None)
+            exact = self._search(embeddings, k, None, exact=True)
+            recalls = [
+                len({row for row, _ in hits} & {row for row, _ in truth})
+                / len(truth)
+                for hits, truth in zip(found, exact)
+                if truth
+            ]
+            return float(np.mean(recalls)) if recalls else 1.0
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Size of the codes against the uncompressed vectors.
+
+        Returns:
+            dict[str, Any]: Stored documents, whether the compressor is
+                fitted, bytes of codes scanned per search, bytes the
+                float32 vectors would take, and their ratio.
+        """
+        with self._lock:
+            documents = self._size - self._deleted
+            dimensions = self._vectors.shape[1]
+            if self.compressor.fitted:
+                code_bytes = documents * self.compressor.code_size
+            else:
+                code_bytes = documents * dimensions * 4
+            float_bytes = documents * dimensions * 4
+            return {
+                "documents": documents,
+                "fitted": self.compressor.fitted,
+                "code_bytes": code_bytes,
+                "float32_bytes": float_bytes,
+                "compression_ratio": (
+                    float_bytes / code_bytes if code_bytes else 1.0
+                ),
+            }
+
+    def compact(self) -> None:
+        """
+        Drop deleted rows. In memory the kept rows move to the front in
+        place; with a `persist_directory` they are copied to a new vector
+        file, so the file of the last committed store stays intact.
+        """
+        with self._lock:
+            keep = np.flatnonzero(self._alive[:self._size])
+            vectors = self._vectors
+            if self.persist_directory and len(self._vectors):
+                self._generation += 1
+                vectors = np.memmap(
+                    self._vectors_path(),
+                    dtype=np.float32,
+                    mode="w+",
+                    shape=(max(len(keep), 1024), self._vectors.shape[1]),
+                )
+            # keep[i] >= i, so copying forward never reads a moved row
+            for start in range(0, len(keep), 65536):
+                rows = keep[start:start + 65536]
+                vectors[start:start + len(rows)] = self._vectors[rows]
+                if self.compressor.fitted:
+                    self._codes[start:start + len(rows)] = self._codes[rows]
+            if vectors is not self._vectors:
+                alive = np.zeros(len(vectors), dtype=bool)
+                if self.compressor.fitted:
+                    codes = self._allocate_codes(len(vectors))
+                    codes[:len(keep)] = self._codes[:len(keep)]
+                    self._codes = codes
+                self._vectors = vectors
+                self._alive = alive
+            self._alive[:len(keep)] = True
+            self._alive[len(keep):] = False
+            self._ids = [self._ids[row] for row in keep]
+            self._texts = [self._texts[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._rows = {id: row for row, id in enumerate(self._ids)}
+            self._size = len(keep)
+            self._deleted = 0
+            self._dirty = True
+
+    def persist(self) -> None:
+        """
+        Commit the store to `persist_directory`: flush the vector file,
+        then write the IDs, texts, metadata, tombstones and codes to a
+        temporary file that replaces the committed one atomically, and
+        delete the vector files no longer referenced.
+        """
+        if not self.persist_directory:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+            arrays = {"alive": self._alive[:self._size]}
+            if self.compressor.fitted:
+                # fitted once, so it never disagrees with committed codes
+                temporary_path = self._path("compressor.tmp.npz")
+                self.compressor.save(temporary_path)
+                os.replace(temporary_path, self._path("compressor.npz"))
+                arrays["codes"] = self._codes[:self._size]
+            arrays["documents"] = np.frombuffer(
+                json.dumps({
+                    "quantization": self.compressor.quantization,
+                    "pq_m": self.compressor.pq_m,
+                    "dimensions": self._vectors.shape[1],
+                    "generation": self._generation,
+                    "ids": self._ids,
+                    "texts": self._texts,
+                    "metadatas": self._metadatas,
+                }).encode("utf-8"),
+                dtype=np.uint8,
+            )
+            path = self._path("store.npz")
+            temporary_path = path + ".tmp"
+            with open(temporary_path, "wb") as file:
+                np.savez(file, **arrays)
+            os.replace(temporary_path, path)
+            self._remove_stale_vectors()
+            self._dirty = False
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> "CompressedVectorStore":
+        store = cls(embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def _search(
+        self,
+        embeddings: list[list[float]],
+        k: int,
+        filter: dict[str, Any] | None,
+        exact: bool = False,
+    ) -> list[list[tuple[int, float]]]:
+        """
+        Top k rows and their score for each query vector. The caller
+        holds the lock.
+
+        Candidates are ranked by the scores estimated from the codes and,
+        with `rerank`, `rerank_factor` times more of them are rescored
+        with the full-precision vectors.
+        """
+        if self._size == 0 or k <= 0:
+            return [[] for _ in embeddings]
+        queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        mask = self._alive[:self._size]
+        if filter:
+            mask = mask & np.fromiter(
+                (
+                    all(metadata.get(key) == value
+                        for key, value in filter.items())
+                    for metadata in self._metadatas
+                ),
+                dtype=bool,
+                count=self._size,
+            )
+        available = int(mask.sum())
+        k = min(k, available)
+        if k == 0:
+            return [[] for _ in embeddings]
+
+        compressed = self.compressor.fitted and not exact
+        if compressed:
+            scores = self.compressor.score(queries, self._codes[:self._size])
+        else:
+            scores = queries @ self._vectors[:self._size].T
+        scores[:, ~mask] = -np.inf
+
+        fetch = k
+        if compressed and self.rerank:
+            fetch = min(k * self.rerank_factor, available)
+        top = np.argpartition(-scores, fetch - 1, axis=1)[:, :fetch]
+        if compressed and self.rerank:
+            # sorted rows read the vector file front to back
+            top = np.sort(top, axis=1)
+            top_scores = np.einsum(
+                "qcd,qd->qc", self._vectors[top], queries
+            )
+        else:
+            top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)[:, :k]
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [
+            list(zip(rows.tolist(), row_scores.tolist()))
+            for rows, row_scores in zip(top, top_scores)
+        ]
+
+    def _fit(self) -> None:
+        """
+        Fit the compressor on a random sample and encode every row.
+        """
+        alive = np.flatnonzero(self._alive[:self._size])
+        sample = np.random.default_rng(0).choice(
+            alive, min(self.train_size, len(alive)), replace=False
+        )
+        self.compressor.fit(self._vectors[np.sort(sample)])
+        self._codes = self._allocate_codes(len(self._vectors))
+        for start in range(0, self._size, 65536):
+            stop = min(start + 65536, self._size)
+            self._codes[start:stop] = self.compressor.encode(
+                self._vectors[start:stop]
+            )
+
+    def _allocate_codes(self, capacity: int) -> np.ndarray:
+        dtype = np.uint8 if self.compressor.quantization == "pq" else np.int8
+        return np.zeros((capacity, self.compressor.code_size), dtype=dtype)
+
+    def _document(self, row: int) -> Document:
+        return Document(
+            page_content=self._texts[row],
+            metadata=dict(self._metadatas[row]),
+            id=self._ids[row],
+        )
+
+    def _mark_deleted(self, ids: list[str]) -> None:
+        for id in ids:
+            self._alive[self._rows.pop(id)] = False
+        self._deleted += len(ids)
+
+    def _maybe_compact(self) -> None:
+        if self._size and self._deleted >= self.compaction_ratio * self._size:
+            self.compact()
+
+    def _reserve(self, size: int, dimensions: int) -> None:
+        """
+        Grow the vectors, codes and tombstones geometrically. With a
+        `persist_directory` the vector file is extended and mapped again.
+        """
+        if self._vectors.shape[1] not in (0, dimensions):
+            raise ValueError(
+                f"Expected vectors of size {self._vectors.shape[1]}, "
+                f"got {dimensions}."
+            )
+        if size <= len(self._vectors):
+            return
+        capacity = max(size, 2 * len(self._vectors), 1024)
+        if self.persist_directory:
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+            path = self._vectors_path()
+            with open(path, "ab") as file:
+                file.truncate(capacity * dimensions * 4)
+            vectors = np.memmap(
+                path,
+                dtype=np.float32,
+                mode="r+",
+                shape=(capacity, dimensions),
+            )
+        else:
+            vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+            if self._size:
+                vectors[:self._size] = self._vectors[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        if self.compressor.fitted:
+            codes = self._allocate_codes(capacity)
+            codes[:self._size] = self._codes[:self._size]
+            self._codes = codes
+        self._vectors = vectors
+        self._alive = alive
+
+    def _load(self) -> None:
+        path = self._path("store.npz")
+        if not os.path.exists(path):
+            return
+        with np.load(path) as saved:
+            documents = json.loads(saved["documents"].tobytes())
+            alive = saved["alive"]
+            codes = saved["codes"] if "codes" in saved else None
+        saved = (documents["quantization"], documents["pq_m"])
+        if saved != (self.compressor.quantization, self.compressor.pq_m):
+            raise ValueError(
+                f"{self.persist_directory} holds {saved[0]} codes with "
+                f"pq_m={saved[1]}; choose another directory or load the "
+                "documents again."
+            )
+        self._generation = documents["generation"]
+        vectors_path = self._vectors_path()
+        if not os.path.exists(vectors_path):
+            return
+        dimensions = documents["dimensions"]
+        capacity = os.path.getsize(vectors_path) // (dimensions * 4)
+        self._vectors = np.memmap(
+            vectors_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(capacity, dimensions),
+        )
+        self._ids = documents["ids"]
+        self._texts = documents["texts"]
+        self._metadatas = documents["metadatas"]
+        self._size = len(self._ids)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:self._size] = alive
+        self._deleted = self._size - int(alive.sum())
+        self._rows = {
+            id: row
+            for row, id in enumerate(self._ids)
+            if self._alive[row]
+        }
+        if codes is not None and os.path.exists(
+            self._path("compressor.npz")
+        ):
+            self.compressor = VectorCompressor.load(
+                self._path("compressor.npz"),
+                self.compressor.quantization,
+                self.compressor.pq_m,
+            )
+            self._codes = self._allocate_codes(capacity)
+            self._codes[:self._size] = codes
+
+    def _vectors_path(self) -> str:
+        if self._generation == 0:
+            return self._path("vectors.f32")
+        return self._path(f"vectors-{self._generation}.f32")
+
+    def _remove_stale_vectors(self) -> None:
+        """
+        Delete the vector files other than the one in use, e.g. the one
+        of a compaction interrupted before its commit, which the next
+        compaction would overwrite anyway.
+        """
+        current = self._vectors_path()
+        for path in glob.glob(self._path("vectors*.f32")):
+            if path != current:
+                os.remove(path)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+__all__ = ["CompressedVectorStore", "VectorCompressor"]
@@ -0,0 +1,315 @@
+import os
+import sqlite3
+from collections.abc import Iterator
+from threading import RLock
+from typing import Any
+
+from langchain_core.documents import Document
+
+from src.core import Lazy, settings
+from src.schemas import FactSchema
+from src.utils.extraction import FactExtractor
+
+
+# SQLite limits the number of bound parameters per statement.
+_PARAMETERS_PER_QUERY = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL DEFAULT '',
+    page INTEGER
+);
+CREATE TABLE IF NOT EXISTS facts (
+    id INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL DEFAULT '',
+    value TEXT NOT NULL,
+    number REAL,
+    year INTEGER,
+    sentence TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fact_terms (
+    fact_id INTEGER NOT NULL,
+    term TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS facts_chunk ON facts (chunk_id);
+CREATE INDEX IF NOT EXISTS fact_terms_term ON fact_terms (term, fact_id);
+CREATE INDEX IF NOT EXISTS fact_terms_fact ON fact_terms (fact_id);
+"""
+
+
+class FactIndex:
+    """
+    Persistent index of the facts extracted from the chunks, on SQLite.
+
+    Every chunk whose facts were extracted is recorded, even when it had
+    none, so an interrupted extraction resumes with the chunks still
+    pending. Facts are looked up by the normalized terms of their key or
+    value and by year, which answers "what was the revenue in 2023"
+    with an index lookup instead of a vector search. The index is safe
+    to share between threads.
+
+    Attributes:
+        path (str | None): SQLite file the index is stored in. When None,
+            the index only lives in memory.
+
+    Methods:
+        pending(ids: list[str]) -> list[str]:
+            The chunk IDs whose facts were not extracted yet.
+        add(entries) -> None:
+            Store the facts of a batch of chunks.
+        delete(ids: list[str]) -> None:
+            Remove the facts of some chunks.
+        search(terms, years, kinds, limit) -> list[FactSchema]:
+            Find the facts matching query terms.
+        stats() -> dict[str, int]:
+            Number of chunks and of facts of each kind.
+    """
+    def __init__(self, path: str | None = None):
+        self.path = path
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(
+            path or ":memory:",
+            check_same_thread=False,
+        )
+        self._lock = RLock()
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def pending(self, ids: list[str]) -> list[str]:
+        """
+        The chunk IDs whose facts were not extracted yet.
+
+        Args:
+            ids (list[str]): The chunk IDs to check.
+
+        Returns:
+            list[str]: The IDs not in the index, in the given order.
+        """
+        done: set[str] = set()
+        with self._lock:
+            for batch in self._batches(ids):
+                done.update(
+                    row[0]
+                    for row in self._connection.execute(
+                        "SELECT chunk_id FROM chunks WHERE chunk_id IN "
+                        f"({self._placeholders(batch)})",
+                        batch,
+                    )
+                )
+        return [id for id in ids if id not in done]
+
+    def add(
+        self,
+        entries: list[tuple[str, Document, list[FactSchema]]],
+    ) -> None:
+        """
+        Store the facts of a batch of chunks in one transaction.
+
+        A metric is looked up by the terms of its key, any other fact by
+        the terms of its value.
+
+        Args:
+            entries (list[tuple[str, Document, list[FactSchema]]]): The
+                ID of each chunk, the chunk and the facts extracted from
+                it. Chunks already in the index are replaced.
+        """
+        with self._lock, self._connection:
+            self._delete([id for id, _, _ in entries])
+            for id, document, facts in entries:
+                self._connection.execute(
+                    "INSERT INTO chunks (chunk_id, source, page) "
+                    "VALUES (?, ?, ?)",
+                    (
+                        id,
+                        str(document.metadata.get("source", "")),
+                        document.metadata.get("page"),
+                    ),
+                )
+                for fact in facts:
+                    cursor = self._connection.execute(
+                        "INSERT INTO facts (chunk_id, kind, key, value, "
+                        "number, year, sentence) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            id,
+                            fact.kind,
+                            fact.key,
+                            fact.value,
+                            fact.number,
+                            fact.year,
+                            fact.sentence,
+                        ),
+                    )
+                    self._connection.executemany(
+                        "INSERT INTO fact_terms (fact_id, term) "
+                        "VALUES (?, ?)",
+                        (
+                            (cursor.lastrowid, term)
+                            for term in dict.fromkeys(
+                                FactExtractor.terms(fact.key or fact.value)
+                            )
+                        ),
+                    )
+
+    def delete(self, ids: list[str]) -> None:
+        """
+        Remove the facts of some chunks.
+
+        Args:
+            ids (list[str]): The chunk IDs to remove.
+        """
+        with self._lock, self._connection:
+            self._delete(ids)
+
+    def search(
+        self,
+        terms: list[str],
+        years: list[int] | None = None,
+        kinds: tuple[str, ...] = ("metric",),
+        limit: int = settings.FACT_MAX_RESULTS,
+        sources: list[str] | None = None,
+    ) -> list[FactSchema]:
+        """
+        Find the facts matching query terms.
+
+        Args:
+            terms (list[str]): Normalized query terms.
+            years (list[int] | None): When given, only facts about one of
+                these years match.
+            kinds (tuple[str, ...]): The kinds of facts to look for.
+            limit (int): Maximum number of facts to return.
+            sources (list[str] | None): When given, only facts of chunks
+                from these files match, e.g. the files of a chat session.
+
+        Returns:
+            list[FactSchema]: The facts sharing the most terms with the
+                query first, with their chunk, source and page.
+        """
+        terms = list(dict.fromkeys(terms))[:_PARAMETERS_PER_QUERY // 2]
+        if not terms or not kinds:
+            return []
+        query = (
+            "SELECT f.chunk_id, f.kind, f.key, f.value, f.number, f.year, "
+            "f.sentence, c.source, c.page, "
+            "COUNT(DISTINCT t.term) AS score "
+            "FROM fact_terms t "
+            "JOIN facts f ON f.id = t.fact_id "
+            "JOIN chunks c ON c.chunk_id = f.chunk_id "
+            f"WHERE t.term IN ({self._placeholders(terms)}) "
+            f"AND f.kind IN ({self._placeholders(kinds)}) "
+        )
+        parameters: list = [*terms, *kinds]
+        if years:
+            query += f"AND f.year IN ({self._placeholders(years)}) "
+            parameters.extend(years)
+        if sources is not None:
+            sources = sources[:_PARAMETERS_PER_QUERY // 2]
+            query += f"AND c.source IN ({self._placeholders(sources)}) "
+            parameters.extend(sources)
+        query += "GROUP BY f.id ORDER BY score DESC, f.id LIMIT ?"
+        parameters.append(limit)
+
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+        return [
+            FactSchema(
+                chunk_id=chunk_id,
+                kind=kind,
+                key=key,
+                value=value,
+                number=number,
+                year=year,
+                sentence=sentence,
+                source=source,
+                page=page,
+            )
+            for (
+                chunk_id, kind, key, value, number, year, sentence, source,
+                page, _,
+            ) in rows
+        ]
+
+    def stats(self) -> dict[str, int]:
+        """
+        Number of chunks and of facts of each kind.
+
+        Returns:
+            dict[str, int]: "chunks" and one count per fact kind.
+        """
+        with self._lock:
+            stats = {
+                "chunks": self._connection.execute(
+                    "SELECT COUNT(*) FROM chunks"
+                ).fetchone()[0]
+            }
+            stats.update(
+                self._connection.execute(
+                    "SELECT kind, COUNT(*) FROM facts GROUP BY kind"
+                ).fetchall()
+            )
+        return stats
+
+    def _delete(self, ids: list[str]) -> None:
+        """
+        Delete chunks and their facts, inside the caller's transaction.
+        """
+        for batch in self._batches(ids):
+            placeholders = self._placeholders(batch)
+            self._connection.execute(
+                "DELETE FROM fact_terms WHERE fact_id IN (SELECT id FROM "
+                f"facts WHERE chunk_id IN ({placeholders}))",
+                batch,
+            )
+            self._connection.execute(
+                f"DELETE FROM facts WHERE chunk_id IN ({placeholders})",
+                batch,
+            )
+            self._connection.execute(
+                f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})",
+                batch,
+            )
+
+    @staticmethod
+    def _batches(ids: list[str]) -> Iterator[list[str]]:
+        for start in range(0, len(ids), _PARAMETERS_PER_QUERY):
+            yield ids[start:start + _PARAMETERS_PER_QUERY]
+
+    @staticmethod
+    def _placeholders(values) -> str:
+        return ", ".join("?" * len(values))
+
+
+def _build_fact_index() -> FactIndex | None:
+    if not settings.FACT_INDEX_ENABLED:
+        return None
+    return FactIndex(settings.FACT_INDEX_PATH)
+
+
+_fact_index = Lazy("fact_index", _build_fact_index)
+
+
+def get_fact_index() -> FactIndex | None:
+    """
+    The fact index of the loaded chunks, opened on first use.
+
+    Returns:
+        FactIndex | None: The index, None when the fact index is
+            disabled.
+    """
+    return _fact_index.get()
+
+
+def __getattr__(name: str) -> Any:
+    # `fact_index` is still importable, built on access
+    if name == "fact_index":
+        return get_fact_index()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["FactIndex", "get_fact_index"]
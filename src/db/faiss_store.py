@@ -0,0 +1,814 @@
+import atexit
+import json
+import os
+from collections.abc import Iterable, Sequence
+from threading import RLock
+from typing import Any, Literal
+from uuid import uuid4
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.utils.mmr import maximal_marginal_relevance
+
+
+IndexType = Literal["flat", "ivf_flat", "ivf_pq", "hnsw"]
+
+
+class FaissVectorStore(VectorStore):
+    """
+    Vector store over a FAISS index with a selectable index type.
+
+    - `flat`: exact search, the reference for recall.
+    - `ivf_flat`: vectors are bucketed into `nlist` clusters and only the
+      `nprobe` closest buckets are scanned.
+    - `ivf_pq`: like `ivf_flat`, with vectors compressed to `pq_m` bytes.
+    - `hnsw`: graph search whose breadth is set by `ef_search`.
+
+    Rows are normalized, so the inner product the index computes is the
+    cosine similarity. Every chunk gets an int64 label that maps back to
+    its string ID, text and metadata, which keeps deletes by ID working
+    for `remove_pdf`. IVF indexes need training: until `train_size`
+    vectors are stored they are kept in a staging matrix and searched
+    exactly, then the index is trained on a random sample and filled.
+    HNSW graphs cannot remove vectors, so their deletes are tombstones,
+    and the graph is rebuilt once the share of dead vectors reaches
+    `compaction_ratio`. Searches exclude the tombstones and the documents
+    a metadata filter rejects with an ID selector, so the index is not
+    asked for extra candidates to make up for them.
+
+    The store is kept in memory and written to `persist_directory` by
+    `persist`, which the services call after each ingest and removal,
+    before the fingerprint index is saved, and which also runs at exit
+    when there are unsaved changes. The index, the staged vectors and
+    the documents are written to one file that replaces the previous one
+    atomically.
+
+    Attributes:
+        embedding_function (Embeddings): The embedding model.
+        persist_directory (str | None): Directory the store is saved to.
+        index_type (IndexType): Kind of FAISS index.
+        nlist (int): Number of IVF clusters.
+        pq_m (int): Number of PQ sub-quantizers; must divide the
+            dimension.
+        hnsw_m (int): Neighbours per HNSW node.
+        ef_construction (int): HNSW search breadth while inserting.
+        nprobe (int): IVF clusters scanned per query.
+        ef_search (int): HNSW search breadth per query.
+        train_size (int): Vectors needed before an IVF index is trained.
+        compaction_ratio (float): Share of deleted HNSW vectors that
+            triggers a rebuild.
+
+    Methods:
+        add_embeddings(text_embeddings, metadatas, ids) -> list[str]:
+            Add texts whose embeddings were already computed.
+        similarity_search_by_vectors(embeddings, k, filter)
+            -> list[list[Document]]:
+            Search for many query vectors with one index call.
+        max_marginal_relevance_search_by_vectors(embeddings, k, fetch_k,
+            lambda_mult, filter) -> list[list[Document]]:
+            Diverse search for many query vectors.
+        set_search_parameters(nprobe, ef_search) -> None:
+            Change the recall/latency tradeoff of queries.
+        train(sample) -> None:
+            Train an IVF index and move the staged vectors into it.
+        stats() -> dict[str, Any]:
+            Size and state of the index.
+        persist() -> None:
+            Save the store to `persist_directory`.
+    """
+    def __init__(
+        self,
+        embedding_function: Embeddings,
+        persist_directory: str | None = None,
+        index_type: IndexType = "hnsw",
+        nlist: int = 1024,
+        pq_m: int = 16,
+        hnsw_m: int = 32,
+        ef_construction: int = 80,
+        nprobe: int = 16,
+        ef_search: int = 64,
+        train_size: int | None = None,
+        compaction_ratio: float = 0.25,
+    ):
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.index_type = index_type
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        # FAISS warns below 39 points per centroid; PQ has 256 centroids
+        # per sub-quantizer.
+        self.train_size = train_size or 39 * max(
+            nlist, 256 if index_type == "ivf_pq" else 0
+        )
+        self.compaction_ratio = compaction_ratio
+        self._lock = RLock()
+        self._index: faiss.Index | None = None
+        self._dimensions = 0
+        self._next_label = 0
+        self._labels: dict[str, int] = {}
+        self._documents: dict[int, tuple[str, str, dict[str, Any]]] = {}
+        self._staged_labels: list[int] = []
+        self._staged = np.zeros((0, 0), dtype=np.float32)
+        self._removed: set[int] = set()
+        self._search_parameters: faiss.SearchParameters | None = None
+        self._dirty = False
+
+        if persist_directory:
+            self._load()
+            atexit.register(self.persist)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(
+            list(zip(texts, vectors)), metadatas=metadatas, ids=ids
+        )
+
+    def add_embeddings(
+        self,
+        text_embeddings: Iterable[tuple[str, list[float]]],
+        metadatas: list[dict] | None = None,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        """
+        Add texts whose embeddings were already computed. Existing IDs are
+        replaced.
+
+        Args:
+            text_embeddings (Iterable[tuple[str, list[float]]]): Pairs of
+                text and embedding.
+            metadatas (list[dict] | None): Optional metadata per text.
+            ids (list[str] | None): Optional IDs; random ones otherwise.
+
+        Returns:
+            list[str]: The IDs of the added texts.
+        """
+        pairs = list(text_embeddings)
+        if not pairs:
+            return []
+        ids = ids or [str(uuid4()) for _ in pairs]
+        metadatas = metadatas or [{} for _ in pairs]
+        vectors = self._normalize(
+            np.asarray([vector for _, vector in pairs], dtype=np.float32)
+        )
+
+        with self._lock:
+            self._check_dimensions(vectors.shape[1])
+            if self._index is None and self.index_type in ("flat", "hnsw"):
+                self._create_index()
+            self._remove([id for id in ids if id in self._labels])
+            labels = np.arange(
+                self._next_label, self._next_label + len(pairs),
+                dtype=np.int64,
+            )
+            self._next_label += len(pairs)
+            for label, id, (text, _), metadata in zip(
+                labels.tolist(), ids, pairs, metadatas
+            ):
+                self._labels[id] = label
+                self._documents[label] = (id, text, dict(metadata or {}))
+
+            if self._is_trained():
+                self._index.add_with_ids(vectors, labels)
+            else:
+                self._stage(vectors, labels)
+            self._dirty = True
+        return ids
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> None:
+        """
+        Delete documents by ID.
+        """
+        if not ids:
+            return
+        with self._lock:
+            self._remove([id for id in ids if id in self._labels])
+            self._dirty = True
+
+    def update_document(self, document_id: str, document: Document) -> None:
+        """
+        Replace the text and metadata of a document, re-embedding it.
+        """
+        self.add_texts(
+            [document.page_content],
+            metadatas=[document.metadata],
+            ids=[document_id],
+        )
+
+    def get_by_ids(self, ids: Sequence[str], /) -> list[Document]:
+        with self._lock:
+            return [
+                self._document(self._labels[id])
+                for id in ids
+                if id in self._labels
+            ]
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.similarity_search_by_vector(
+            self.embedding_function.embed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[tuple[Document, float]]:
+        """
+        Search for a query, returning the cosine similarity of each hit.
+        """
+        embedding = self.embedding_function.embed_query(query)
+        return self._search([embedding], k, filter)[0]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.similarity_search_by_vectors([embedding], k, filter)[0]
+
+    def similarity_search_by_vectors(
+        self,
+        embeddings: list[list[float]],
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+    ) -> list[list[Document]]:
+        """
+        Search for many query vectors with one index call.
+
+        Args:
+            embeddings (list[list[float]]): The query vectors.
+            k (int): Number of documents to return per query.
+            filter (dict[str, Any] | None): Optional metadata equality
+                filter applied to all queries.
+
+        Returns:
+            list[list[Document]]: The most similar documents of each
+                query, best first.
+        """
+        return [
+            [document for document, _ in hits]
+            for hits in self._search(embeddings, k, filter)
+        ]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query),
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            filter=filter,
+        )
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.max_marginal_relevance_search_by_vectors(
+            [embedding], k, fetch_k, lambda_mult, filter
+        )[0]
+
+    def max_marginal_relevance_search_by_vectors(
+        self,
+        embeddings: list[list[float]],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None,
+    ) -> list[list[Document]]:
+        """
+        Diverse search for many query vectors.
+
+        The `fetch_k` candidates of every query are found with one index
+        call and their vectors are reconstructed from the index, or read
+        from the staging matrix before training, so nothing is embedded
+        again. `k` of them are selected with maximal marginal relevance,
+        all queries at once when they have as many candidates. IVF-PQ
+        reconstructs the vectors from their codes, which is enough to
+        tell near duplicates apart.
+
+        Args:
+            embeddings (list[list[float]]): The query vectors.
+            k (int): Number of documents to return per query.
+            fetch_k (int): Number of candidates per query.
+            lambda_mult (float): 1 for pure relevance, 0 for pure
+                diversity.
+            filter (dict[str, Any] | None): Optional metadata equality
+                filter applied to all queries.
+
+        Returns:
+            list[list[Document]]: The selected documents of each query,
+                in selection order.
+        """
+        with self._lock:
+            queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+            hits = self._search(embeddings, max(k, fetch_k), filter)
+            labels = [
+                [self._labels[document.id] for document, _ in row]
+                for row in hits
+            ]
+            if len({len(row) for row in labels}) == 1:
+                candidates = np.asarray(labels, dtype=np.int64)
+                vectors = self._vectors_of(candidates.ravel())
+                selected = maximal_marginal_relevance(
+                    queries,
+                    vectors.reshape(*candidates.shape, self._dimensions),
+                    k,
+                    lambda_mult,
+                )
+            else:
+                # a filter before training can leave fewer candidates to
+                # some queries
+                selected = [
+                    maximal_marginal_relevance(
+                        query,
+                        self._vectors_of(np.asarray(row, dtype=np.int64)),
+                        k,
+                        lambda_mult,
+                    )
+                    for query, row in zip(queries, labels)
+                ]
+            return [
+                [row[index][0] for index in indices]
+                for row, indices in zip(hits, selected)
+            ]
+
+    def _select_relevance_score_fn(self):
+        # scores are already cosine similarities
+        return lambda score: score
+
+    def set_search_parameters(
+        self,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+    ) -> None:
+        """
+        Change the recall/latency tradeoff of queries.
+
+        Args:
+            nprobe (int | None): IVF clusters scanned per query.
+            ef_search (int | None): HNSW search breadth per query.
+        """
+        with self._lock:
+            if nprobe is not None:
+                self.nprobe = nprobe
+            if ef_search is not None:
+                self.ef_search = ef_search
+            self._tune()
+
+    def train(self, sample: np.ndarray | None = None) -> None:
+        """
+        Train an IVF index and move the staged vectors into it.
+
+        Called automatically once `train_size` vectors are staged; call it
+        directly to train earlier or on a chosen sample.
+
+        Args:
+            sample (np.ndarray | None): Training vectors. Defaults to
+                `train_size` staged vectors picked at random.
+        """
+        with self._lock:
+            if self._is_trained():
+                return
+            if sample is None:
+                sample = self._staged[:len(self._staged_labels)]
+                if len(sample) > self.train_size:
+                    rows = np.random.default_rng(0).choice(
+                        len(sample), self.train_size, replace=False
+                    )
+                    sample = sample[rows]
+            sample = self._normalize(np.asarray(sample, dtype=np.float32))
+            self._check_dimensions(sample.shape[1])
+            if self._index is None:
+                self._create_index()
+            self._index.train(sample)
+            if self._staged_labels:
+                self._index.add_with_ids(
+                    self._staged[:len(self._staged_labels)],
+                    np.asarray(self._staged_labels, dtype=np.int64),
+                )
+            self._staged = np.zeros((0, 0), dtype=np.float32)
+            self._staged_labels = []
+            self._dirty = True
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Size and state of the index.
+
+        Returns:
+            dict[str, Any]: Index type, stored documents, vectors in the
+                index, staged vectors, tombstones and whether the index
+                is trained.
+        """
+        with self._lock:
+            return {
+                "index_type": self.index_type,
+                "documents": len(self._documents),
+                "indexed": self._index.ntotal if self._index else 0,
+                "staged": len(self._staged_labels),
+                "tombstones": len(self._removed),
+                "trained": self._is_trained(),
+            }
+
+    def persist(self) -> None:
+        """
+        Save the store to `persist_directory`. The serialized index, the
+        staged vectors and the documents go to a temporary file that then
+        replaces the saved store atomically.
+        """
+        if not self.persist_directory:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.persist_directory, exist_ok=True)
+            documents = json.dumps({
+                "index_type": self.index_type,
+                "dimensions": self._dimensions,
+                "next_label": self._next_label,
+                "documents": [
+                    [label, id, text, metadata]
+                    for label, (id, text, metadata)
+                    in self._documents.items()
+                ],
+                "staged_labels": self._staged_labels,
+                "removed": sorted(self._removed),
+            }).encode("utf-8")
+            index = (
+                faiss.serialize_index(self._index)
+                if self._index is not None
+                else np.zeros(0, dtype=np.uint8)
+            )
+            path = os.path.join(self.persist_directory, "store.npz")
+            temporary_path = path + ".tmp"
+            with open(temporary_path, "wb") as file:
+                np.savez(
+                    file,
+                    index=index,
+                    staged=self._staged[:len(self._staged_labels)],
+                    documents=np.frombuffer(documents, dtype=np.uint8),
+                )
+            os.replace(temporary_path, path)
+            self._dirty = False
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> "FaissVectorStore":
+        store = cls(embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def _search(
+        self,
+        embeddings: list[list[float]],
+        k: int,
+        filter: dict[str, Any] | None,
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        Top k documents and their cosine similarity for each query vector.
+
+        A trained index excludes the tombstones and the filtered out
+        documents itself, with an ID selector. Before training, filtered
+        out documents are skipped, so the staging matrix is asked for
+        more candidates until k remain or it is exhausted.
+        """
+        with self._lock:
+            if not self._documents or k <= 0:
+                return [[] for _ in embeddings]
+            queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+            parameters = None
+            total = len(self._documents)
+            fetch = k
+            if self._is_trained():
+                parameters = self._search_parameters_for(filter)
+                if filter:
+                    total = parameters.size
+            elif filter:
+                fetch *= 4
+            if total == 0:
+                return [[] for _ in embeddings]
+            while True:
+                fetch = min(fetch, total)
+                scores, labels = self._raw_search(queries, fetch, parameters)
+                results = [
+                    self._collect(row_labels, row_scores, k, filter)
+                    for row_labels, row_scores in zip(labels, scores)
+                ]
+                if fetch >= total or all(len(r) >= k for r in results):
+                    return results
+                fetch *= 4
+
+    def _raw_search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        parameters: faiss.SearchParameters | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Scores and labels of the k best vectors, from the index or, before
+        training, from the staging matrix.
+        """
+        if self._is_trained():
+            return self._index.search(queries, k, params=parameters)
+        staged = self._staged[:len(self._staged_labels)]
+        scores = queries @ staged.T
+        k = min(k, len(self._staged_labels))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        labels = np.asarray(self._staged_labels, dtype=np.int64)[top]
+        return np.take_along_axis(top_scores, order, axis=1), labels
+
+    def _search_parameters_for(
+        self,
+        filter: dict[str, Any] | None,
+    ) -> faiss.SearchParameters | None:
+        """
+        Search parameters whose selector only lets through the documents
+        matching the filter or, without a filter, excludes the HNSW
+        tombstones. The tombstone parameters are built once per set of
+        tombstones. None when nothing has to be excluded.
+
+        The parameters keep the selectors in `selectors`, as they only
+        hold raw pointers to them, and the number of selected documents
+        in `size`.
+        """
+        if filter:
+            labels = np.fromiter(
+                (
+                    label
+                    for label, (_, _, metadata) in self._documents.items()
+                    if all(metadata.get(key) == value
+                           for key, value in filter.items())
+                ),
+                dtype=np.int64,
+            )
+            selector = faiss.IDSelectorBatch(labels)
+            parameters = self._parameters(selector)
+            parameters.selectors = (selector,)
+            parameters.size = len(labels)
+            return parameters
+        if not self._removed:
+            return None
+        if self._search_parameters is None:
+            removed = faiss.IDSelectorBatch(
+                np.fromiter(self._removed, dtype=np.int64)
+            )
+            selector = faiss.IDSelectorNot(removed)
+            parameters = self._parameters(selector)
+            parameters.selectors = (removed, selector)
+            parameters.size = len(self._documents)
+            self._search_parameters = parameters
+        return self._search_parameters
+
+    def _parameters(self, selector: faiss.IDSelector) -> Any:
+        """
+        Search parameters of the index type with a selector, carrying the
+        `nprobe` or `ef_search` of the store.
+        """
+        if self.index_type.startswith("ivf"):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(
+                sel=selector, efSearch=self.ef_search
+            )
+        return faiss.SearchParameters(sel=selector)
+
+    def _collect(
+        self,
+        labels: np.ndarray,
+        scores: np.ndarray,
+        k: int,
+        filter: dict[str, Any] | None,
+    ) -> list[tuple[Document, float]]:
+        hits = []
+        for label, score in zip(labels.tolist(), scores.tolist()):
+            if label < 0 or label not in self._documents:
+                continue
+            metadata = self._documents[label][2]
+            if filter and not all(
+                metadata.get(key) == value for key, value in filter.items()
+            ):
+                continue
+            hits.append((self._document(label), float(score)))
+            if len(hits) == k:
+                break
+        return hits
+
+    def _vectors_of(self, labels: np.ndarray) -> np.ndarray:
+        """
+        Normalized vectors of the given labels, from the index or, before
+        training, from the staging matrix, whose labels are increasing.
+        """
+        if not len(labels):
+            return np.zeros((0, self._dimensions), dtype=np.float32)
+        if self._is_trained():
+            return self._index.reconstruct_batch(labels)
+        rows = np.searchsorted(
+            np.asarray(self._staged_labels, dtype=np.int64), labels
+        )
+        return self._staged[rows]
+
+    def _document(self, label: int) -> Document:
+        id, text, metadata = self._documents[label]
+        return Document(page_content=text, metadata=dict(metadata), id=id)
+
+    def _remove(self, ids: list[str]) -> None:
+        """
+        Drop documents and their vectors. The caller holds the lock.
+        """
+        if not ids:
+            return
+        labels = [self._labels.pop(id) for id in ids]
+        for label in labels:
+            del self._documents[label]
+
+        if not self._is_trained():
+            removed = set(labels)
+            keep = [
+                row for row, label in enumerate(self._staged_labels)
+                if label not in removed
+            ]
+            self._staged = self._staged[keep]
+            self._staged_labels = [self._staged_labels[row] for row in keep]
+        elif self.index_type == "hnsw":
+            self._removed.update(labels)
+            self._search_parameters = None
+            if len(self._removed) >= self.compaction_ratio * (
+                self._index.ntotal
+            ):
+                self._rebuild()
+        else:
+            self._index.remove_ids(np.asarray(labels, dtype=np.int64))
+
+    def _rebuild(self) -> None:
+        """
+        Rebuild the HNSW graph without its tombstones.
+        """
+        labels = np.fromiter(self._documents, dtype=np.int64)
+        vectors = (
+            self._index.reconstruct_batch(labels)
+            if len(labels)
+            else np.zeros((0, self._dimensions), dtype=np.float32)
+        )
+        self._create_index()
+        if len(labels):
+            self._index.add_with_ids(vectors, labels)
+        self._removed.clear()
+        self._search_parameters = None
+
+    def _stage(self, vectors: np.ndarray, labels: np.ndarray) -> None:
+        """
+        Keep vectors for an untrained IVF index, training it once there
+        are enough of them.
+        """
+        size = len(self._staged_labels)
+        if size + len(vectors) > len(self._staged):
+            capacity = max(size + len(vectors), 2 * len(self._staged), 1024)
+            staged = np.zeros((capacity, vectors.shape[1]), dtype=np.float32)
+            if size:
+                staged[:size] = self._staged[:size]
+            self._staged = staged
+        self._staged[size:size + len(vectors)] = vectors
+        self._staged_labels.extend(labels.tolist())
+        if len(self._staged_labels) >= self.train_size:
+            self.train()
+
+    def _is_trained(self) -> bool:
+        return self._index is not None and self._index.is_trained
+
+    def _check_dimensions(self, dimensions: int) -> None:
+        if self._dimensions not in (0, dimensions):
+            raise ValueError(
+                f"Expected vectors of size {self._dimensions}, "
+                f"got {dimensions}."
+            )
+        self._dimensions = dimensions
+
+    def _create_index(self) -> faiss.Index:
+        description = {
+            "flat": "IDMap2,Flat",
+            "ivf_flat": f"IVF{self.nlist},Flat",
+            "ivf_pq": f"IVF{self.nlist},PQ{self.pq_m}",
+            "hnsw": f"IDMap2,HNSW{self.hnsw_m}",
+        }[self.index_type]
+        index = faiss.index_factory(
+            self._dimensions, description, faiss.METRIC_INNER_PRODUCT
+        )
+        if self.index_type == "hnsw":
+            hnsw = faiss.downcast_index(index.index).hnsw
+            hnsw.efConstruction = self.ef_construction
+        else:
+            self._map_ids(index)
+        self._index = index
+        self._tune()
+        return index
+
+    def _map_ids(self, index: faiss.Index) -> None:
+        """
+        Let an IVF index reconstruct vectors by label, for MMR.
+        """
+        if not self.index_type.startswith("ivf"):
+            return
+        faiss.extract_index_ivf(index).set_direct_map_type(
+            faiss.DirectMap.Hashtable
+        )
+
+    def _tune(self) -> None:
+        self._search_parameters = None
+        if self._index is None:
+            return
+        space = faiss.ParameterSpace()
+        if self.index_type.startswith("ivf"):
+            space.set_index_parameter(self._index, "nprobe", self.nprobe)
+        elif self.index_type == "hnsw":
+            space.set_index_parameter(
+                self._index, "efSearch", self.ef_search
+            )
+
+    def _load(self) -> None:
+        path = os.path.join(self.persist_directory, "store.npz")
+        if not os.path.exists(path):
+            return
+        index = None
+        with np.load(path) as saved:
+            data = json.loads(saved["documents"].tobytes())
+            staged = saved["staged"]
+            if len(saved["index"]):
+                index = faiss.deserialize_index(saved["index"])
+        if data["index_type"] != self.index_type:
+            raise ValueError(
+                f"{self.persist_directory} holds a {data['index_type']} "
+                f"index, not {self.index_type}; choose another directory "
+                "or load the documents again."
+            )
+        self._dimensions = data["dimensions"]
+        self._next_label = data["next_label"]
+        for label, id, text, metadata in data["documents"]:
+            self._labels[id] = label
+            self._documents[label] = (id, text, metadata)
+        self._staged_labels = data["staged_labels"]
+        self._removed = set(data["removed"])
+        self._staged = staged
+        if index is not None:
+            self._index = index
+            self._tune()
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+__all__ = ["FaissVectorStore"]
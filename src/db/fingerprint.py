@@ -0,0 +1,334 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from threading import RLock
+from typing import Any
+
+from langchain_core.documents import Document
+
+from src.core import Lazy, settings
+from src.schemas import FileRecordSchema
+
+
+class FingerprintIndex:
+    """
+    Index of the files loaded into the vector store, by content.
+
+    Each file is recorded with the hash of its bytes and, for every page,
+    the hash of the page text and the IDs of its chunks. Chunk IDs are
+    derived from the chunk text, so the same content always maps to the
+    same vector store entry. A reference count per chunk ID makes sure a
+    chunk shared by several files is only deleted with the last of them,
+    and the chat sessions holding each file are recorded, so a file is
+    only removed when the last session holding it lets it go. The index
+    is safe to share between threads.
+
+    Attributes:
+        path (str | None): JSON file the index is persisted to. When None,
+            the index only lives in memory.
+
+    Methods:
+        fingerprint_file(file_path: str) -> str:
+            Content hash of a file.
+        hash_text(text: str) -> str:
+            Content hash of a text.
+        chunk_id(document: Document) -> str:
+            Deterministic ID of a chunk.
+        get(filename: str) -> FileRecordSchema | None:
+            Get the record of a file.
+        put(record: FileRecordSchema) -> list[str]:
+            Add or replace the record of a file.
+        remove(filename: str) -> list[str]:
+            Remove the record of a file.
+        discard(filename: str, ids: list[str]) -> list[str]:
+            Remove some chunk IDs from the record of a file.
+        acquire(filename: str, session_id: str) -> bool:
+            Record that a session holds a file.
+        release(filename: str, session_id: str) -> list[str]:
+            Record that a session let a file go.
+        holders(filename: str) -> list[str]:
+            IDs of the sessions holding a file.
+        chunk_count() -> int:
+            Number of distinct chunks of the loaded files.
+        save() -> None:
+            Persist the index.
+    """
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._records: dict[str, FileRecordSchema] = {}
+        self._references: Counter[str] = Counter()
+        self._pages: dict[str, dict[str, list[int]]] = {}
+        self._lock = RLock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                for data in json.load(file).values():
+                    record = FileRecordSchema.model_validate(data)
+                    self._records[record.filename] = record
+                    self._references.update(record.ids())
+
+    @staticmethod
+    def fingerprint_file(file_path: str) -> str:
+        """
+        Content hash of a file, read in blocks.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            str: The hex digest of the file bytes.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """
+        Content hash of a text.
+
+        Args:
+            text (str): The text to hash.
+
+        Returns:
+            str: The hex digest of the text.
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def chunk_id(document: Document) -> str:
+        """
+        Deterministic ID of a chunk, derived from its text.
+
+        Args:
+            document (Document): The chunk.
+
+        Returns:
+            str: The chunk ID.
+        """
+        return FingerprintIndex.hash_text(document.page_content)[:32]
+
+    def get(self, filename: str) -> FileRecordSchema | None:
+        """
+        Get the record of a file.
+
+        Args:
+            filename (str): The name of the file.
+
+        Returns:
+            FileRecordSchema | None: The record, or None if the file was
+                never ingested.
+        """
+        with self._lock:
+            return self._records.get(filename)
+
+    def put(self, record: FileRecordSchema) -> list[str]:
+        """
+        Add or replace the record of a file.
+
+        Args:
+            record (FileRecordSchema): The new record.
+
+        Returns:
+            list[str]: IDs of the previous record that are no longer
+                referenced by any file and can be deleted.
+        """
+        with self._lock:
+            previous = self._records.get(record.filename)
+            if previous is not None:
+                # the sessions holding the file keep holding it
+                record.sessions = list(dict.fromkeys(
+                    previous.sessions + record.sessions
+                ))
+            stale = self.remove(record.filename)
+            self._records[record.filename] = record
+            self._references.update(record.ids())
+            return [id for id in stale if not self._references[id]]
+
+    def remove(self, filename: str) -> list[str]:
+        """
+        Remove the record of a file.
+
+        Args:
+            filename (str): The name of the file.
+
+        Returns:
+            list[str]: IDs of the file that are no longer referenced by
+                any other file and can be deleted.
+        """
+        with self._lock:
+            record = self._records.pop(filename, None)
+            self._pages.pop(filename, None)
+            if record is None:
+                return []
+            return self._release(record.ids())
+
+    def discard(self, filename: str, ids: list[str]) -> list[str]:
+        """
+        Remove some chunk IDs from the record of a file.
+
+        The pages that lose a chunk are marked as changed, so loading the
+        file again re-ingests them. The pages of each chunk are looked up
+        in a hash index of the file, built on its first discard, so only
+        the pages that lose a chunk are touched.
+
+        Args:
+            filename (str): The name of the file.
+            ids (list[str]): The chunk IDs to remove.
+
+        Returns:
+            list[str]: IDs that are no longer referenced by any file and
+                can be deleted.
+        """
+        with self._lock:
+            record = self._records.get(filename)
+            if record is None:
+                return []
+            pages = self._pages.get(filename)
+            if pages is None:
+                pages = {}
+                for number, page in record.pages.items():
+                    for id in page.ids:
+                        pages.setdefault(id, []).append(number)
+                self._pages[filename] = pages
+            discarded: dict[int, set[str]] = {}
+            for id in ids:
+                for number in pages.pop(id, ()):
+                    discarded.setdefault(number, set()).add(id)
+            released = []
+            for number, page_ids in discarded.items():
+                page = record.pages[number]
+                released.extend(i for i in page.ids if i in page_ids)
+                page.ids = [i for i in page.ids if i not in page_ids]
+                page.hash = ""
+            record.fingerprint = ""
+            return self._release(list(dict.fromkeys(released)))
+
+    def acquire(self, filename: str, session_id: str) -> bool:
+        """
+        Record that a session holds a file.
+
+        Args:
+            filename (str): The name of the file.
+            session_id (str): The ID of the session.
+
+        Returns:
+            bool: Whether the record changed, False when the file is not
+                loaded or the session already held it.
+        """
+        with self._lock:
+            record = self._records.get(filename)
+            if record is None or session_id in record.sessions:
+                return False
+            record.sessions.append(session_id)
+            return True
+
+    def release(self, filename: str, session_id: str) -> list[str]:
+        """
+        Record that a session let a file go, removing the record of the
+        file when no other session holds it.
+
+        Args:
+            filename (str): The name of the file.
+            session_id (str): The ID of the session.
+
+        Returns:
+            list[str]: IDs of the file that are no longer referenced by
+                any file held by a session and can be deleted.
+        """
+        with self._lock:
+            record = self._records.get(filename)
+            if record is None:
+                return []
+            if session_id in record.sessions:
+                record.sessions.remove(session_id)
+            if record.sessions:
+                return []
+            return self.remove(filename)
+
+    def holders(self, filename: str) -> list[str]:
+        """
+        IDs of the sessions holding a file.
+
+        Args:
+            filename (str): The name of the file.
+
+        Returns:
+            list[str]: The session IDs, empty when the file is not
+                loaded.
+        """
+        with self._lock:
+            record = self._records.get(filename)
+            return list(record.sessions) if record else []
+
+    def chunk_count(self) -> int:
+        """
+        Number of distinct chunks of the loaded files.
+
+        Returns:
+            int: The number of chunk IDs referenced by a file.
+        """
+        with self._lock:
+            return len(self._references)
+
+    def save(self) -> None:
+        """
+        Persist the index, replacing the previous file atomically.
+        """
+        with self._lock:
+            if not self.path:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary_path = self.path + ".tmp"
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                json.dump(
+                    {
+                        filename: record.model_dump()
+                        for filename, record in self._records.items()
+                    },
+                    file,
+                )
+            os.replace(temporary_path, self.path)
+
+    def _release(self, ids: list[str]) -> list[str]:
+        """
+        Drop one reference to each ID, returning the unreferenced ones.
+        """
+        released = []
+        for id in ids:
+            self._references[id] -= 1
+            if self._references[id] <= 0:
+                del self._references[id]
+                released.append(id)
+        return released
+
+
+_fingerprint_index = Lazy(
+    "fingerprint_index",
+    lambda: FingerprintIndex(settings.FINGERPRINT_INDEX_PATH),
+)
+
+
+def get_fingerprint_index() -> FingerprintIndex:
+    """
+    The index of the loaded files and their chunks, read from disk on
+    first use.
+
+    Returns:
+        FingerprintIndex: The index.
+    """
+    return _fingerprint_index.get()
+
+
+def __getattr__(name: str) -> Any:
+    # `fingerprint_index` is still importable, built on access
+    if name == "fingerprint_index":
+        return get_fingerprint_index()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["FingerprintIndex", "get_fingerprint_index"]
@@ -0,0 +1,485 @@
+import json
+import math
+import os
+from array import array
+from collections import Counter
+from collections.abc import Collection
+from threading import RLock
+from typing import Any
+
+import numpy as np
+
+from src.core import Lazy, settings
+from src.utils.context import tokenize
+
+
+class BM25Index:
+    """
+    In-process inverted index of the chunks, scored with BM25.
+
+    Dense retrieval misses exact terms such as part numbers, tickers and
+    names; this index finds them and its ranking is fused with the vector
+    store one. Each term keeps a compact posting list: the ordinals of
+    the chunks it occurs in (uint32) and its count in each (uint16), in
+    growable arrays that are scored with NumPy without copying. Chunks
+    are added incrementally; removed chunks are marked dead and the
+    postings are compacted once `compaction_ratio` of the chunks are
+    dead. Document frequencies include dead chunks until then. The index
+    is safe to share between threads.
+
+    Saving does not rewrite the whole index: the chunks added and removed
+    since the last save are appended to a log next to the `.npz`
+    snapshot, as JSON lines of term counts and IDs, and replayed on load.
+    Once the log holds `merge_ratio` times as many changes as the index
+    has chunks, the next save writes a new snapshot atomically and
+    starts an empty log. Snapshot and log share a generation number, so
+    the log of an older snapshot is never replayed.
+
+    Attributes:
+        path (str | None): `.npz` file the index is persisted to. When
+            None, the index only lives in memory.
+        k1 (float): BM25 term frequency saturation.
+        b (float): BM25 length normalization.
+        compaction_ratio (float): Share of dead chunks that triggers a
+            compaction.
+        merge_ratio (float): Changes in the log, as a share of the
+            chunks, that trigger a new snapshot.
+
+    Methods:
+        tokenize(text: str) -> list[str]:
+            Lowercase word tokens of a text.
+        pending(ids: list[str]) -> list[str]:
+            The chunk IDs not in the index yet.
+        add(ids: list[str], texts: list[str]) -> int:
+            Index chunks that are not in the index yet.
+        remove(ids: list[str]) -> int:
+            Remove chunks from the index.
+        search(query: str, k: int) -> list[tuple[str, float]]:
+            The chunks with the highest BM25 score for a query.
+        stats() -> dict[str, int]:
+            Size of the index.
+        save() -> None:
+            Persist the changes to the index.
+    """
+    def __init__(
+        self,
+        path: str | None = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+        compaction_ratio: float = 0.25,
+        merge_ratio: float = 0.25,
+    ):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.compaction_ratio = compaction_ratio
+        self.merge_ratio = merge_ratio
+        self._ids: list[str] = []
+        self._ordinals: dict[str, int] = {}
+        self._lengths = array("I")
+        self._alive = array("B")
+        self._postings: dict[str, tuple[array, array]] = {}
+        self._live = 0
+        self._total_length = 0
+        self._dirty = False
+        # changes not saved yet, and changes in the log since the snapshot
+        self._changes: list[list] = []
+        self._logged = 0
+        self._generation = 0
+        self._lock = RLock()
+        if path:
+            self._load()
+
+    @staticmethod
+    def tokenize(text: str) -> list[str]:
+        """
+        Lowercase word tokens of a text, see `tokenize`.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            list[str]: The tokens, in order.
+        """
+        return tokenize(text)
+
+    def pending(self, ids: list[str]) -> list[str]:
+        """
+        The chunk IDs not in the index yet.
+
+        Args:
+            ids (list[str]): The chunk IDs to check.
+
+        Returns:
+            list[str]: The IDs not in the index, in the given order.
+        """
+        with self._lock:
+            return [id for id in ids if id not in self._ordinals]
+
+    def add(self, ids: list[str], texts: list[str]) -> int:
+        """
+        Index chunks that are not in the index yet. Chunk IDs derive from
+        the chunk text, so a known ID is skipped.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+            texts (list[str]): The chunk texts.
+
+        Returns:
+            int: The number of chunks added.
+        """
+        added = 0
+        with self._lock:
+            for id, text in zip(ids, texts):
+                if id in self._ordinals:
+                    continue
+                counts = Counter(self.tokenize(text))
+                self._insert(id, counts)
+                if self.path:
+                    self._changes.append(["+", id, counts])
+                added += 1
+            self._dirty = self._dirty or bool(added)
+        return added
+
+    def remove(self, ids: list[str]) -> int:
+        """
+        Remove chunks from the index.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+
+        Returns:
+            int: The number of chunks removed.
+        """
+        removed = 0
+        with self._lock:
+            for id in ids:
+                if not self._delete(id):
+                    continue
+                if self.path:
+                    self._changes.append(["-", id])
+                removed += 1
+            self._dirty = self._dirty or bool(removed)
+            self._maybe_compact()
+        return removed
+
+    def search(
+        self,
+        query: str,
+        k: int = 20,
+        ids: Collection[str] | None = None
+    ) -> list[tuple[str, float]]:
+        """
+        The chunks with the highest BM25 score for a query.
+
+        Args:
+            query (str): The query text.
+            k (int): Maximum number of chunks to return.
+            ids (Collection[str] | None): When given, only these chunks
+                are returned, e.g. the chunks of a chat session.
+
+        Returns:
+            list[tuple[str, float]]: (chunk ID, score) pairs, best first.
+                Chunks without any query term are left out.
+        """
+        terms = list(dict.fromkeys(self.tokenize(query)))
+        with self._lock:
+            if not self._live or not terms:
+                return []
+            scores = self._score(terms)
+            if ids is not None:
+                allowed = np.zeros(len(scores), dtype=bool)
+                allowed[[
+                    self._ordinals[id] for id in ids if id in self._ordinals
+                ]] = True
+                scores[~allowed] = 0
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                candidates = candidates[
+                    np.argpartition(-scores[candidates], k - 1)[:k]
+                ]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            return [
+                (self._ids[ordinal], float(scores[ordinal]))
+                for ordinal in candidates
+            ]
+
+    def stats(self) -> dict[str, int]:
+        """
+        Size of the index.
+
+        Returns:
+            dict[str, int]: Live and dead chunks, terms, postings and the
+                bytes the postings take.
+        """
+        with self._lock:
+            postings = sum(len(docs) for docs, _ in self._postings.values())
+            return {
+                "chunks": self._live,
+                "dead": len(self._ids) - self._live,
+                "terms": len(self._postings),
+                "postings": postings,
+                "postings_bytes": postings * 6,
+            }
+
+    def save(self) -> None:
+        """
+        Persist the changes since the last save: append them to the log
+        or, once the log is long enough, write a new snapshot that
+        replaces the previous one atomically. Does nothing when the index
+        did not change since it was last saved.
+        """
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            logged = self._logged + len(self._changes)
+            if os.path.exists(self.path) and (
+                logged < self.merge_ratio * max(len(self._ordinals), 1)
+            ):
+                with open(self._log_path(), "a", encoding="utf-8") as file:
+                    file.write(json.dumps({
+                        "generation": self._generation,
+                        "changes": self._changes,
+                    }) + "\n")
+                self._logged = logged
+            else:
+                self._write_snapshot()
+            self._changes = []
+            self._dirty = False
+
+    def _write_snapshot(self) -> None:
+        """
+        Write the whole index as a new snapshot generation and drop the
+        log of the previous one. The caller holds the lock.
+        """
+        terms = list(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(
+            [len(docs) for docs, _ in self._postings.values()]
+        )
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "wb") as file:
+            np.savez(
+                file,
+                generation=np.int64(self._generation + 1),
+                ids=np.array(self._ids, dtype=str),
+                lengths=np.frombuffer(self._lengths, dtype=np.uint32),
+                alive=np.frombuffer(self._alive, dtype=np.uint8),
+                terms=np.array(terms, dtype=str),
+                offsets=offsets,
+                documents=self._concatenate(0, np.uint32),
+                counts=self._concatenate(1, np.uint16),
+            )
+        os.replace(temporary_path, self.path)
+        self._generation += 1
+        self._logged = 0
+        # a log left by a crash here belongs to the previous generation
+        # and is skipped on load
+        if os.path.exists(self._log_path()):
+            os.remove(self._log_path())
+
+    def _insert(self, id: str, counts: dict[str, int]) -> None:
+        """
+        Index a chunk from its term counts. The caller holds the lock.
+        """
+        ordinal = len(self._ids)
+        length = sum(counts.values())
+        self._ids.append(id)
+        self._ordinals[id] = ordinal
+        self._lengths.append(length)
+        self._alive.append(1)
+        self._live += 1
+        self._total_length += length
+        for term, count in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = (array("I"), array("H"))
+                self._postings[term] = postings
+            postings[0].append(ordinal)
+            postings[1].append(min(count, 0xFFFF))
+
+    def _delete(self, id: str) -> bool:
+        """
+        Mark a chunk dead. The caller holds the lock.
+
+        Returns:
+            bool: Whether the chunk was in the index.
+        """
+        ordinal = self._ordinals.pop(id, None)
+        if ordinal is None:
+            return False
+        self._alive[ordinal] = 0
+        self._live -= 1
+        self._total_length -= self._lengths[ordinal]
+        return True
+
+    def _maybe_compact(self) -> None:
+        dead = len(self._ids) - self._live
+        if dead and dead >= self.compaction_ratio * len(self._ids):
+            self._compact()
+
+    def _score(self, terms: list[str]) -> np.ndarray:
+        """
+        BM25 score of every chunk ordinal, zero for dead chunks.
+        """
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        average = self._total_length / self._live or 1.0
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            documents = np.frombuffer(postings[0], dtype=np.uint32)
+            counts = np.frombuffer(postings[1], dtype=np.uint16).astype(
+                np.float32
+            )
+            frequency = len(documents)
+            idf = math.log(
+                1 + (self._live - frequency + 0.5) / (frequency + 0.5)
+            )
+            # ordinals are unique within a posting list
+            scores[documents] += idf * counts * (self.k1 + 1) / (
+                counts
+                + self.k1 * (
+                    1 - self.b + self.b * lengths[documents] / average
+                )
+            )
+        scores *= np.frombuffer(self._alive, dtype=np.uint8)
+        return scores
+
+    def _compact(self) -> None:
+        """
+        Drop dead chunks from the postings and renumber the live ones.
+        """
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        renumber = np.cumsum(alive, dtype=np.int64) - 1
+        postings: dict[str, tuple[array, array]] = {}
+        for term, (documents, counts) in self._postings.items():
+            documents = np.frombuffer(documents, dtype=np.uint32)
+            keep = alive[documents]
+            if not keep.any():
+                continue
+            postings[term] = (
+                array(
+                    "I",
+                    renumber[documents[keep]].astype(np.uint32).tobytes(),
+                ),
+                array(
+                    "H",
+                    np.frombuffer(counts, dtype=np.uint16)[keep].tobytes(),
+                ),
+            )
+        self._postings = postings
+        self._ids = [
+            id for id, live in zip(self._ids, alive.tolist()) if live
+        ]
+        self._ordinals = {id: ordinal for ordinal, id in enumerate(self._ids)}
+        self._lengths = array(
+            "I",
+            np.frombuffer(self._lengths, dtype=np.uint32)[alive].tobytes(),
+        )
+        self._alive = array("B", b"\x01" * len(self._ids))
+
+    def _concatenate(self, field: int, dtype: type) -> np.ndarray:
+        """
+        One field of all the posting lists, in term order.
+        """
+        if not self._postings:
+            return np.zeros(0, dtype=dtype)
+        return np.concatenate([
+            np.frombuffer(postings[field], dtype=dtype)
+            for postings in self._postings.values()
+        ])
+
+    def _load(self) -> None:
+        if os.path.exists(self.path):
+            self._load_snapshot()
+        if not os.path.exists(self._log_path()):
+            return
+        end = 0
+        with open(self._log_path(), "rb") as file:
+            for line in file:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated entry")
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line of a save interrupted by a crash
+                    break
+                end += len(line)
+                if entry["generation"] != self._generation:
+                    continue
+                for change in entry["changes"]:
+                    if change[0] == "+":
+                        if change[1] not in self._ordinals:
+                            self._insert(change[1], change[2])
+                    else:
+                        self._delete(change[1])
+                self._logged += len(entry["changes"])
+        # cut the torn line off, or the next save would append after it
+        # and every later load would stop before the new entries
+        if end < os.path.getsize(self._log_path()):
+            os.truncate(self._log_path(), end)
+        self._maybe_compact()
+
+    def _load_snapshot(self) -> None:
+        with np.load(self.path) as data:
+            self._generation = int(data["generation"])
+            self._ids = data["ids"].tolist()
+            self._lengths = array("I", data["lengths"].tobytes())
+            self._alive = array("B", data["alive"].tobytes())
+            offsets = data["offsets"]
+            documents = data["documents"]
+            counts = data["counts"]
+            for index, term in enumerate(data["terms"].tolist()):
+                start, end = offsets[index], offsets[index + 1]
+                self._postings[term] = (
+                    array("I", documents[start:end].tobytes()),
+                    array("H", counts[start:end].tobytes()),
+                )
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        self._ordinals = {
+            id: ordinal
+            for ordinal, (id, live) in enumerate(zip(self._ids, alive))
+            if live
+        }
+        self._live = int(alive.sum())
+        self._total_length = int(
+            np.frombuffer(self._lengths, dtype=np.uint32)[alive].sum()
+        )
+
+    def _log_path(self) -> str:
+        return self.path + ".log"
+
+
+def _build_lexical_index() -> BM25Index | None:
+    if not settings.HYBRID_SEARCH_ENABLED:
+        return None
+    return BM25Index(settings.LEXICAL_INDEX_PATH)
+
+
+_lexical_index = Lazy("lexical_index", _build_lexical_index)
+
+
+def get_lexical_index() -> BM25Index | None:
+    """
+    The lexical index of the loaded chunks, read from disk on first use.
+
+    Returns:
+        BM25Index | None: The index, None when hybrid search is
+            disabled.
+    """
+    return _lexical_index.get()
+
+
+def __getattr__(name: str) -> Any:
+    # `lexical_index` is still importable, built on access
+    if name == "lexical_index":
+        return get_lexical_index()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["BM25Index", "get_lexical_index"]
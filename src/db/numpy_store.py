@@ -0,0 +1,590 @@
+import atexit
+import base64
+import json
+import os
+from collections.abc import Iterable, Sequence
+from threading import RLock
+from typing import Any
+from uuid import uuid4
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.utils.mmr import maximal_marginal_relevance
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store over a contiguous float32 NumPy matrix.
+
+    Rows are normalized when they are added, so cosine similarity for a
+    whole batch of queries is a single matrix product, and the top k rows
+    are selected with `argpartition` instead of a full sort. Deletes only
+    mark rows as tombstones; the matrix is compacted once the share of
+    dead rows reaches `compaction_ratio`. For collections up to a few
+    hundred thousand chunks this avoids the round trip to Chroma.
+
+    The store is kept in memory and written to `persist_directory` by
+    `persist`, which the services call after each ingest and removal,
+    before the fingerprint index is saved, and which also runs at exit
+    when there are unsaved changes. Persisting does not rewrite the
+    whole store: the rows added and the IDs removed since the last
+    persist are appended to a log next to the snapshot, one JSON line
+    per persist, and replayed on load. Once the log holds `merge_ratio`
+    times as many changes as the store has rows, the next persist
+    compacts the store and writes the vectors and the documents to a
+    new snapshot that replaces the previous one atomically. Snapshot and
+    log share a generation number, so the log of an older snapshot is
+    never replayed.
+
+    Attributes:
+        embedding_function (Embeddings): The embedding model.
+        persist_directory (str | None): Directory the store is saved to.
+        compaction_ratio (float): Share of deleted rows that triggers a
+            compaction.
+        merge_ratio (float): Changes in the log, as a share of the rows,
+            that trigger a new snapshot.
+
+    Methods:
+        add_embeddings(text_embeddings, metadatas, ids) -> list[str]:
+            Add texts whose embeddings were already computed.
+        similarity_search_by_vectors(embeddings, k, filter)
+            -> list[list[Document]]:
+            Search for many query vectors with one matrix product.
+        max_marginal_relevance_search_by_vectors(embeddings, k, fetch_k,
+            lambda_mult, filter) -> list[list[Document]]:
+            Diverse search for many query vectors.
+        compact() -> None:
+            Drop deleted rows from the matrix.
+        persist() -> None:
+            Save the store to `persist_directory`.
+    """
+    def __init__(
+        self,
+        embedding_function: Embeddings,
+        persist_directory: str | None = None,
+        compaction_ratio: float = 0.25,
+        merge_ratio: float = 0.25,
+    ):
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.compaction_ratio = compaction_ratio
+        self.merge_ratio = merge_ratio
+        self._lock = RLock()
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._deleted = 0
+        self._ids: list[str] = []
+        self._texts: list[str] = []
+        self._metadatas: list[dict[str, Any]] = []
+        self._rows: dict[str, int] = {}
+        self._dirty = False
+        # IDs added and removed since the last persist, and changes in
+        # the log since the snapshot
+        self._added: dict[str, None] = {}
+        self._removed: set[str] = set()
+        self._logged = 0
+        self._generation = 0
+
+        if persist_directory:
+            self._load()
+            atexit.register(self.persist)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(
+            list(zip(texts, vectors)), metadatas=metadatas, ids=ids
+        )
+
+    def add_embeddings(
+        self,
+        text_embeddings: Iterable[tuple[str, list[float]]],
+        metadatas: list[dict] | None = None,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        """
+        Add texts whose embeddings were already computed. Existing IDs are
+        replaced.
+
+        Args:
+            text_embeddings (Iterable[tuple[str, list[float]]]): Pairs of
+                text and embedding.
+            metadatas (list[dict] | None): Optional metadata per text.
+            ids (list[str] | None): Optional IDs; random ones otherwise.
+
+        Returns:
+            list[str]: The IDs of the added texts.
+        """
+        pairs = list(text_embeddings)
+        if not pairs:
+            return []
+        ids = ids or [str(uuid4()) for _ in pairs]
+        metadatas = metadatas or [{} for _ in pairs]
+        vectors = self._normalize(
+            np.asarray([vector for _, vector in pairs], dtype=np.float32)
+        )
+
+        with self._lock:
+            self._mark_deleted([id for id in ids if id in self._rows])
+            self._append(
+                ids,
+                [text for text, _ in pairs],
+                [dict(metadata or {}) for metadata in metadatas],
+                vectors,
+            )
+            self._added.update(dict.fromkeys(ids))
+            self._dirty = True
+            self._maybe_compact()
+        return ids
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> None:
+        """
+        Delete documents by ID, leaving tombstones until the next
+        compaction.
+        """
+        if not ids:
+            return
+        with self._lock:
+            self._mark_deleted([id for id in ids if id in self._rows])
+            self._dirty = True
+            self._maybe_compact()
+
+    def update_document(self, document_id: str, document: Document) -> None:
+        """
+        Replace the text and metadata of a document, re-embedding it.
+        """
+        self.add_texts(
+            [document.page_content],
+            metadatas=[document.metadata],
+            ids=[document_id],
+        )
+
+    def get_by_ids(self, ids: Sequence[str], /) -> list[Document]:
+        with self._lock:
+            return [
+                self._document(self._rows[id])
+                for id in ids
+                if id in self._rows
+            ]
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.similarity_search_by_vector(
+            self.embedding_function.embed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[tuple[Document, float]]:
+        """
+        Search for a query, returning the cosine similarity of each hit.
+        """
+        embedding = self.embedding_function.embed_query(query)
+        return self._search([embedding], k, filter)[0]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.similarity_search_by_vectors([embedding], k, filter)[0]
+
+    def similarity_search_by_vectors(
+        self,
+        embeddings: list[list[float]],
+        k: int = 4,
+        filter: dict[str, Any] | None = None,
+    ) -> list[list[Document]]:
+        """
+        Search for many query vectors with one matrix product.
+
+        Args:
+            embeddings (list[list[float]]): The query vectors.
+            k (int): Number of documents to return per query.
+            filter (dict[str, Any] | None): Optional metadata equality
+                filter applied to all queries.
+
+        Returns:
+            list[list[Document]]: The most similar documents of each
+                query, best first.
+        """
+        return [
+            [document for document, _ in hits]
+            for hits in self._search(embeddings, k, filter)
+        ]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query),
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            filter=filter,
+        )
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return self.max_marginal_relevance_search_by_vectors(
+            [embedding], k, fetch_k, lambda_mult, filter
+        )[0]
+
+    def max_marginal_relevance_search_by_vectors(
+        self,
+        embeddings: list[list[float]],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None,
+    ) -> list[list[Document]]:
+        """
+        Diverse search for many query vectors.
+
+        The `fetch_k` most similar rows of each query are taken from the
+        matrix, which already holds them normalized, and `k` of them are
+        selected with maximal marginal relevance, all queries at once.
+
+        Args:
+            embeddings (list[list[float]]): The query vectors.
+            k (int): Number of documents to return per query.
+            fetch_k (int): Number of candidates per query.
+            lambda_mult (float): 1 for pure relevance, 0 for pure
+                diversity.
+            filter (dict[str, Any] | None): Optional metadata equality
+                filter applied to all queries.
+
+        Returns:
+            list[list[Document]]: The selected documents of each query,
+                in selection order.
+        """
+        with self._lock:
+            queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+            top = self._top(queries, max(k, fetch_k), filter)
+            if top is None:
+                return [[] for _ in embeddings]
+            rows = top[0]
+            selected = maximal_marginal_relevance(
+                queries, self._vectors[rows], k, lambda_mult
+            )
+            return [
+                [self._document(row) for row in candidates[indices]]
+                for candidates, indices in zip(rows, selected)
+            ]
+
+    def _select_relevance_score_fn(self):
+        # scores are already cosine similarities
+        return lambda score: score
+
+    def compact(self) -> None:
+        """
+        Drop deleted rows, so the matrix is contiguous again.
+        """
+        with self._lock:
+            keep = np.flatnonzero(self._alive[:self._size])
+            self._vectors = np.ascontiguousarray(self._vectors[keep])
+            self._alive = np.ones(len(keep), dtype=bool)
+            self._ids = [self._ids[row] for row in keep]
+            self._texts = [self._texts[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._rows = {id: row for row, id in enumerate(self._ids)}
+            self._size = len(keep)
+            self._deleted = 0
+
+    def persist(self) -> None:
+        """
+        Save the changes since the last persist to `persist_directory`:
+        append them to the log or, once the log is long enough, compact
+        the store and write a new snapshot that replaces the previous one
+        atomically.
+        """
+        if not self.persist_directory:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.persist_directory, exist_ok=True)
+            rows = sorted(
+                self._rows[id] for id in self._added if id in self._rows
+            )
+            logged = self._logged + len(self._removed) + len(rows)
+            if os.path.exists(self._path("store.npz")) and (
+                logged < self.merge_ratio * max(len(self._rows), 1)
+            ):
+                with open(
+                    self._path("store.log"), "a", encoding="utf-8"
+                ) as file:
+                    file.write(json.dumps({
+                        "generation": self._generation,
+                        "removed": sorted(self._removed),
+                        "ids": [self._ids[row] for row in rows],
+                        "texts": [self._texts[row] for row in rows],
+                        "metadatas": [self._metadatas[row] for row in rows],
+                        "dimensions": self._vectors.shape[1],
+                        "vectors": base64.b64encode(
+                            self._vectors[rows].tobytes()
+                        ).decode("ascii"),
+                    }) + "\n")
+                self._logged = logged
+            else:
+                self._write_snapshot()
+            self._added = {}
+            self._removed = set()
+            self._dirty = False
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: list[dict] | None = None,
+        *,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def _search(
+        self,
+        embeddings: list[list[float]],
+        k: int,
+        filter: dict[str, Any] | None,
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        Top k rows and their cosine similarity for each query vector.
+        """
+        with self._lock:
+            queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+            top = self._top(queries, k, filter)
+            if top is None:
+                return [[] for _ in embeddings]
+            return [
+                [
+                    (self._document(row), float(score))
+                    for row, score in zip(rows, row_scores)
+                ]
+                for rows, row_scores in zip(*top)
+            ]
+
+    def _top(
+        self,
+        queries: np.ndarray,
+        k: int,
+        filter: dict[str, Any] | None,
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Rows and scores of the k best live rows for normalized queries,
+        best first, or None when no row matches.
+        """
+        if self._size == 0 or k <= 0:
+            return None
+        scores = queries @ self._vectors[:self._size].T
+        mask = self._alive[:self._size]
+        if filter:
+            mask = mask & np.fromiter(
+                (
+                    all(metadata.get(key) == value
+                        for key, value in filter.items())
+                    for metadata in self._metadatas
+                ),
+                dtype=bool,
+                count=self._size,
+            )
+        scores[:, ~mask] = -np.inf
+        k = min(k, int(mask.sum()))
+        if k == 0:
+            return None
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return top, top_scores
+
+    def _document(self, row: int) -> Document:
+        return Document(
+            page_content=self._texts[row],
+            metadata=dict(self._metadatas[row]),
+            id=self._ids[row],
+        )
+
+    def _write_snapshot(self) -> None:
+        """
+        Compact the store, write it as a new snapshot generation and drop
+        the log of the previous one. The caller holds the lock.
+        """
+        self.compact()
+        documents = json.dumps({
+            "ids": self._ids,
+            "texts": self._texts,
+            "metadatas": self._metadatas,
+        }).encode("utf-8")
+        path = self._path("store.npz")
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as file:
+            np.savez(
+                file,
+                generation=np.int64(self._generation + 1),
+                vectors=self._vectors[:self._size],
+                documents=np.frombuffer(documents, dtype=np.uint8),
+            )
+        os.replace(temporary_path, path)
+        self._generation += 1
+        self._logged = 0
+        # a log left by a crash here belongs to the previous generation
+        # and is skipped on load
+        if os.path.exists(self._path("store.log")):
+            os.remove(self._path("store.log"))
+
+    def _append(
+        self,
+        ids: list[str],
+        texts: list[str],
+        metadatas: list[dict[str, Any]],
+        vectors: np.ndarray,
+    ) -> None:
+        """
+        Append normalized rows to the matrix. The caller holds the lock.
+        """
+        self._reserve(self._size + len(ids), vectors.shape[1])
+        start = self._size
+        self._vectors[start:start + len(ids)] = vectors
+        self._alive[start:start + len(ids)] = True
+        for offset, id in enumerate(ids):
+            self._rows[id] = start + offset
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas)
+        self._size += len(ids)
+
+    def _mark_deleted(self, ids: list[str]) -> None:
+        for id in ids:
+            self._alive[self._rows.pop(id)] = False
+        self._deleted += len(ids)
+        self._removed.update(ids)
+
+    def _maybe_compact(self) -> None:
+        if self._size and self._deleted >= self.compaction_ratio * self._size:
+            self.compact()
+
+    def _reserve(self, size: int, dimensions: int) -> None:
+        """
+        Grow the matrix geometrically so appends are amortized O(1).
+        """
+        if self._vectors.shape[1] not in (0, dimensions):
+            raise ValueError(
+                f"Expected vectors of size {self._vectors.shape[1]}, "
+                f"got {dimensions}."
+            )
+        if size <= len(self._vectors):
+            return
+        capacity = max(size, 2 * len(self._vectors), 1024)
+        vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        if self._size:
+            vectors[:self._size] = self._vectors[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._vectors = vectors
+        self._alive = alive
+
+    def _load(self) -> None:
+        path = self._path("store.npz")
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self._generation = int(data["generation"])
+                vectors = data["vectors"]
+                documents = json.loads(data["documents"].tobytes())
+            self._vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            self._size = len(self._vectors)
+            self._alive = np.ones(self._size, dtype=bool)
+            self._ids = documents["ids"]
+            self._texts = documents["texts"]
+            self._metadatas = documents["metadatas"]
+            self._rows = {id: row for row, id in enumerate(self._ids)}
+        log_path = self._path("store.log")
+        if not os.path.exists(log_path):
+            return
+        end = 0
+        with open(log_path, "rb") as file:
+            for line in file:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated entry")
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line of a persist interrupted by a crash
+                    break
+                end += len(line)
+                if entry["generation"] != self._generation:
+                    continue
+                self._mark_deleted(
+                    [id for id in entry["removed"] if id in self._rows]
+                )
+                vectors = np.frombuffer(
+                    base64.b64decode(entry["vectors"]), dtype=np.float32
+                ).reshape(-1, entry["dimensions"])
+                self._append(
+                    entry["ids"], entry["texts"], entry["metadatas"], vectors
+                )
+                self._logged += len(entry["removed"]) + len(entry["ids"])
+        # cut the torn line off, or the next persist would append after
+        # it and every later load would stop before the new entries
+        if end < os.path.getsize(log_path):
+            os.truncate(log_path, end)
+        self._removed = set()
+        self._maybe_compact()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+__all__ = ["NumpyVectorStore"]
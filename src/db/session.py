@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+from threading import RLock
+
+from src.core import settings
+from src.schemas import ChatSessionSchema
+
+
+class SessionStore:
+    """
+    Persistent store of chat sessions, one small JSON file per session.
+
+    A session only records the filename, the content fingerprint and the
+    chunk IDs of each loaded file; the chunk texts stay in the vector
+    store. Restoring a session is a single file read, with no re-ingest,
+    and its size does not grow with the size of the documents. The store
+    is safe to share between threads.
+
+    Attributes:
+        directory (str | None): Directory the sessions are persisted to.
+            When None, sessions only live in memory.
+
+    Methods:
+        load(session_id: str) -> ChatSessionSchema | None:
+            Load a stored session.
+        save(session: ChatSessionSchema) -> None:
+            Store a session.
+        delete(session_id: str) -> None:
+            Delete a stored session.
+        list() -> list[str]:
+            IDs of the stored sessions.
+    """
+    def __init__(self, directory: str | None = None):
+        self.directory = directory
+        self._sessions: dict[str, str] = {}
+        self._lock = RLock()
+
+    def load(self, session_id: str) -> ChatSessionSchema | None:
+        """
+        Load a stored session.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            ChatSessionSchema | None: The session, or None if it was never
+                stored.
+        """
+        with self._lock:
+            if not self.directory:
+                data = self._sessions.get(session_id)
+                if data is None:
+                    return None
+                return ChatSessionSchema.model_validate_json(data)
+            path = self._path(session_id)
+            if not os.path.exists(path):
+                return None
+            with open(path, encoding="utf-8") as file:
+                return ChatSessionSchema.model_validate_json(file.read())
+
+    def save(self, session: ChatSessionSchema) -> None:
+        """
+        Store a session, replacing the previous file atomically.
+
+        Args:
+            session (ChatSessionSchema): The session.
+        """
+        with self._lock:
+            data = session.model_dump_json()
+            if not self.directory:
+                self._sessions[session.session_id] = data
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(session.session_id)
+            temporary_path = path + ".tmp"
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+
+    def delete(self, session_id: str) -> None:
+        """
+        Delete a stored session. Does nothing if it was never stored.
+
+        Args:
+            session_id (str): The session ID.
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self.directory:
+                try:
+                    os.remove(self._path(session_id))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> list[str]:
+        """
+        IDs of the stored sessions.
+
+        Returns:
+            list[str]: The session IDs.
+        """
+        with self._lock:
+            if not self.directory:
+                return list(self._sessions)
+            if not os.path.isdir(self.directory):
+                return []
+            session_ids = []
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(".session.json"):
+                    continue
+                path = os.path.join(self.directory, name)
+                with open(path, encoding="utf-8") as file:
+                    session_ids.append(json.load(file)["session_id"])
+            return session_ids
+
+    def _path(self, session_id: str) -> str:
+        """
+        File of a session. Session IDs come from clients, so the file is
+        named after their hash.
+        """
+        name = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, f"{name}.session.json")
+
+
+session_store = SessionStore(settings.SESSION_DIRECTORY)
+
+
+__all__ = ["SessionStore", "session_store"]
@@ -1,12 +1,76 @@
-from langchain_chroma import Chroma
+from typing import Any
 
-from src.core import embeddings, settings
+from langchain_core.vectorstores import VectorStore
 
+from src.core import Lazy, get_embeddings, settings
 
-vector_db: Chroma = Chroma(
-    collection_name=settings.CHROMA_COLLECTION_NAME,
-    embedding_function=embeddings,
-    persist_directory=settings.CHROMA_PERSIST_DIRECTORY,
-)
 
-__all__ = ["vector_db"]
+def _build_vector_db() -> VectorStore:
+    # each backend imports its library only when it is selected
+    embeddings = get_embeddings()
+    if settings.VECTOR_BACKEND == "numpy":
+        from .numpy_store import NumpyVectorStore
+
+        return NumpyVectorStore(
+            embedding_function=embeddings,
+            persist_directory=settings.NUMPY_PERSIST_DIRECTORY,
+            compaction_ratio=settings.NUMPY_COMPACTION_RATIO,
+        )
+    if settings.VECTOR_BACKEND == "faiss":
+        from .faiss_store import FaissVectorStore
+
+        return FaissVectorStore(
+            embedding_function=embeddings,
+            persist_directory=settings.FAISS_PERSIST_DIRECTORY,
+            index_type=settings.FAISS_INDEX_TYPE,
+            nlist=settings.FAISS_NLIST,
+            pq_m=settings.FAISS_PQ_M,
+            hnsw_m=settings.FAISS_HNSW_M,
+            ef_construction=settings.FAISS_EF_CONSTRUCTION,
+            nprobe=settings.FAISS_NPROBE,
+            ef_search=settings.FAISS_EF_SEARCH,
+        )
+    if settings.VECTOR_BACKEND == "compressed":
+        from .compression import CompressedVectorStore
+
+        return CompressedVectorStore(
+            embedding_function=embeddings,
+            persist_directory=settings.COMPRESSION_PERSIST_DIRECTORY,
+            components=settings.COMPRESSION_COMPONENTS,
+            quantization=settings.COMPRESSION_QUANTIZATION,
+            pq_m=settings.COMPRESSION_PQ_M,
+            train_size=settings.COMPRESSION_TRAIN_SIZE,
+            rerank=settings.COMPRESSION_RERANK,
+            rerank_factor=settings.COMPRESSION_RERANK_FACTOR,
+        )
+    from langchain_chroma import Chroma
+
+    return Chroma(
+        collection_name=settings.CHROMA_COLLECTION_NAME,
+        embedding_function=embeddings,
+        persist_directory=settings.CHROMA_PERSIST_DIRECTORY,
+    )
+
+
+_vector_db = Lazy("vector_db", _build_vector_db)
+
+
+def get_vector_db() -> VectorStore:
+    """
+    The vector store of the configured `VECTOR_BACKEND`, opened on first
+    use.
+
+    Returns:
+        VectorStore: The vector store.
+    """
+    return _vector_db.get()
+
+
+def __getattr__(name: str) -> Any:
+    # `vector_db` is still importable, opened on access
+    if name == "vector_db":
+        return get_vector_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["get_vector_db"]
@@ -1,4 +1,14 @@
 from .chat import ChatSessionSchema, DocumentSchema
+from .context import ContextSchema
+from .fact import FactSchema
+from .fingerprint import FileRecordSchema, PageRecordSchema
 
 
-__all__ = ["ChatSessionSchema", "DocumentSchema"]
+__all__ = [
+    "ChatSessionSchema",
+    "ContextSchema",
+    "DocumentSchema",
+    "FactSchema",
+    "FileRecordSchema",
+    "PageRecordSchema",
+]
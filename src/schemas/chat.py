@@ -1,34 +1,251 @@
-from langchain_core.documents import Document
+from collections.abc import Collection
+from typing import Any
+
+from pydantic import PrivateAttr
 
 from src.core import BaseSchema
 
 
 class DocumentSchema(BaseSchema):
     """
-    Schema representing a document in the chat system.
+    Schema representing a document in the chat system. Only references
+    are kept; the chunk texts live in the vector store.
+
+    A hash index maps each chunk ID to its position in `documents_id`,
+    so a chunk is found and removed in O(1). Removal moves the last ID
+    into the freed position, so `documents_id` is not kept in order.
 
     Attributes:
         filename (str): The name of the document file.
+        fingerprint (str): Content hash of the file when it was loaded.
         documents_id (list[str]): List of document IDs associated with
-            the document.
-        documents (list[Document]): List of Document objects.
+            the document, without repetitions.
     """
     filename: str
+    fingerprint: str = ""
     documents_id: list[str]
-    documents: list[Document]
+    _positions: dict[str, int] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, context: Any) -> None:
+        self.documents_id = list(dict.fromkeys(self.documents_id))
+        self._positions = {
+            id: position for position, id in enumerate(self.documents_id)
+        }
+
+    def position(self, document_id: str) -> int | None:
+        """
+        Position of a chunk ID in `documents_id`.
+
+        Args:
+            document_id (str): The chunk ID.
+
+        Returns:
+            int | None: The position, or None if the ID is not in the
+                document.
+        """
+        return self._positions.get(document_id)
+
+    def remove_ids(self, document_ids: list[str]) -> list[str]:
+        """
+        Remove chunk IDs from the document, in O(1) each.
+
+        Args:
+            document_ids (list[str]): The chunk IDs.
+
+        Returns:
+            list[str]: The IDs that were in the document.
+        """
+        # private attributes are slow to reach through pydantic
+        positions, documents_id = self._positions, self.documents_id
+        removed = []
+        for id in document_ids:
+            position = positions.pop(id, None)
+            if position is None:
+                continue
+            last = documents_id.pop()
+            if last != id:
+                documents_id[position] = last
+                positions[last] = position
+            removed.append(id)
+        return removed
 
 
 class ChatSessionSchema(BaseSchema):
     """
     Schema representing a chat session.
 
+    Hash indexes map each filename to its document and each chunk ID to
+    the file holding it, so lookups and removals do not scan the session.
+    A chunk shared by several files is indexed under the first of them,
+    and only those chunks pay a scan of the files when removed.
+    The indexes are kept by the methods below, which are the way to
+    change the documents of the session.
+
     Attributes:
         session_id (str): Unique identifier for the chat session.
         documents (list[DocumentSchema]): List of DocumentSchema objects
             associated with the chat session.
+
+    Methods:
+        get(filename: str) -> DocumentSchema | None:
+            Get the document of a file.
+        add(document: DocumentSchema) -> None:
+            Add or replace the document of a file.
+        pop(filename: str) -> DocumentSchema | None:
+            Remove the document of a file.
+        locate(document_id: str) -> tuple[str, int] | None:
+            File and position of a chunk ID.
+        remove_ids(document_ids: list[str]) -> dict[str, list[str]]:
+            Remove chunk IDs from the session.
+        ids() -> Collection[str]:
+            IDs of the chunks of the session.
+        clear() -> None:
+            Remove all documents.
     """
     session_id: str
     documents: list[DocumentSchema] = []
+    _files: dict[str, DocumentSchema] = PrivateAttr(default_factory=dict)
+    _owners: dict[str, str] = PrivateAttr(default_factory=dict)
+    _copies: dict[str, int] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, context: Any) -> None:
+        documents = self.documents
+        self.documents = []
+        for document in documents:
+            self.add(document)
+
+    def get(self, filename: str) -> DocumentSchema | None:
+        """
+        Get the document of a file.
+
+        Args:
+            filename (str): The name of the file.
+
+        Returns:
+            DocumentSchema | None: The document, or None if the file is
+                not in the session.
+        """
+        return self._files.get(filename)
+
+    def add(self, document: DocumentSchema) -> None:
+        """
+        Add the document of a file, replacing the previous one.
+
+        Args:
+            document (DocumentSchema): The document.
+        """
+        self.pop(document.filename)
+        self.documents.append(document)
+        self._files[document.filename] = document
+        for id in document.documents_id:
+            if id in self._owners:
+                self._copies[id] = self._copies.get(id, 1) + 1
+            else:
+                self._owners[id] = document.filename
+
+    def pop(self, filename: str) -> DocumentSchema | None:
+        """
+        Remove the document of a file.
+
+        Args:
+            filename (str): The name of the file.
+
+        Returns:
+            DocumentSchema | None: The removed document, or None if the
+                file is not in the session.
+        """
+        document = self._files.pop(filename, None)
+        if document is None:
+            return None
+        self.documents = [
+            doc for doc in self.documents if doc is not document
+        ]
+        for id in document.documents_id:
+            self._release(id, filename)
+        return document
+
+    def locate(self, document_id: str) -> tuple[str, int] | None:
+        """
+        File and position of a chunk ID.
+
+        Args:
+            document_id (str): The chunk ID.
+
+        Returns:
+            tuple[str, int] | None: The filename and the position of the
+                ID in its `documents_id`, or None if the ID is not in the
+                session.
+        """
+        filename = self._owners.get(document_id)
+        if filename is None:
+            return None
+        return filename, self._files[filename].position(document_id)
+
+    def remove_ids(self, document_ids: list[str]) -> dict[str, list[str]]:
+        """
+        Remove chunk IDs from the session, in O(1) each. A shared chunk
+        is removed from the file it is indexed under.
+
+        Args:
+            document_ids (list[str]): The chunk IDs.
+
+        Returns:
+            dict[str, list[str]]: The removed IDs, by filename.
+        """
+        # private attributes are slow to reach through pydantic
+        owners, files, copies = self._owners, self._files, self._copies
+        removed: dict[str, list[str]] = {}
+        for id in dict.fromkeys(document_ids):
+            filename = owners.get(id)
+            if filename is None:
+                continue
+            removed.setdefault(filename, []).append(id)
+            if id in copies:
+                # taken out first, so another file holding it is found
+                files[filename].remove_ids([id])
+                self._release(id, filename)
+            else:
+                del owners[id]
+        for filename, ids in removed.items():
+            files[filename].remove_ids(ids)
+        return removed
+
+    def ids(self) -> Collection[str]:
+        """
+        IDs of the chunks of the session, as a live view of the index,
+        so membership and size cost O(1).
+
+        Returns:
+            Collection[str]: The chunk IDs.
+        """
+        return self._owners.keys()
+
+    def clear(self) -> None:
+        """
+        Remove all documents.
+        """
+        self.documents.clear()
+        self._files.clear()
+        self._owners.clear()
+        self._copies.clear()
+
+    def _release(self, document_id: str, filename: str) -> None:
+        """
+        Drop one file holding a chunk ID from the index, indexing the ID
+        under another file holding it, if any.
+        """
+        copies = self._copies.pop(document_id, 1) - 1
+        if not copies:
+            self._owners.pop(document_id, None)
+            return
+        if copies > 1:
+            self._copies[document_id] = copies
+        if self._owners.get(document_id) != filename:
+            return
+        for document in self._files.values():
+            if document.position(document_id) is not None:
+                self._owners[document_id] = document.filename
+                return
 
 
 __all__ = ["DocumentSchema", "ChatSessionSchema"]
@@ -0,0 +1,24 @@
+from langchain_core.documents import Document
+
+from src.core import BaseSchema
+
+
+class ContextSchema(BaseSchema):
+    """
+    Schema representing the context assembled for a prompt.
+
+    Attributes:
+        text (str): The context text sent to the model.
+        documents (list[Document]): The passages in the context, most
+            relevant first.
+        tokens_used (int): Approximate tokens of the context.
+        tokens_dropped (int): Approximate tokens of the retrieved text
+            left out to fit the budget.
+    """
+    text: str
+    documents: list[Document] = []
+    tokens_used: int = 0
+    tokens_dropped: int = 0
+
+
+__all__ = ["ContextSchema"]
@@ -0,0 +1,35 @@
+from typing import Literal
+
+from src.core import BaseSchema
+
+
+class FactSchema(BaseSchema):
+    """
+    Schema representing a fact extracted from a chunk.
+
+    Attributes:
+        kind (str): "metric" for a key-value pair, or "entity", "number"
+            or "date" for a bare mention.
+        key (str): Normalized name of a metric, e.g. "net revenue".
+            Empty for mentions.
+        value (str): The value as written in the text.
+        number (float | None): The value as a number, when it has one.
+        year (int | None): The year the sentence refers to, if any.
+        sentence (str): The sentence the fact was found in.
+        chunk_id (str): ID of the chunk the fact belongs to.
+        source (str): File the chunk comes from, filled in by searches.
+        page (int | None): Page the chunk comes from, filled in by
+            searches.
+    """
+    kind: Literal["metric", "entity", "number", "date"]
+    key: str = ""
+    value: str
+    number: float | None = None
+    year: int | None = None
+    sentence: str
+    chunk_id: str = ""
+    source: str = ""
+    page: int | None = None
+
+
+__all__ = ["FactSchema"]
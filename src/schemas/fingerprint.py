@@ -0,0 +1,45 @@
+from src.core import BaseSchema
+
+
+class PageRecordSchema(BaseSchema):
+    """
+    Schema representing a page of an ingested file.
+
+    Attributes:
+        hash (str): Content hash of the page text.
+        ids (list[str]): IDs of the chunks produced by the page.
+    """
+    hash: str
+    ids: list[str] = []
+
+
+class FileRecordSchema(BaseSchema):
+    """
+    Schema representing a file that was ingested into the vector store.
+
+    Attributes:
+        filename (str): The name of the file.
+        fingerprint (str): Content hash of the file bytes.
+        pages (dict[int, PageRecordSchema]): The ingested pages, by page
+            number.
+        sessions (list[str]): IDs of the chat sessions holding the file.
+    """
+    filename: str
+    fingerprint: str
+    pages: dict[int, PageRecordSchema] = {}
+    sessions: list[str] = []
+
+    def ids(self) -> list[str]:
+        """
+        IDs of all chunks of the file, without repetitions, in page order.
+
+        Returns:
+            list[str]: The chunk IDs.
+        """
+        ids: dict[str, None] = {}
+        for page_number in sorted(self.pages):
+            ids.update(dict.fromkeys(self.pages[page_number].ids))
+        return list(ids)
+
+
+__all__ = ["PageRecordSchema", "FileRecordSchema"]
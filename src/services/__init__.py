@@ -1,4 +1,11 @@
-from .chat import ChatService
+from .chat import AsyncChatService, ChatService
+from .ingest import IngestService
+from .summary import SummaryService
 
 
-__all__ = ['ChatService']
+__all__ = [
+    'AsyncChatService',
+    'ChatService',
+    'IngestService',
+    'SummaryService',
+]
@@ -1,10 +1,34 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Collection, Iterator
 from os.path import exists
+from typing import TYPE_CHECKING
 from uuid import uuid4
 
-from langchain_chroma import Chroma
-from langchain_ollama import ChatOllama
+from langchain_core.documents import Document
+from src.core import settings, tracer
+from src.core.cache import AnswerCache, SummaryCache
+from src.db import BM25Index, FactIndex, FingerprintIndex, SessionStore
 from src.schemas import ChatSessionSchema, DocumentSchema
-from src.utils.handlers import PDFHandler, VectorHandler
+from src.utils.context import ContextAssembler, ContextCompressor
+from src.utils.extraction import FactExtractor
+from src.utils.handlers import VectorHandler
+from src.utils.rerank import Reranker
+
+from .ingest import IngestService
+from .summary import SummaryService
+
+
+logger = logging.getLogger(__name__)
+
+
+# only annotations use the clients, so their libraries are not imported
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+    from langchain_ollama import ChatOllama
 
 
 class ChatService:
@@ -15,28 +39,100 @@ class ChatService:
     Attributes:
         db (Chroma): The Chroma vector store instance.
         model (ChatOllama): The ChatOllama model instance.
-        session (ChatSessionSchema): The current chat session schema.
+        ingest (IngestService): The pipeline used to load PDFs into `db`,
+            which also tracks the chunk IDs of every loaded file.
+        answers (AnswerCache | None): Answers to earlier queries, reused
+            for similar queries that retrieve the same chunks.
+        summaries (SummaryService): Map-reduce summarizer of PDFs.
+        assembler (ContextAssembler): Merges adjacent retrieved chunks
+            and fits the context in `CONTEXT_MAX_TOKENS`, cutting at
+            sentence boundaries.
+        compressor (ContextCompressor | None): Keeps only the retrieved
+            sentences most relevant to the query, within the same
+            `CONTEXT_MAX_TOKENS`, so the assembler does not cut them.
+        facts (FactIndex | None): Facts extracted from the loaded chunks.
+            Questions about a metric found there are answered from its
+            sentences, without a vector search.
+        lexical (BM25Index | None): Inverted index of the loaded chunks.
+            When set, its BM25 ranking is fused with the vector search
+            one, so chunks sharing exact terms with the query are found.
+        reranker (Reranker | None): Second retrieval stage. When set,
+            `RETRIEVAL_OVERSAMPLING` times `RETRIEVAL_K` candidates are
+            retrieved and the reranker keeps the best `RETRIEVAL_K`.
+        sessions (SessionStore | None): Store the session is persisted
+            to after every change, so it survives restarts.
+        session (ChatSessionSchema): The current chat session schema,
+            restored from `sessions` when it was stored before. The
+            stores and indexes are shared by every session, so retrieval
+            only returns the chunks of the session's files, and a file is
+            only deleted from them when no other session holds it.
 
     Methods:
         send_message(message: str) -> str:
             Process a user message and generate a response.
+        stream_message(message: str) -> Iterator[str]:
+            Process a user message and stream the response.
+        send_messages(messages: list[str], concurrency: int) -> list[str]:
+            Process many user messages in batch.
         add_pdf(pdf_path: str) -> None:
             Add a PDF document to the chat session.
+        summarize_pdf(pdf_path: str) -> str:
+            Summarize a PDF document.
         remove_document(document_id: str) -> None:
             Remove a document from the chat session by its ID.
+        remove_documents(document_ids: list[str]) -> None:
+            Remove many documents from the chat session by their IDs.
         remove_pdf(pdf_path: str) -> None:
             Remove a PDF document and its associated data from the
                 chat session.
         clear_session() -> None:
             Clear all documents and data from the current chat session.
     """
-    def __init__(self, db: Chroma, model: ChatOllama):
+    def __init__(
+        self,
+        db: Chroma,
+        model: ChatOllama,
+        fingerprints: FingerprintIndex | None = None,
+        summaries: SummaryService | None = None,
+        facts: FactIndex | None = None,
+        lexical: BM25Index | None = None,
+        reranker: Reranker | None = None,
+        sessions: SessionStore | None = None,
+        session_id: str | None = None
+    ):
         self.db = db
         self.model = model
-        self.session: ChatSessionSchema = ChatSessionSchema(
-            session_id=str(uuid4()),
-            documents=[]
+        self.facts = facts
+        self.lexical = lexical
+        self.ingest = IngestService(
+            db, fingerprints=fingerprints, facts=facts, lexical=lexical
+        )
+        self.summaries = summaries or SummaryService(
+            model, SummaryCache(settings.SUMMARY_CACHE_PATH)
+        )
+        self.reranker = reranker
+        if reranker is None and settings.RERANK_ENABLED:
+            self.reranker = Reranker(
+                db.embeddings,
+                lexical_weight=settings.RERANK_LEXICAL_WEIGHT,
+            )
+        self.assembler = ContextAssembler(
+            token_budget=settings.CONTEXT_MAX_TOKENS
         )
+        self.compressor: ContextCompressor | None = None
+        if settings.CONTEXT_COMPRESSION_ENABLED:
+            self.compressor = ContextCompressor(
+                token_budget=settings.CONTEXT_MAX_TOKENS,
+                duplicate_threshold=settings.CONTEXT_DUPLICATE_THRESHOLD,
+            )
+        self.answers: AnswerCache | None = None
+        if settings.ANSWER_CACHE_ENABLED:
+            self.answers = AnswerCache(
+                threshold=settings.ANSWER_CACHE_THRESHOLD,
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            )
+        self.sessions = sessions
+        self.session: ChatSessionSchema = self._restore_session(session_id)
 
     def send_message(self, message: str) -> str:
         """
@@ -46,34 +142,103 @@ class ChatService:
             message (str): The user's message.
         Returns:
             str: The generated response.
-        """        # Placeholder for message processing logic
-        retriever = VectorHandler.map_to_retriever(
-            self.db, "similarity", search_kwargs={"k": 5}
-        )
-        documents = VectorHandler.find_by_query_on_retriever(
-            retriever,
-            query=message,
-        )
+        """
+        embedding, documents = self._retrieve(message)
+        ids = [doc.id for doc in documents]
+        answer = self._cached_answer(embedding, ids)
+        if answer is not None:
+            return answer
 
-        print(f"Found {len(documents)} similar documents for the query.")
+        documents = self._compress(message, documents)
+        input = self._build_input(message, documents)
 
-        context = "\n".join([doc.page_content for doc in documents])
+        with tracer.span("llm.generate", mode="invoke"):
+            response = self.model.invoke(input=input)
 
-        print(f"Context prepared for the model. {context}")
+        logger.debug("Model response received: %s", response)
 
-        input = [
-            {
-                "role": "system",
-                "content": f"Use this context on the documents:\n{context}"
-            },
-            {"role": "user", "content": f"Answer: {message}"}
-        ]
+        answer = str(response.content)
+        self._store_answer(embedding, ids, answer)
+        return answer
 
-        response = self.model.invoke(input=input)
+    def stream_message(self, message: str) -> Iterator[str]:
+        """
+        Process a user message and stream the response as it is
+        generated. Time to first token and total latency are logged when
+        the response ends.
 
-        print(f"Model response received: {response}")
+        Args:
+            message (str): The user's message.
+        Yields:
+            str: The next piece of the generated response.
+        """
+        started = time.perf_counter()
+        embedding, documents = self._retrieve(message)
+        ids = [doc.id for doc in documents]
+        answer = self._cached_answer(embedding, ids)
+        if answer is not None:
+            yield answer
+            self._log_latency(started, time.perf_counter() - started)
+            return
 
-        return str(response.content)
+        documents = self._compress(message, documents)
+        input = self._build_input(message, documents)
+
+        first_token = None
+        parts = []
+        with tracer.span("llm.generate", mode="stream") as span:
+            for chunk in self.model.stream(input=input):
+                if not chunk.content:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                    span.set(first_token_ms=round(first_token * 1000, 3))
+                parts.append(str(chunk.content))
+                yield parts[-1]
+
+        self._log_latency(started, first_token)
+        self._store_answer(embedding, ids, "".join(parts))
+
+    def send_messages(
+        self,
+        messages: list[str],
+        concurrency: int = settings.BATCH_CONCURRENCY
+    ) -> list[str]:
+        """
+        Process many user messages in batch, e.g. for evaluation or bulk
+        question answering.
+
+        Retrieval for all messages shares one embedding call and one
+        vector store search, repeated messages are answered once, and
+        at most `concurrency` model calls run at the same time.
+
+        Args:
+            messages (list[str]): The user's messages.
+            concurrency (int): Maximum number of model calls in flight.
+        Returns:
+            list[str]: The generated responses, in the order of
+                `messages`.
+        """
+        unique = list(dict.fromkeys(messages))
+        answers, pending = self._answer_from_cache(
+            unique, self._retrieve_batch(unique)
+        )
+        inputs = [
+            self._build_input(
+                unique[index], self._compress(unique[index], documents)
+            )
+            for index, embedding, documents in pending
+        ]
+        if inputs:
+            with tracer.span(
+                "llm.generate", mode="batch", requests=len(inputs)
+            ):
+                responses = self.model.batch(
+                    inputs, config={"max_concurrency": concurrency}
+                )
+            self._store_answers(answers, pending, responses)
+        answer_of = dict(zip(unique, answers))
+        return [answer_of[message] for message in messages]
 
     def add_pdf(self, pdf_path: str) -> None:
         """
@@ -88,92 +253,112 @@ class ChatService:
         if not exists(pdf_path):
             raise FileNotFoundError(f"The file {pdf_path} does not exist.")
 
-        documents = PDFHandler.load_pdf(pdf_path)
-        docs = documents
-        # filter out empty chunks (some PDFs/pages may produce empty text)
-        non_empty_docs = [d for d in docs if (d.page_content or "").strip()]
-        empty_count = len(docs) - len(non_empty_docs)
-        if empty_count:
-            print(
-                f"Warning: {empty_count} "
-                "empty chunk(s) were dropped before indexing."
-                )
-
-        if not non_empty_docs:
-            raise ValueError("No text extracted from PDF; aborting load.")
-
-        print(
-            f"Split into {len(non_empty_docs)} "
-            f"non-empty chunks (dropped {empty_count})."
-        )
-        ids = [str(uuid4()) for _ in non_empty_docs]
-
         try:
-            VectorHandler.save_documents_on_vector_store(
-                vector_store=self.db,
-                documents=non_empty_docs,
-                ids=ids,
-            )
+            ids = self.ingest.ingest_pdf(pdf_path)
         except Exception as e:
             # provide more context when embeddings/vector store calls fail
-            print(f"Error saving documents to vector store: {e}")
+            logger.error("Error saving documents to vector store: %s", e)
             raise
-        self.session.documents.append(
+        self._invalidate_answers()
+        fingerprints = self.ingest.fingerprints
+        if fingerprints.acquire(pdf_path, self.session.session_id):
+            fingerprints.save()
+        record = fingerprints.get(pdf_path)
+        self.session.add(
             DocumentSchema(
                 filename=pdf_path,
+                fingerprint=record.fingerprint if record else "",
                 documents_id=ids,
-                documents=non_empty_docs,
             )
         )
+        self._save_session()
+
+    def summarize_pdf(self, pdf_path: str) -> str:
+        """
+        Summarize a PDF document with hierarchical map-reduce summaries.
+
+        Args:
+            pdf_path (str): The path to the PDF file.
+
+        Returns:
+            str: The summary.
+
+        Raises:
+            FileNotFoundError: If the specified PDF file does not exist.
+        """
+        if not exists(pdf_path):
+            raise FileNotFoundError(f"The file {pdf_path} does not exist.")
+        return self.summaries.summarize_pdf(pdf_path)
 
     def remove_document(self, document_id: str) -> None:
         """
         Remove a document from the chat session by its ID.
 
         Args:
-            document_id (str): The ID of the document to remove.
-        Raises:
-            ValueError: If the document ID is not found in the session.
+            document_id (str): The ID of the document to remove. Nothing
+                happens when it is not found in the session.
         """
-        for doc_schema in self.session.documents:
-            if document_id in doc_schema.documents_id:
-                VectorHandler.delete_documents_from_vector_store(
-                    vector_store=self.db,
-                    ids=[document_id]
-                )
-                idx = doc_schema.documents_id.index(document_id)
-                del doc_schema.documents_id[idx]
-                del doc_schema.documents[idx]
-                break
+        self.remove_documents([document_id])
+
+    def remove_documents(self, document_ids: list[str]) -> None:
+        """
+        Remove many documents from the chat session by their IDs. The
+        IDs are found through the session indexes, in O(1) each, and the
+        chunks no loaded file references anymore are deleted from the
+        vector store in one call. Chunks of a file another session holds
+        are only removed from this session.
+
+        Args:
+            document_ids (list[str]): The IDs of the documents to remove.
+                IDs not found in the session are ignored.
+        """
+        removed = self.session.remove_ids(document_ids)
+        if not removed:
+            return
+        fingerprints = self.ingest.fingerprints
+        released = []
+        for filename, ids in removed.items():
+            self.session.get(filename).fingerprint = ""
+            if set(fingerprints.holders(filename)) - {
+                self.session.session_id
+            }:
+                continue
+            released.extend(fingerprints.discard(filename, ids))
+        self._delete(released)
+        self._save_session()
 
     def remove_pdf(self, pdf_path: str) -> None:
         """
         Remove a PDF document and its associated data from the chat session.
+        Its chunks are deleted unless another session holds the file.
 
         Args:
-            pdf_path (str): The path to the PDF file to remove.
-        Raises:
-            ValueError: If the PDF file is not found in the session.
+            pdf_path (str): The path to the PDF file to remove. Nothing
+                happens when the file is not loaded in the session.
         """
-        for doc_schema in self.session.documents:
-            if doc_schema.filename == pdf_path:
-                VectorHandler.delete_documents_from_vector_store(
-                    vector_store=self.db,
-                    ids=doc_schema.documents_id
+        if self.session.pop(pdf_path) is not None:
+            self._delete(
+                self.ingest.fingerprints.release(
+                    pdf_path, self.session.session_id
                 )
-                self.session.documents.remove(doc_schema)
-                break
+            )
+            self._save_session()
 
     def clear_session(self) -> None:
         """
-        Clear all documents and data from the current chat session.
+        Clear all documents and data from the current chat session. The
+        chunks of files other sessions hold are kept.
         """
         for doc_schema in self.session.documents:
-            VectorHandler.delete_documents_from_vector_store(
-                vector_store=self.db,
-                ids=doc_schema.documents_id
+            self._delete(
+                self.ingest.fingerprints.release(
+                    doc_schema.filename, self.session.session_id
+                )
             )
-        self.session.documents.clear()
+        self.session.clear()
+        if self.sessions is not None:
+            self.sessions.delete(self.session.session_id)
+        self._invalidate_answers()
 
     def list_pdf(self) -> list[str]:
         """
@@ -183,3 +368,777 @@ class ChatService:
             list: A list of filenames of the loaded PDF documents.
         """
         return [doc.filename for doc in self.session.documents]
+
+    def _restore_session(self, session_id: str | None) -> ChatSessionSchema:
+        """
+        The stored session with this ID, or a new empty one. Files whose
+        chunks were removed from the vector store since are dropped from
+        the restored session, and the session is recorded as holding the
+        others.
+        """
+        session = None
+        if self.sessions is not None and session_id is not None:
+            session = self.sessions.load(session_id)
+        if session is None:
+            return ChatSessionSchema(
+                session_id=session_id or str(uuid4()),
+                documents=[]
+            )
+        fingerprints = self.ingest.fingerprints
+        acquired = False
+        for doc in list(session.documents):
+            if fingerprints.get(doc.filename) is None:
+                session.pop(doc.filename)
+            elif fingerprints.acquire(doc.filename, session.session_id):
+                acquired = True
+        if acquired:
+            fingerprints.save()
+        return session
+
+    def _save_session(self) -> None:
+        """
+        Persist the session, when a session store is set.
+        """
+        if self.sessions is not None:
+            self.sessions.save(self.session)
+
+    def _delete(self, ids: list[str]) -> None:
+        """
+        Delete chunks that no loaded file references anymore, persist
+        the vector store and the fingerprint index and forget cached
+        answers.
+        """
+        self._invalidate_answers()
+        if ids:
+            VectorHandler.delete_documents_from_vector_store(
+                vector_store=self.db,
+                ids=ids
+            )
+            if self.facts is not None:
+                self.facts.delete(ids)
+            if self.lexical is not None:
+                self.lexical.remove(ids)
+                self.lexical.save()
+        VectorHandler.persist_vector_store(self.db)
+        self.ingest.fingerprints.save()
+
+    def _retrieve(
+        self,
+        message: str
+    ) -> tuple[list[float] | None, list[Document]]:
+        """
+        Embed the message and retrieve the documents most similar to it,
+        reranking an oversampled candidate set when a reranker is set,
+        after the facts the message asks for, if any.
+        """
+        return self._retrieve_batch([message])[0]
+
+    def _retrieve_batch(
+        self,
+        messages: list[str]
+    ) -> list[tuple[list[float] | None, list[Document]]]:
+        """
+        Retrieve the facts and documents of many messages, as
+        `_retrieve`.
+
+        The messages are embedded in one call and searched in one call
+        to the vector store. The candidates they share are embedded once
+        for the reranker.
+        """
+        queries = messages
+
+        timings = [time.perf_counter()]
+        if len(queries) == 1:
+            embeddings = [
+                VectorHandler.map_text_to_vector(
+                    queries[0], self.db.embeddings
+                )
+            ]
+        else:
+            embeddings = VectorHandler.map_texts_to_vectors(
+                queries, self.db.embeddings
+            )
+        timings.append(time.perf_counter())
+        batches = self._search(queries, embeddings, self._fetch_size())
+        timings.append(time.perf_counter())
+        candidates = sum(len(documents) for documents in batches)
+        if self.reranker is not None:
+            batches = self._rerank_batch(queries, embeddings, batches)
+        timings.append(time.perf_counter())
+
+        self._log_retrieval(
+            len(queries),
+            candidates,
+            sum(len(documents) for documents in batches),
+            timings,
+        )
+        return [
+            (embedding, self._merge_facts(self._find_facts(query), documents))
+            for query, embedding, documents in zip(
+                queries, embeddings, batches
+            )
+        ]
+
+    def _scope(self) -> Collection[str] | None:
+        """
+        IDs of the chunks the session may retrieve, or None when it
+        holds every loaded chunk and retrieval needs no filter.
+        """
+        ids = self.session.ids()
+        if len(ids) >= self.ingest.fingerprints.chunk_count():
+            return None
+        return ids
+
+    def _search(
+        self,
+        queries: list[str],
+        embeddings: list[list[float]],
+        fetch: int
+    ) -> list[list[Document]]:
+        """
+        The `fetch` best candidates of each query among the chunks of the
+        session, by vector search fused with BM25 when hybrid search is
+        on. While other sessions hold chunks this one does not, those are
+        filtered out and the search is repeated for four times as many
+        results until every query has `fetch` candidates.
+        """
+        scope = self._scope()
+        lexical_ids = None
+        if self.lexical is not None:
+            lexical_ids = [
+                self._lexical_ids(query, scope) for query in queries
+            ]
+        size = fetch
+        while True:
+            if lexical_ids is not None:
+                batches = VectorHandler.find_documents_by_hybrid_batch(
+                    self.db,
+                    embeddings,
+                    lexical_ids,
+                    k=size,
+                    candidates=max(size, settings.HYBRID_CANDIDATES),
+                    rrf_k=settings.HYBRID_RRF_K,
+                )
+            else:
+                batches = VectorHandler.find_documents_by_vectors(
+                    self.db, embeddings, k=size
+                )
+            if scope is None:
+                return batches
+            batches = [
+                [doc for doc in documents if doc.id in scope][:fetch]
+                for documents in batches
+            ]
+            if size >= self.ingest.fingerprints.chunk_count() or all(
+                len(documents) >= fetch for documents in batches
+            ):
+                return batches
+            size *= 4
+
+    def _rerank_batch(
+        self,
+        queries: list[str],
+        embeddings: list[list[float]],
+        batches: list[list[Document]]
+    ) -> list[list[Document]]:
+        """
+        Rerank the candidates of many queries, embedding each distinct
+        candidate once.
+        """
+        unique = {doc.id: doc for documents in batches for doc in documents}
+        vectors = dict(zip(
+            unique,
+            self.reranker.embeddings.embed_documents(
+                [doc.page_content for doc in unique.values()]
+            ),
+        ))
+        return [
+            self.reranker.rerank(
+                query,
+                embedding,
+                documents,
+                settings.RETRIEVAL_K,
+                vectors=[vectors[doc.id] for doc in documents],
+            )
+            for query, embedding, documents in zip(
+                queries, embeddings, batches
+            )
+        ]
+
+    def _answer_from_cache(
+        self,
+        messages: list[str],
+        retrieved: list[tuple[list[float] | None, list[Document]]]
+    ) -> tuple[
+        list[str | None],
+        list[tuple[int, list[float] | None, list[Document]]]
+    ]:
+        """
+        The cached answer of each message, None when there is none, and
+        the (index, embedding, documents) of the messages left to answer.
+        """
+        answers: list[str | None] = []
+        pending = []
+        for index, (embedding, documents) in enumerate(retrieved):
+            answers.append(
+                self._cached_answer(embedding, [doc.id for doc in documents])
+            )
+            if answers[-1] is None:
+                pending.append((index, embedding, documents))
+        return answers, pending
+
+    def _store_answers(
+        self,
+        answers: list[str | None],
+        pending: list[tuple[int, list[float] | None, list[Document]]],
+        responses: list
+    ) -> None:
+        """
+        Fill in and cache the answers of a batch of model responses.
+        """
+        for (index, embedding, documents), response in zip(
+            pending, responses
+        ):
+            answers[index] = str(response.content)
+            self._store_answer(
+                embedding, [doc.id for doc in documents], answers[index]
+            )
+
+    def _fetch_size(self) -> int:
+        """
+        Number of candidates the first retrieval stage returns.
+        """
+        if self.reranker is None:
+            return settings.RETRIEVAL_K
+        return settings.RETRIEVAL_K * settings.RETRIEVAL_OVERSAMPLING
+
+    @staticmethod
+    def _log_retrieval(
+        queries: int,
+        candidates: int,
+        documents: int,
+        timings: list[float]
+    ) -> None:
+        """
+        Log and trace the result and the time of each retrieval stage,
+        given as the start time followed by the end time of each stage.
+        """
+        for name, start, end in zip(
+            ("retrieve.embed", "retrieve.search", "retrieve.rerank"),
+            timings,
+            timings[1:],
+        ):
+            tracer.record(name, start, end, queries=queries)
+        tracer.record(
+            "retrieve",
+            timings[0],
+            timings[-1],
+            queries=queries,
+            candidates=candidates,
+            documents=documents,
+        )
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        embed, search, rerank = (
+            (end - start) * 1000 for start, end in zip(timings, timings[1:])
+        )
+        logger.debug(
+            "Found similar documents",
+            extra={
+                "queries": queries,
+                "documents": documents,
+                "candidates": candidates,
+                "embed_ms": round(embed, 1),
+                "search_ms": round(search, 1),
+                "rerank_ms": round(rerank, 1),
+            },
+        )
+
+    def _lexical_ids(
+        self,
+        message: str,
+        scope: Collection[str] | None = None
+    ) -> list[str]:
+        """
+        IDs of the chunks ranked by BM25 for the message, best first,
+        among the `scope` chunks when given.
+        """
+        return [
+            id
+            for id, _ in self.lexical.search(
+                message, k=settings.HYBRID_CANDIDATES, ids=scope
+            )
+        ]
+
+    def _find_facts(self, message: str) -> list[Document]:
+        """
+        The sentences of the metric facts a question asks for, grouped
+        by chunk, or an empty list when the question does not ask for a
+        number or is not about a known metric.
+
+        A fact only answers the question when every term of its key
+        appears in the question, e.g. "net revenue" for "What was the
+        net revenue in 2023?", and, when the question names years, when
+        it is about one of them. Only the facts of the session's chunks
+        are found.
+        """
+        if self.facts is None:
+            return []
+        terms, years, factual = FactExtractor.parse_query(message)
+        if not factual:
+            return []
+        scope = self._scope()
+        sources = None
+        if scope is not None:
+            sources = [doc.filename for doc in self.session.documents]
+        query_terms = set(terms)
+        sentences: dict[str, list[str]] = {}
+        metadata: dict[str, dict] = {}
+        for fact in self.facts.search(terms, years, sources=sources):
+            if scope is not None and fact.chunk_id not in scope:
+                continue
+            key_terms = set(FactExtractor.terms(fact.key))
+            if not key_terms or not key_terms <= query_terms:
+                continue
+            chunk = sentences.setdefault(fact.chunk_id, [])
+            if fact.sentence not in chunk:
+                chunk.append(fact.sentence)
+            metadata[fact.chunk_id] = {
+                "source": fact.source,
+                "page": fact.page,
+            }
+        if sentences:
+            logger.debug(
+                "Adding facts to the retrieved context",
+                extra={"chunks": len(sentences)},
+            )
+        return [
+            Document(
+                page_content=" ".join(chunk),
+                metadata=metadata[chunk_id],
+                id=chunk_id,
+            )
+            for chunk_id, chunk in sentences.items()
+        ]
+
+    @staticmethod
+    def _merge_facts(
+        facts: list[Document],
+        documents: list[Document]
+    ) -> list[Document]:
+        """
+        The fact sentences first, then the retrieved documents. A fact
+        whose whole chunk was retrieved is replaced by the chunk.
+        """
+        if not facts:
+            return documents
+        retrieved = {doc.id: doc for doc in documents}
+        merged = [retrieved.get(fact.id, fact) for fact in facts]
+        ids = {doc.id for doc in merged}
+        return merged + [doc for doc in documents if doc.id not in ids]
+
+    def _cached_answer(
+        self,
+        embedding: list[float] | None,
+        ids: list[str | None]
+    ) -> str | None:
+        """
+        Answer of an earlier, similar query that retrieved the same chunks.
+        """
+        if self.answers is None or embedding is None or None in ids:
+            return None
+        answer = self.answers.get(embedding, ids)
+        if answer is not None:
+            logger.debug(
+                "Answer cache hit",
+                extra={
+                    "hits": self.answers.hits,
+                    "misses": self.answers.misses,
+                },
+            )
+        return answer
+
+    def _store_answer(
+        self,
+        embedding: list[float] | None,
+        ids: list[str | None],
+        answer: str
+    ) -> None:
+        """
+        Remember the answer to a query for similar queries.
+        """
+        if self.answers is None or embedding is None or None in ids:
+            return
+        self.answers.put(embedding, ids, answer)
+
+    def _compress(
+        self,
+        message: str,
+        documents: list[Document]
+    ) -> list[Document]:
+        """
+        Merge adjacent retrieved chunks, then reduce them to their
+        sentences most relevant to the query. Facts are already reduced
+        to their sentences.
+        """
+        with tracer.span("prompt.compress", documents=len(documents)):
+            documents = self.assembler.merge(documents)
+            if self.compressor is None:
+                return documents
+            return self.compressor.compress(message, documents)
+
+    def _invalidate_answers(self) -> None:
+        """
+        Forget cached answers after the document collection changed.
+        """
+        if self.answers is not None:
+            self.answers.clear()
+
+    @staticmethod
+    def _log_latency(started: float, first_token: float | None) -> None:
+        """
+        Log the time to first token and the total latency of a response.
+        """
+        finished = time.perf_counter()
+        tracer.record("chat.stream", started, finished)
+        if first_token is not None:
+            tracer.record("chat.first_token", started, started + first_token)
+        logger.debug(
+            "Response streamed",
+            extra={
+                "first_token_s": (
+                    round(first_token, 3) if first_token is not None else None
+                ),
+                "total_s": round(finished - started, 3),
+            },
+        )
+
+    def _build_input(
+        self,
+        message: str,
+        documents: list[Document]
+    ) -> list[dict[str, str]]:
+        """
+        Build the model input from the message and its context documents,
+        most relevant first, within the context token budget.
+        """
+        with tracer.span("prompt.assemble") as span:
+            context = self.assembler.assemble(documents)
+            span.set(
+                passages=len(context.documents),
+                tokens_used=context.tokens_used,
+                tokens_dropped=context.tokens_dropped,
+            )
+
+        logger.debug(
+            "Context prepared for the model",
+            extra={
+                "passages": len(context.documents),
+                "tokens_used": context.tokens_used,
+                "tokens_dropped": context.tokens_dropped,
+            },
+        )
+
+        return [
+            {
+                "role": "system",
+                "content": (
+                    f"Use this context on the documents:\n{context.text}"
+                )
+            },
+            {"role": "user", "content": f"Answer: {message}"}
+        ]
+
+
+class AsyncChatService(ChatService):
+    """
+    Asynchronous variant of `ChatService`, so one event loop can serve
+    many conversations at once.
+
+    Queries go through the async LangChain APIs (`aembed_query`,
+    `asimilarity_search_by_vector`, `ainvoke` and `astream`). PDF loading
+    runs the ingest pipeline in a worker thread. A per-session lock keeps
+    the session documents consistent: changes to the session are
+    serialized, and retrieval never sees a half-applied change.
+
+    Attributes:
+        lock (asyncio.Lock): Lock guarding the session documents.
+
+    Methods:
+        asend_message(message: str) -> str:
+            Process a user message and generate a response.
+        astream_message(message: str) -> AsyncIterator[str]:
+            Process a user message and stream the response.
+        asend_messages(messages: list[str], concurrency: int)
+            -> list[str]:
+            Process many user messages in batch.
+        aadd_pdf(pdf_path: str) -> None:
+            Add a PDF document to the chat session.
+        asummarize_pdf(pdf_path: str) -> str:
+            Summarize a PDF document.
+        aremove_documents(document_ids: list[str]) -> None:
+            Remove many documents from the chat session by their IDs.
+        aremove_pdf(pdf_path: str) -> None:
+            Remove a PDF document from the chat session.
+        aclear_session() -> None:
+            Clear all documents from the current chat session.
+        alist_pdf() -> list[str]:
+            List all loaded PDF documents in the chat session.
+    """
+    def __init__(
+        self,
+        db: Chroma,
+        model: ChatOllama,
+        fingerprints: FingerprintIndex | None = None,
+        summaries: SummaryService | None = None,
+        facts: FactIndex | None = None,
+        lexical: BM25Index | None = None,
+        reranker: Reranker | None = None,
+        sessions: SessionStore | None = None,
+        session_id: str | None = None
+    ):
+        super().__init__(
+            db,
+            model,
+            fingerprints,
+            summaries,
+            facts,
+            lexical,
+            reranker,
+            sessions,
+            session_id,
+        )
+        self.lock = asyncio.Lock()
+
+    async def asend_message(self, message: str) -> str:
+        """
+        Process a user message and generate a response.
+
+        Args:
+            message (str): The user's message.
+        Returns:
+            str: The generated response.
+        """
+        embedding, documents = await self._aretrieve(message)
+        ids = [doc.id for doc in documents]
+        answer = self._cached_answer(embedding, ids)
+        if answer is not None:
+            return answer
+
+        documents = self._compress(message, documents)
+        input = self._build_input(message, documents)
+
+        with tracer.span("llm.generate", mode="ainvoke"):
+            response = await self.model.ainvoke(input=input)
+
+        logger.debug("Model response received: %s", response)
+
+        answer = str(response.content)
+        self._store_answer(embedding, ids, answer)
+        return answer
+
+    async def astream_message(self, message: str) -> AsyncIterator[str]:
+        """
+        Process a user message and stream the response. Time to first
+        token and total latency are logged when the response ends.
+
+        Args:
+            message (str): The user's message.
+        Yields:
+            str: The next piece of the generated response.
+        """
+        started = time.perf_counter()
+        embedding, documents = await self._aretrieve(message)
+        ids = [doc.id for doc in documents]
+        answer = self._cached_answer(embedding, ids)
+        if answer is not None:
+            yield answer
+            self._log_latency(started, time.perf_counter() - started)
+            return
+
+        documents = self._compress(message, documents)
+        input = self._build_input(message, documents)
+
+        first_token = None
+        parts = []
+        with tracer.span("llm.generate", mode="astream") as span:
+            async for chunk in self.model.astream(input=input):
+                if not chunk.content:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                    span.set(first_token_ms=round(first_token * 1000, 3))
+                parts.append(str(chunk.content))
+                yield parts[-1]
+
+        self._log_latency(started, first_token)
+        self._store_answer(embedding, ids, "".join(parts))
+
+    async def asend_messages(
+        self,
+        messages: list[str],
+        concurrency: int = settings.BATCH_CONCURRENCY
+    ) -> list[str]:
+        """
+        Process many user messages in batch, as `send_messages`.
+
+        Args:
+            messages (list[str]): The user's messages.
+            concurrency (int): Maximum number of model calls in flight.
+        Returns:
+            list[str]: The generated responses, in the order of
+                `messages`.
+        """
+        unique = list(dict.fromkeys(messages))
+        async with self.lock:
+            retrieved = await asyncio.to_thread(self._retrieve_batch, unique)
+        answers, pending = self._answer_from_cache(unique, retrieved)
+        inputs = [
+            self._build_input(
+                unique[index], self._compress(unique[index], documents)
+            )
+            for index, embedding, documents in pending
+        ]
+        if inputs:
+            with tracer.span(
+                "llm.generate", mode="abatch", requests=len(inputs)
+            ):
+                responses = await self.model.abatch(
+                    inputs, config={"max_concurrency": concurrency}
+                )
+            self._store_answers(answers, pending, responses)
+        answer_of = dict(zip(unique, answers))
+        return [answer_of[message] for message in messages]
+
+    async def aadd_pdf(self, pdf_path: str) -> None:
+        """
+        Add a PDF document to the chat session.
+
+        Args:
+            pdf_path (str): The path to the PDF file.
+
+        Raises:
+            FileNotFoundError: If the specified PDF file does not exist.
+        """
+        async with self.lock:
+            await asyncio.to_thread(self.add_pdf, pdf_path)
+
+    async def asummarize_pdf(self, pdf_path: str) -> str:
+        """
+        Summarize a PDF document. The session is not touched, so no lock
+        is taken.
+
+        Args:
+            pdf_path (str): The path to the PDF file.
+
+        Returns:
+            str: The summary.
+        """
+        return await asyncio.to_thread(self.summarize_pdf, pdf_path)
+
+    async def aremove_documents(self, document_ids: list[str]) -> None:
+        """
+        Remove many documents from the chat session by their IDs.
+
+        Args:
+            document_ids (list[str]): The IDs of the documents to remove.
+        """
+        async with self.lock:
+            await asyncio.to_thread(self.remove_documents, document_ids)
+
+    async def aremove_pdf(self, pdf_path: str) -> None:
+        """
+        Remove a PDF document and its associated data from the chat session.
+
+        Args:
+            pdf_path (str): The path to the PDF file to remove.
+        """
+        async with self.lock:
+            await asyncio.to_thread(self.remove_pdf, pdf_path)
+
+    async def aclear_session(self) -> None:
+        """
+        Clear all documents and data from the current chat session.
+        """
+        async with self.lock:
+            await asyncio.to_thread(self.clear_session)
+
+    async def alist_pdf(self) -> list[str]:
+        """
+        List all loaded PDF documents in the current chat session.
+
+        Returns:
+            list: A list of filenames of the loaded PDF documents.
+        """
+        async with self.lock:
+            return self.list_pdf()
+
+    async def _aretrieve(
+        self,
+        message: str
+    ) -> tuple[list[float] | None, list[Document]]:
+        """
+        Embed the message and retrieve the documents most similar to it,
+        reranking an oversampled candidate set when a reranker is set,
+        after the facts the message asks for, if any.
+        """
+        timings = [time.perf_counter()]
+        embedding = await VectorHandler.amap_text_to_vector(
+            message, self.db.embeddings
+        )
+        timings.append(time.perf_counter())
+        async with self.lock:
+            documents = await self._asearch(
+                message, embedding, self._fetch_size()
+            )
+        timings.append(time.perf_counter())
+        candidates = len(documents)
+        if self.reranker is not None:
+            documents = await self.reranker.arerank(
+                message, embedding, documents, settings.RETRIEVAL_K
+            )
+        timings.append(time.perf_counter())
+
+        self._log_retrieval(1, candidates, len(documents), timings)
+        async with self.lock:
+            facts = self._find_facts(message)
+        return embedding, self._merge_facts(facts, documents)
+
+    async def _asearch(
+        self,
+        message: str,
+        embedding: list[float],
+        fetch: int
+    ) -> list[Document]:
+        """
+        Asynchronously find the `fetch` best candidates of the message
+        among the chunks of the session, as `_search`.
+        """
+        scope = self._scope()
+        lexical_ids = None
+        if self.lexical is not None:
+            lexical_ids = self._lexical_ids(message, scope)
+        size = fetch
+        while True:
+            if lexical_ids is not None:
+                documents = await VectorHandler.afind_documents_by_hybrid(
+                    self.db,
+                    embedding,
+                    lexical_ids,
+                    k=size,
+                    candidates=max(size, settings.HYBRID_CANDIDATES),
+                    rrf_k=settings.HYBRID_RRF_K,
+                )
+            else:
+                documents = await VectorHandler.afind_documents_by_vector(
+                    self.db, embedding, k=size
+                )
+            if scope is None:
+                return documents
+            documents = [doc for doc in documents if doc.id in scope]
+            if (
+                len(documents) >= fetch
+                or size >= self.ingest.fingerprints.chunk_count()
+            ):
+                return documents[:fetch]
+            size *= 4
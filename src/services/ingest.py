@@ -0,0 +1,523 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable, Iterator
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import TYPE_CHECKING, Any
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.core import settings, tracer
+from src.core.cache import CachedEmbeddings
+from src.core.executor import EmbeddingExecutor
+from src.db import BM25Index, FactIndex, FingerprintIndex
+from src.schemas import FileRecordSchema, PageRecordSchema
+from src.utils.extraction import FactExtractor
+from src.utils.handlers import PDFHandler, VectorHandler
+
+
+# only annotations use the client, so its library is not imported
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class IngestService:
+    """
+    Staged pipeline that streams a PDF into the vector store.
+
+    The stages are page extraction (process pool) → chunking →
+    embedding → vector store write. Each stage runs in its own thread and
+    hands batches to the next one through a bounded queue, so a slow stage
+    applies backpressure to the ones before it and at most `queue_size`
+    batches wait between two stages. Embedding the next batch overlaps
+    with writing the previous one.
+
+    Attributes:
+        db (Chroma): The vector store the chunks are written to.
+        embeddings (Embeddings): The embedding model used for the chunks.
+        fingerprints (FingerprintIndex): Index of the files already in
+            `db`, used to skip unchanged files and pages.
+        facts (FactIndex | None): Index the facts of the written chunks
+            are extracted into, or None to skip extraction.
+        lexical (BM25Index | None): Inverted index kept in step with
+            `db` for hybrid retrieval, or None to skip it.
+        transform (Callable): Chunking step applied to each batch
+            of pages. Defaults to `PDFHandler.split_documents` with
+            `chunk_size` and `chunk_overlap`.
+        chunk_size (int): Maximum number of characters per chunk.
+        chunk_overlap (int): Number of characters shared by consecutive
+            chunks.
+        page_workers (int): Number of page extraction processes.
+        page_batch_size (int): Number of pages per extraction task.
+        embed_batch_size (int): Number of chunks per embedding call.
+        queue_size (int): Maximum number of batches between two stages.
+        fact_batch_size (int): Number of chunks per fact index
+            transaction.
+
+    Methods:
+        ingest_pdf(pdf_path: str) -> list[str]:
+            Run the pipeline for a PDF file.
+    """
+    def __init__(
+        self,
+        db: Chroma,
+        embeddings: Embeddings | None = None,
+        fingerprints: FingerprintIndex | None = None,
+        facts: FactIndex | None = None,
+        lexical: BM25Index | None = None,
+        transform: Callable[[list[Document]], list[Document]] | None = None,
+        chunk_size: int = settings.CHUNK_SIZE,
+        chunk_overlap: int = settings.CHUNK_OVERLAP,
+        page_workers: int = settings.INGEST_PAGE_WORKERS,
+        page_batch_size: int = settings.INGEST_PAGE_BATCH_SIZE,
+        embed_batch_size: int = settings.INGEST_EMBED_BATCH_SIZE,
+        queue_size: int = settings.INGEST_QUEUE_SIZE,
+        fact_batch_size: int = settings.FACT_EXTRACTION_BATCH_SIZE,
+    ):
+        self.db = db
+        self.embeddings = embeddings or db.embeddings
+        self.fingerprints = fingerprints or FingerprintIndex()
+        self.facts = facts
+        self.lexical = lexical
+        self.transform = transform or self._split
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.page_workers = page_workers
+        self.page_batch_size = page_batch_size
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.fact_batch_size = fact_batch_size
+
+    def ingest_pdf(self, pdf_path: str) -> list[str]:
+        """
+        Run the pipeline for a PDF file.
+
+        Files already in the fingerprint index with the same content are
+        skipped without reading the vector store. For a changed file only
+        the pages whose text changed go through the pipeline, and chunks
+        that are no longer used by any file are deleted from the vector
+        store. Pages whose chunks are missing from the vector store go
+        through the pipeline again.
+
+        Args:
+            pdf_path (str): The path to the PDF file.
+
+        Returns:
+            list[str]: The IDs of the chunks of the file in the vector
+                store.
+
+        Raises:
+            ValueError: If no text could be extracted from the PDF.
+        """
+        started = time.perf_counter()
+        fingerprint = FingerprintIndex.fingerprint_file(pdf_path)
+        previous = self.fingerprints.get(pdf_path)
+        known = previous.pages if previous is not None else {}
+        if previous is not None and previous.fingerprint == fingerprint:
+            ids = previous.ids()
+            if self._backfill(ids):
+                logger.info(
+                    "File is already loaded, skipping ingestion",
+                    extra={"path": pdf_path},
+                )
+                return ids
+            logger.warning(
+                "Chunks of a loaded file are missing from the vector "
+                "store, ingesting it again",
+                extra={"path": pdf_path},
+            )
+            known = {}
+
+        stats = {"pages": 0, "reused": 0, "dropped": 0}
+        record = FileRecordSchema(filename=pdf_path, fingerprint=fingerprint)
+        written = self._run(pdf_path, record, known, stats)
+        ids = record.ids()
+        documents, missing = self._stored(ids, written)
+        if missing:
+            # reused pages whose chunks were deleted from the vector
+            # store behind the fingerprint index
+            logger.warning(
+                "Reused chunks are missing from the vector store, "
+                "ingesting their pages again",
+                extra={"path": pdf_path, "missing": len(missing)},
+            )
+            lost = set(missing)
+            known = {
+                number: page
+                for number, page in record.pages.items()
+                if lost.isdisjoint(page.ids)
+            }
+            stats = {"pages": 0, "reused": 0, "dropped": 0}
+            record = FileRecordSchema(
+                filename=pdf_path, fingerprint=fingerprint
+            )
+            written.update(self._run(pdf_path, record, known, stats))
+            ids = record.ids()
+            documents, missing = self._stored(ids, written)
+
+        if stats["dropped"]:
+            logger.warning(
+                "Empty chunks were dropped before indexing",
+                extra={"path": pdf_path, "dropped": stats["dropped"]},
+            )
+        if not ids:
+            raise ValueError("No text extracted from PDF; aborting load.")
+        if missing:
+            raise ValueError(
+                f"{len(missing)} chunks of {pdf_path} could not be written "
+                "to the vector store."
+            )
+
+        stale = self.fingerprints.put(record)
+        if stale:
+            VectorHandler.delete_documents_from_vector_store(
+                vector_store=self.db,
+                ids=stale,
+            )
+            if self.facts is not None:
+                self.facts.delete(stale)
+            if self.lexical is not None:
+                self.lexical.remove(stale)
+        # the chunks are saved before the fingerprints that point to them
+        VectorHandler.persist_vector_store(self.db)
+        self.fingerprints.save()
+
+        logger.info(
+            "Ingested PDF",
+            extra={
+                "path": pdf_path,
+                "pages": stats["pages"],
+                "chunks": len(ids),
+                "dropped": stats["dropped"],
+                "reused_pages": stats["reused"],
+                "written": len(written),
+                "deleted": len(stale),
+            },
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            embeddings = self.embeddings
+            if isinstance(embeddings, CachedEmbeddings):
+                logger.debug(
+                    "Embedding cache",
+                    extra={"stats": embeddings.cache.stats()},
+                )
+                embeddings = embeddings.embeddings
+            if isinstance(embeddings, EmbeddingExecutor):
+                logger.debug(
+                    "Embedding throughput",
+                    extra={"stats": embeddings.stats()},
+                )
+        # chunks reused from earlier runs, or written by a run that was
+        # interrupted before its extraction finished
+        self._index_facts(ids, documents)
+        self._index_lexical(ids, documents)
+        if logger.isEnabledFor(logging.DEBUG):
+            if self.facts is not None:
+                logger.debug(
+                    "Fact index", extra={"stats": self.facts.stats()}
+                )
+            if self.lexical is not None:
+                logger.debug(
+                    "Lexical index", extra={"stats": self.lexical.stats()}
+                )
+        tracer.record(
+            "ingest.pdf",
+            started,
+            time.perf_counter(),
+            pages=stats["pages"],
+            chunks=len(ids),
+        )
+        return ids
+
+    def _run(
+        self,
+        pdf_path: str,
+        record: FileRecordSchema,
+        known: dict[int, PageRecordSchema],
+        stats: dict[str, int]
+    ) -> dict[str, Document]:
+        """
+        Run the extraction, chunking, embedding and write stages for the
+        pages of the file not in `known`, filling `record`.
+
+        Returns:
+            dict[str, Document]: The chunks written, by ID.
+        """
+        chunk_queue: Queue[Any] = Queue(maxsize=self.queue_size)
+        write_queue: Queue[Any] = Queue(maxsize=self.queue_size)
+        stop = Event()
+        stages = [
+            Thread(
+                target=self._run_stage,
+                args=(
+                    self._extract(pdf_path, record, known, stats),
+                    chunk_queue,
+                    stop,
+                ),
+                name="ingest-extract",
+                daemon=True,
+            ),
+            Thread(
+                target=self._run_stage,
+                args=(
+                    self._embed(self._consume(chunk_queue, stop), record),
+                    write_queue,
+                    stop,
+                ),
+                name="ingest-embed",
+                daemon=True,
+            ),
+        ]
+        for stage in stages:
+            stage.start()
+
+        written: dict[str, Document] = {}
+        try:
+            for batch_ids, batch, vectors in self._consume(write_queue, stop):
+                with tracer.span("ingest.write", chunks=len(batch)):
+                    VectorHandler.save_embeddings_on_vector_store(
+                        vector_store=self.db,
+                        documents=batch,
+                        embeddings=vectors,
+                        ids=batch_ids,
+                    )
+                written.update(zip(batch_ids, batch))
+                with tracer.span("ingest.index", chunks=len(batch)):
+                    self._index_facts(batch_ids, batch)
+                    if self.lexical is not None:
+                        self.lexical.add(
+                            batch_ids, [doc.page_content for doc in batch]
+                        )
+        finally:
+            stop.set()
+            for stage in stages:
+                stage.join()
+        return written
+
+    def _stored(
+        self,
+        ids: list[str],
+        written: dict[str, Document]
+    ) -> tuple[list[Document], list[str]]:
+        """
+        The chunk of each ID, fetching from the vector store the ones
+        that were not written in this run.
+
+        Returns:
+            tuple[list[Document], list[str]]: The chunks found, in the
+                order of `ids`, and the IDs missing from the vector
+                store.
+        """
+        documents = dict(written)
+        for document in VectorHandler.get_documents_by_ids(
+            self.db, [id for id in ids if id not in written]
+        ):
+            documents[document.id] = document
+        missing = [id for id in ids if id not in documents]
+        return [documents[id] for id in ids if id in documents], missing
+
+    def _backfill(self, ids: list[str]) -> bool:
+        """
+        Index the chunks of an unchanged file that the fact or lexical
+        index lack, e.g. written before the index was enabled. Only those
+        chunks are read from the vector store, so a file indexed
+        everywhere costs two index lookups.
+
+        Returns:
+            bool: False when some of those chunks are missing from the
+                vector store, and the file has to be ingested again.
+        """
+        pending: set[str] = set()
+        if self.facts is not None:
+            pending.update(self.facts.pending(ids))
+        if self.lexical is not None:
+            pending.update(self.lexical.pending(ids))
+        if not pending:
+            return True
+        ids = [id for id in ids if id in pending]
+        documents, missing = self._stored(ids, {})
+        if missing:
+            return False
+        self._index_facts(ids, documents)
+        self._index_lexical(ids, documents)
+        return True
+
+    def _index_facts(
+        self,
+        ids: list[str],
+        documents: list[Document]
+    ) -> None:
+        """
+        Extract the facts of the chunks not in the fact index yet, one
+        transaction per `fact_batch_size` chunks, so an interrupted run
+        keeps the finished batches.
+        """
+        if self.facts is None or not ids:
+            return
+        pending = set(self.facts.pending(ids))
+        chunks = [
+            (id, document)
+            for id, document in zip(ids, documents)
+            if id in pending
+        ]
+        for start in range(0, len(chunks), self.fact_batch_size):
+            self.facts.add([
+                (id, document, FactExtractor.extract(document.page_content))
+                for id, document in chunks[start:start + self.fact_batch_size]
+            ])
+
+    def _index_lexical(
+        self,
+        ids: list[str],
+        documents: list[Document]
+    ) -> None:
+        """
+        Add the chunks missing from the lexical index, e.g. written
+        before hybrid retrieval was enabled, and persist the index.
+        """
+        if self.lexical is None:
+            return
+        self.lexical.add(ids, [doc.page_content for doc in documents])
+        self.lexical.save()
+
+    def _extract(
+        self,
+        pdf_path: str,
+        record: FileRecordSchema,
+        known: dict[int, PageRecordSchema],
+        stats: dict[str, int]
+    ) -> Iterator[list[Document]]:
+        """
+        Extraction and chunking stages: yield the non-empty chunks of new
+        or changed pages in batches of `embed_batch_size`.
+        """
+        pending: list[Document] = []
+        for pages in tracer.iterate(
+            "ingest.load",
+            PDFHandler.lazy_load_pdf(
+                pdf_path,
+                batch_size=self.page_batch_size,
+                workers=self.page_workers,
+            ),
+        ):
+            stats["pages"] += len(pages)
+            changed = []
+            for page in pages:
+                page_number = page.metadata["page"]
+                page_hash = FingerprintIndex.hash_text(page.page_content)
+                known_page = known.get(page_number)
+                if known_page is not None and known_page.hash == page_hash:
+                    record.pages[page_number] = known_page
+                    stats["reused"] += 1
+                else:
+                    record.pages[page_number] = PageRecordSchema(
+                        hash=page_hash
+                    )
+                    changed.append(page)
+            if not changed:
+                continue
+
+            with tracer.span("ingest.split", pages=len(changed)):
+                chunks = self.transform(changed)
+            # some PDFs/pages may produce empty text
+            non_empty = [c for c in chunks if (c.page_content or "").strip()]
+            stats["dropped"] += len(chunks) - len(non_empty)
+            pending.extend(non_empty)
+            while len(pending) >= self.embed_batch_size:
+                yield pending[:self.embed_batch_size]
+                pending = pending[self.embed_batch_size:]
+        if pending:
+            yield pending
+
+    def _split(self, pages: list[Document]) -> list[Document]:
+        """
+        Default chunking stage.
+        """
+        return PDFHandler.split_documents(
+            pages,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+        )
+
+    def _embed(
+        self,
+        batches: Iterator[list[Document]],
+        record: FileRecordSchema
+    ) -> Iterator[tuple[list[str], list[Document], list[list[float]]]]:
+        """
+        Embedding stage: attach content-derived IDs and vectors to each
+        batch of chunks, skipping chunks already seen in this file.
+        """
+        seen: set[str] = set()
+        for batch in batches:
+            ids = []
+            unique = []
+            for document in batch:
+                id = FingerprintIndex.chunk_id(document)
+                record.pages[document.metadata["page"]].ids.append(id)
+                if id not in seen:
+                    seen.add(id)
+                    ids.append(id)
+                    unique.append(document)
+            if not unique:
+                continue
+            with tracer.span("ingest.embed", chunks=len(unique)):
+                vectors = self.embeddings.embed_documents(
+                    [doc.page_content for doc in unique]
+                )
+            yield ids, unique, vectors
+
+    @staticmethod
+    def _run_stage(items: Iterator[Any], out: Queue[Any], stop: Event) -> None:
+        """
+        Drive a stage in its own thread, forwarding its output (or the
+        error that interrupted it) to the next stage.
+        """
+        try:
+            for item in items:
+                if not IngestService._put(out, item, stop):
+                    return
+            IngestService._put(out, _DONE, stop)
+        except Exception as e:
+            IngestService._put(out, e, stop)
+
+    @staticmethod
+    def _put(queue: Queue[Any], item: Any, stop: Event) -> bool:
+        """
+        Block until there is room in the queue or the pipeline stops.
+        """
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    @staticmethod
+    def _consume(queue: Queue[Any], stop: Event) -> Iterator[Any]:
+        """
+        Yield items from the previous stage until it is done, re-raising
+        any error it forwarded.
+        """
+        while not stop.is_set():
+            try:
+                item = queue.get(timeout=0.1)
+            except Empty:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+__all__ = ["IngestService"]
@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from src.core import settings, tracer
+from src.core.cache import SummaryCache
+from src.utils.context import approximate_tokens
+from src.utils.handlers import PDFHandler
+
+
+logger = logging.getLogger(__name__)
+
+_MAP_PROMPT = (
+    "Summarize the following excerpt of a document. Keep names, numbers, "
+    "dates and conclusions; leave out everything else."
+)
+_REDUCE_PROMPT = (
+    "The following are summaries of consecutive parts of a document. "
+    "Combine them into one shorter summary that keeps names, numbers, "
+    "dates and conclusions."
+)
+
+
+class SummaryService:
+    """
+    Hierarchical map-reduce summarization of documents.
+
+    The chunks of a document are summarized concurrently (map), then
+    consecutive summaries are combined group by group (reduce), level
+    after level, until the summaries of the top level fit in
+    `token_budget` tokens or a single summary is left.
+
+    Every node is cached under a hash of its input: a chunk node under its
+    text, a combined node under the keys of its children. Group
+    boundaries are chosen from the node keys rather than by position, so
+    a changed page only changes the nodes on its path to the root and
+    summarizing the document again recomputes just that branch.
+
+    Attributes:
+        model (BaseChatModel): The chat model that writes the summaries.
+        cache (SummaryCache): Summaries of already computed nodes.
+        concurrency (int): Maximum number of model calls in flight.
+        fan_in (int): Average number of summaries combined per node.
+        token_budget (int): Size the final summary should fit in.
+
+    Methods:
+        summarize_documents(documents: list[Document]) -> str:
+            Summarize a list of chunks.
+        summarize_pdf(pdf_path: str) -> str:
+            Summarize a PDF file.
+        asummarize_pdf(pdf_path: str) -> str:
+            Asynchronously summarize a PDF file.
+    """
+    def __init__(
+        self,
+        model: BaseChatModel,
+        cache: SummaryCache | None = None,
+        concurrency: int = settings.SUMMARY_CONCURRENCY,
+        fan_in: int = settings.SUMMARY_FAN_IN,
+        token_budget: int = settings.SUMMARY_TOKEN_BUDGET,
+    ):
+        self.model = model
+        self.cache = cache or SummaryCache()
+        self.concurrency = concurrency
+        self.fan_in = fan_in
+        self.token_budget = token_budget
+        self._pool = ThreadPoolExecutor(
+            max_workers=concurrency,
+            thread_name_prefix="summary",
+        )
+
+    def summarize_documents(self, documents: list[Document]) -> str:
+        """
+        Summarize a list of chunks, in document order.
+
+        Args:
+            documents (list[Document]): The chunks to summarize.
+
+        Returns:
+            str: The summary.
+        """
+        hits, misses = self.cache.hits, self.cache.misses
+        model_name = str(
+            getattr(self.model, "model", None) or type(self.model).__name__
+        )
+        level = self._summarize([
+            (
+                self._key("map", model_name, document.page_content),
+                _MAP_PROMPT,
+                document.page_content,
+            )
+            for document in documents
+            if document.page_content.strip()
+        ])
+        levels = 1
+        while len(level) > 1 and (
+            approximate_tokens("\n\n".join(text for _, text in level))
+            > self.token_budget
+        ):
+            groups = self._group(level)
+            level = self._summarize([
+                (
+                    self._key("reduce", model_name, *(k for k, _ in group)),
+                    _REDUCE_PROMPT,
+                    "\n\n".join(text for _, text in group),
+                )
+                if len(group) > 1
+                else (group[0][0], None, group[0][1])
+                for group in groups
+            ])
+            levels += 1
+        self.cache.save()
+
+        logger.info(
+            "Summarized document",
+            extra={
+                "chunks": len(documents),
+                "levels": levels,
+                "computed": self.cache.misses - misses,
+                "cached": self.cache.hits - hits,
+            },
+        )
+        return "\n\n".join(text for _, text in level)
+
+    def summarize_pdf(self, pdf_path: str) -> str:
+        """
+        Summarize a PDF file.
+
+        Args:
+            pdf_path (str): The path to the PDF file.
+
+        Returns:
+            str: The summary.
+        """
+        with tracer.span("summary.load"):
+            pages = PDFHandler.load_pdf(pdf_path)
+        with tracer.span("summary.split", pages=len(pages)):
+            documents = PDFHandler.split_documents(
+                pages,
+                chunk_size=settings.CHUNK_SIZE,
+                chunk_overlap=settings.CHUNK_OVERLAP,
+            )
+        with tracer.span("summary.reduce", chunks=len(documents)):
+            return self.summarize_documents(documents)
+
+    async def asummarize_pdf(self, pdf_path: str) -> str:
+        """
+        Asynchronously summarize a PDF file.
+
+        Args:
+            pdf_path (str): The path to the PDF file.
+
+        Returns:
+            str: The summary.
+        """
+        return await asyncio.to_thread(self.summarize_pdf, pdf_path)
+
+    def _summarize(
+        self,
+        nodes: list[tuple[str, str | None, str]],
+    ) -> list[tuple[str, str]]:
+        """
+        Summaries of a level of nodes, given as (key, prompt, input).
+
+        Cached nodes are reused, the others are sent to the model over
+        the pool. A node without prompt passes its input through.
+        """
+        summaries: dict[str, str] = {}
+        pending = {}
+        for key, prompt, text in nodes:
+            if prompt is None:
+                summaries[key] = text
+            elif key not in summaries and key not in pending:
+                summary = self.cache.get(key)
+                if summary is None:
+                    pending[key] = self._pool.submit(
+                        self._invoke, prompt, text
+                    )
+                else:
+                    summaries[key] = summary
+        for key, future in pending.items():
+            summaries[key] = future.result()
+            self.cache.put(key, summaries[key])
+        return [(key, summaries[key]) for key, _, _ in nodes]
+
+    def _invoke(self, prompt: str, text: str) -> str:
+        with tracer.span("llm.generate", mode="summary"):
+            response = self.model.invoke(
+                input=[
+                    {"role": "system", "content": prompt},
+                    {"role": "user", "content": text},
+                ]
+            )
+        return str(response.content)
+
+    def _group(
+        self,
+        level: list[tuple[str, str]],
+    ) -> list[list[tuple[str, str]]]:
+        """
+        Split a level into runs of consecutive nodes.
+
+        A run ends after a node whose key hashes to 0 modulo `fan_in`, so
+        boundaries depend on content and stay put when an earlier node
+        changes. Runs have at least two nodes, except maybe the last, and
+        at most twice `fan_in`, so every level is at most about half as
+        long as the one below.
+        """
+        groups: list[list[tuple[str, str]]] = [[]]
+        for node in level:
+            group = groups[-1]
+            group.append(node)
+            if len(group) >= 2 and (
+                int(node[0][:8], 16) % self.fan_in == 0
+                or len(group) >= 2 * self.fan_in
+            ):
+                groups.append([])
+        if not groups[-1]:
+            groups.pop()
+        return groups
+
+    @staticmethod
+    def _key(kind: str, model_name: str, *parts: str) -> str:
+        digest = hashlib.sha256(f"{kind}\0{model_name}".encode("utf-8"))
+        for part in parts:
+            digest.update(b"\0" + part.encode("utf-8"))
+        return digest.hexdigest()
+
+
+__all__ = ["SummaryService"]
@@ -0,0 +1,385 @@
+import re
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.schemas import ContextSchema
+
+
+# Sentence ends followed by whitespace, and blank lines between
+# paragraphs.
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_TOKEN_PATTERN = re.compile(r"\w{1,64}")
+# End of a sentence, with any closing quote or bracket.
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s|$)")
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Split a text into sentences and paragraphs.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list[str]: The non-empty sentences, without surrounding
+            whitespace.
+    """
+    return [
+        sentence
+        for sentence in (part.strip() for part in _SENTENCE_BREAK.split(text))
+        if sentence
+    ]
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase word tokens of a text, for lexical matching. Digits are
+    kept, so codes such as "XK-200" are found by their parts.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list[str]: The tokens, in order.
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def approximate_tokens(text: str) -> int:
+    """
+    Rough token count of a text: about four characters per token.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The approximate number of tokens.
+    """
+    return len(text) // 4 + 1
+
+
+class ContextAssembler:
+    """
+    Assembly of the retrieved chunks into the context of a prompt.
+
+    Chunks of the same page whose `start_index` ranges overlap or touch
+    are merged into one passage, so the overlap between consecutive
+    chunks is sent once and the passage reads as continuous text. The
+    splitter starts the overlap of a chunk on a word boundary, so a
+    passage that starts or ends mid-sentence is trimmed to its whole
+    sentences. The passages then fill `token_budget` in order of
+    relevance. A passage that does not fit is cut after its last whole
+    sentence that fits, and left out when not even its first sentence
+    does, so the context never ends mid-sentence. Tokens are counted
+    with `approximate_tokens`, which needs no tokenizer.
+
+    Attributes:
+        token_budget (int): Maximum approximate tokens of context.
+        max_gap (int): Characters between two chunks of a page, left out
+            by the splitter as whitespace, up to which they are merged.
+
+    Methods:
+        merge(documents: list[Document]) -> list[Document]:
+            Merge adjacent chunks of the same page.
+        assemble(documents: list[Document]) -> ContextSchema:
+            Fill the budget with passages in order of relevance.
+    """
+    def __init__(self, token_budget: int = 1024, max_gap: int = 2):
+        self.token_budget = token_budget
+        self.max_gap = max_gap
+
+    def merge(self, documents: list[Document]) -> list[Document]:
+        """
+        Merge adjacent or overlapping chunks of the same page.
+
+        Args:
+            documents (list[Document]): The chunks, most relevant first.
+
+        Returns:
+            list[Document]: The passages, trimmed to whole sentences and
+                ordered by their most relevant chunk. A merged passage
+                keeps the metadata of its first chunk in the page and the
+                ID of its most relevant one. Chunks without
+                `start_index`, such as facts, are kept as they are.
+        """
+        passages: list[tuple[int, Document]] = []
+        pages: dict[tuple, list[tuple[int, Document]]] = {}
+        for rank, doc in enumerate(documents):
+            if doc.metadata.get("start_index") is None:
+                passages.append((rank, doc))
+                continue
+            key = (doc.metadata.get("source"), doc.metadata.get("page"))
+            pages.setdefault(key, []).append((rank, doc))
+
+        for chunks in pages.values():
+            chunks.sort(key=lambda chunk: chunk[1].metadata["start_index"])
+            run: list[tuple[int, Document]] = []
+            end = 0
+            for chunk in chunks:
+                start = chunk[1].metadata["start_index"]
+                if run and start > end + self.max_gap:
+                    passages.append(self._join(run))
+                    run = []
+                if not run:
+                    end = start
+                run.append(chunk)
+                end = max(end, start + len(chunk[1].page_content))
+            passages.append(self._join(run))
+
+        passages.sort(key=lambda passage: passage[0])
+        return [
+            doc if doc.metadata.get("start_index") is None
+            else self._trim(doc)
+            for _, doc in passages
+        ]
+
+    def assemble(self, documents: list[Document]) -> ContextSchema:
+        """
+        Fill the budget with passages in order of relevance, cutting
+        passages at sentence boundaries.
+
+        Args:
+            documents (list[Document]): The passages, most relevant
+                first.
+
+        Returns:
+            ContextSchema: The context, with the tokens used and the
+                tokens left out.
+        """
+        kept: list[Document] = []
+        used = 0
+        dropped = 0
+        for doc in documents:
+            tokens = approximate_tokens(doc.page_content)
+            if used + tokens <= self.token_budget:
+                kept.append(doc)
+                used += tokens
+                continue
+            sentences = []
+            taken = 0
+            for sentence in split_sentences(doc.page_content):
+                size = approximate_tokens(sentence)
+                if used + taken + size > self.token_budget:
+                    break
+                sentences.append(sentence)
+                taken += size
+            if sentences:
+                kept.append(
+                    Document(
+                        page_content=" ".join(sentences),
+                        metadata=doc.metadata,
+                        id=doc.id,
+                    )
+                )
+            used += taken
+            dropped += max(tokens - taken, 0)
+        return ContextSchema(
+            text="\n".join(doc.page_content for doc in kept),
+            documents=kept,
+            tokens_used=used,
+            tokens_dropped=dropped,
+        )
+
+    @staticmethod
+    def _trim(doc: Document) -> Document:
+        """
+        Drop the partial sentence a passage starts with, recognized by
+        its lowercase first letter, and the one it ends with, a line
+        cut after a lowercase letter or a comma, keeping at least one
+        sentence.
+        """
+        text = doc.page_content
+        begin = 0
+        if doc.metadata["start_index"] > 0 and text[:1].islower():
+            first = _SENTENCE_END.search(text)
+            if first is not None and first.end() < len(text):
+                begin = first.end()
+                while text[begin].isspace():
+                    begin += 1
+        end = len(text)
+        last = None
+        for last in _SENTENCE_END.finditer(text, begin):
+            pass
+        if last is not None:
+            tail = text[last.end():].rstrip()
+            if tail and "\n" not in tail.strip() and (
+                tail[-1].islower() or tail[-1] == ","
+            ):
+                end = last.end()
+        if begin == 0 and end == len(text):
+            return doc
+        return Document(
+            page_content=text[begin:end],
+            metadata={
+                **doc.metadata,
+                "start_index": doc.metadata["start_index"] + begin,
+            },
+            id=doc.id,
+        )
+
+    @staticmethod
+    def _join(run: list[tuple[int, Document]]) -> tuple[int, Document]:
+        """
+        One passage from a run of chunks sorted by `start_index`, with
+        the rank of its most relevant chunk.
+        """
+        if len(run) == 1:
+            return run[0]
+        first = run[0][1]
+        text = first.page_content
+        end = first.metadata["start_index"] + len(text)
+        for _, doc in run[1:]:
+            start = doc.metadata["start_index"]
+            if start > end:
+                text += " " + doc.page_content
+            else:
+                text += doc.page_content[end - start:]
+            end = max(end, start + len(doc.page_content))
+        rank, best = min(run, key=lambda chunk: chunk[0])
+        return rank, Document(
+            page_content=text, metadata=first.metadata, id=best.id
+        )
+
+
+class ContextCompressor:
+    """
+    Extractive compression of retrieved chunks before prompting.
+
+    The chunks are cut into sentences, which are scored by the TF-IDF
+    cosine similarity of their words to the query's. Sentences are then
+    taken best first while they fit in `token_budget`, skipping any
+    sentence too similar to one already taken, so text repeated across
+    overlapping chunks is sent once. The kept sentences stay in their
+    chunk, in their original order. Scoring and deduplication are matrix
+    operations over the words of the retrieved chunks, so compression
+    costs no model call and leaves the embedding cache untouched.
+
+    Attributes:
+        token_budget (int): Maximum approximate tokens of context.
+        duplicate_threshold (float): Cosine similarity above which a
+            sentence counts as a duplicate of a kept one.
+
+    Methods:
+        compress(query: str, documents: list[Document]) -> list[Document]:
+            Keep the sentences most relevant to a query.
+    """
+    def __init__(
+        self,
+        token_budget: int = 1024,
+        duplicate_threshold: float = 0.92,
+    ):
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+
+    def compress(
+        self,
+        query: str,
+        documents: list[Document],
+    ) -> list[Document]:
+        """
+        Keep the sentences most relevant to a query.
+
+        Args:
+            query (str): The user's question.
+            documents (list[Document]): The retrieved chunks.
+
+        Returns:
+            list[Document]: The chunks that kept at least one sentence,
+                in their original order, with their ID and metadata.
+        """
+        if sum(
+            approximate_tokens(doc.page_content) for doc in documents
+        ) <= self.token_budget:
+            return documents
+        sentences = [
+            (index, sentence)
+            for index, doc in enumerate(documents)
+            for sentence in split_sentences(doc.page_content)
+        ]
+        matrix, query_vector = self._vectorize(
+            [text for _, text in sentences], query
+        )
+        scores = matrix @ query_vector
+        similarities = matrix @ matrix.T
+        tokens = np.fromiter(
+            (approximate_tokens(text) for _, text in sentences),
+            dtype=np.int64,
+            count=len(sentences),
+        )
+
+        # highest similarity of each sentence to any kept one
+        closest = np.full(len(sentences), -np.inf, dtype=np.float32)
+        keep = np.zeros(len(sentences), dtype=bool)
+        budget = self.token_budget
+        # ties, e.g. sentences sharing no word with the query, keep
+        # their order of relevance
+        for index in np.argsort(-scores, kind="stable"):
+            if tokens[index] > budget:
+                continue
+            if closest[index] >= self.duplicate_threshold:
+                continue
+            keep[index] = True
+            budget -= tokens[index]
+            np.maximum(closest, similarities[index], out=closest)
+
+        kept: dict[int, list[str]] = {}
+        for (document, text), selected in zip(sentences, keep):
+            if selected:
+                kept.setdefault(document, []).append(text)
+        return [
+            Document(
+                page_content=" ".join(kept[index]),
+                metadata=documents[index].metadata,
+                id=documents[index].id,
+            )
+            for index in sorted(kept)
+        ]
+
+    @staticmethod
+    def _vectorize(
+        sentences: list[str],
+        query: str,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Normalized TF-IDF vectors of the sentences and of the query,
+        over the words of the sentences.
+        """
+        vocabulary: dict[str, int] = {}
+        rows: list[int] = []
+        columns: list[int] = []
+        for row, sentence in enumerate(sentences):
+            for token in tokenize(sentence):
+                rows.append(row)
+                columns.append(vocabulary.setdefault(token, len(vocabulary)))
+        counts = np.zeros((len(sentences), len(vocabulary)), np.float32)
+        np.add.at(counts, (rows, columns), 1.0)
+        frequency = np.count_nonzero(counts, axis=0)
+        idf = np.log1p(len(sentences) / np.maximum(frequency, 1))
+        matrix = np.log1p(counts) * idf
+
+        query_vector = np.zeros(len(vocabulary), np.float32)
+        for token in tokenize(query):
+            column = vocabulary.get(token)
+            if column is not None:
+                query_vector[column] += 1.0
+        query_vector = np.log1p(query_vector) * idf
+        return (
+            ContextCompressor._normalize(matrix),
+            ContextCompressor._normalize(query_vector[None])[0],
+        )
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+__all__ = [
+    "ContextAssembler",
+    "ContextCompressor",
+    "approximate_tokens",
+    "split_sentences",
+    "tokenize",
+]
@@ -0,0 +1,248 @@
+import re
+
+from src.schemas import FactSchema
+from src.utils.context import split_sentences
+
+
+_STOPWORDS = frozenset(
+    """
+    a an and are as at be by for from has have in into is it its of on or
+    our that the their this to was were what which who will with how much
+    many when where does did do total than
+    o os as um uma uns umas e é de do da dos das em no na nos nas por para
+    com que qual quais quanto quantos quantas quando foi foram ser são seu
+    sua seus suas ao aos pelo pela
+    """.split()
+)
+_MONTHS = (
+    r"january|february|march|april|may|june|july|august|september|october"
+    r"|november|december|janeiro|fevereiro|março|abril|maio|junho|julho"
+    r"|agosto|setembro|outubro|novembro|dezembro"
+)
+_MULTIPLIERS = {
+    "thousand": 1e3, "mil": 1e3, "k": 1e3,
+    "million": 1e6, "milhão": 1e6, "milhões": 1e6, "mi": 1e6,
+    "billion": 1e9, "bilhão": 1e9, "bilhões": 1e9, "bi": 1e9, "bn": 1e9,
+    "trillion": 1e12, "trilhão": 1e12, "trilhões": 1e12,
+}
+_DIGITS = r"\d+(?:[.,]\d+)*"
+_CURRENCY = r"(?:R\$|US\$|[$€£])"
+_UNIT = (
+    r"(?:\s?%|\s?(?:percent|por cento|thousand|million|billion|trillion"
+    r"|mil|milhão|milhões|bilhão|bilhões|trilhão|trilhões|bn)\b)"
+)
+_NUMBER = _CURRENCY + r"?\s?" + _DIGITS + _UNIT + "?"
+# a currency or a unit, so that "page 4" or "at 3 locations" is not one
+_AMOUNT = (
+    r"(?:" + _CURRENCY + r"\s?" + _DIGITS + _UNIT + "?|"
+    + _DIGITS + _UNIT + ")"
+)
+_NUMBER_PATTERN = re.compile(_NUMBER, re.IGNORECASE)
+# verbs that state a metric take any number, copulas and prepositions
+# only an amount
+_METRIC_PATTERN = re.compile(
+    r"\b(?:(?:reached|totaled|totalled|amounted to|rose to|grew to"
+    r"|fell to|increased to|decreased to|atingiu|totalizou|somou"
+    r"|chegou a)\s+(?P<value>" + _NUMBER + r")"
+    r"|(?:was|were|is|are|of|at|foi|foram|é|são|de)\s+(?P<amount>"
+    + _AMOUNT + r"))",
+    re.IGNORECASE,
+)
+_KEY_VALUE_PATTERN = re.compile(
+    r"^\s*(?P<key>[^\W\d][\w ()/-]{1,40}?)\s*[:=]\s*(?P<value>\S.{0,99}?)"
+    r"\s*$",
+    re.MULTILINE,
+)
+_YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b")
+_DATE_PATTERN = re.compile(
+    r"\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b"
+    r"|\b(?:\d{1,2}\s+(?:de\s+)?)?(?:" + _MONTHS + r")"
+    r"(?:\s+\d{1,2},?)?(?:\s+(?:de\s+)?\d{4})?\b",
+    re.IGNORECASE,
+)
+_ENTITY_PATTERN = re.compile(
+    r"\b[A-Z][\w&'-]+(?:\s+(?:of\s+|de\s+|da\s+|do\s+)?[A-Z][\w&'-]+)*"
+)
+_WORD_PATTERN = re.compile(r"[^\W\d_]+")
+_NUMERIC_QUERY_PATTERN = re.compile(
+    r"\b(?:how much|how many|number of|amount|total|rate|percentage"
+    r"|percent|value|price|cost|quanto|quantos|quantas|número de"
+    r"|quantidade|montante|taxa|percentual|porcentagem|valor|preço"
+    r"|custo)\b|[%$€£]",
+    re.IGNORECASE,
+)
+_QUESTION_PATTERN = re.compile(
+    r"\b(?:what|which|qual|quais)\b", re.IGNORECASE
+)
+
+
+class FactExtractor:
+    """
+    Rule-based extraction of facts from text, without any model call.
+
+    Finds key-value metrics ("Revenue: $5.2 billion", "revenue was $5.2
+    billion in 2023"), dates, numbers with a unit or currency, and named
+    entities, in English and Portuguese.
+
+    Methods:
+        extract(text: str) -> list[FactSchema]:
+            Extract the facts of a text.
+        parse_query(query: str) -> tuple[list[str], list[int], bool]:
+            Terms and years of a query, and whether it asks for a
+            number.
+        terms(text: str) -> list[str]:
+            Normalized content words of a text.
+    """
+    @staticmethod
+    def extract(text: str) -> list[FactSchema]:
+        """
+        Extract the facts of a text.
+
+        Args:
+            text (str): The text, typically a chunk.
+
+        Returns:
+            list[FactSchema]: The facts, without `chunk_id`.
+        """
+        facts: list[FactSchema] = []
+        for sentence in split_sentences(text):
+            for match in _KEY_VALUE_PATTERN.finditer(sentence):
+                key = " ".join(FactExtractor.terms(match["key"])[-3:])
+                if key:
+                    facts.append(
+                        FactExtractor._metric(key, match["value"], sentence)
+                    )
+
+            start = 0
+            for match in _METRIC_PATTERN.finditer(sentence):
+                key_text = re.split(r"[,;(]", sentence[start:match.start()])
+                key = " ".join(FactExtractor.terms(key_text[-1])[-3:])
+                start = match.end()
+                if key:
+                    facts.append(
+                        FactExtractor._metric(
+                            key, match["value"] or match["amount"], sentence
+                        )
+                    )
+
+            year = FactExtractor._year(sentence)
+            for match in _DATE_PATTERN.finditer(sentence):
+                facts.append(
+                    FactSchema(
+                        kind="date",
+                        value=match[0],
+                        year=FactExtractor._year(match[0]) or year,
+                        sentence=sentence,
+                    )
+                )
+            for match in _NUMBER_PATTERN.finditer(sentence):
+                value = match[0].strip()
+                # bare integers are mostly page numbers, years and counts
+                if value.isdigit():
+                    continue
+                facts.append(
+                    FactSchema(
+                        kind="number",
+                        value=value,
+                        number=FactExtractor._number(value),
+                        year=year,
+                        sentence=sentence,
+                    )
+                )
+            for match in _ENTITY_PATTERN.finditer(sentence):
+                value = match[0]
+                if " " not in value and (
+                    match.start() == 0 or value.lower() in _STOPWORDS
+                ):
+                    continue
+                if re.fullmatch(_MONTHS, value, re.IGNORECASE):
+                    continue
+                facts.append(
+                    FactSchema(kind="entity", value=value, sentence=sentence)
+                )
+        return facts
+
+    @staticmethod
+    def parse_query(query: str) -> tuple[list[str], list[int], bool]:
+        """
+        Terms and years of a query, and whether it asks for a number.
+
+        Args:
+            query (str): The user's question.
+
+        Returns:
+            tuple[list[str], list[int], bool]: The content words, the
+                years mentioned, and True when the query asks for an
+                amount ("how much", "total", "rate", "quanto", "%", ...)
+                or for a value in a year ("what was ... in 2023").
+        """
+        years = [int(year) for year in _YEAR_PATTERN.findall(query)]
+        factual = bool(_NUMERIC_QUERY_PATTERN.search(query)) or bool(
+            years and _QUESTION_PATTERN.search(query)
+        )
+        return FactExtractor.terms(query), years, factual
+
+    @staticmethod
+    def terms(text: str) -> list[str]:
+        """
+        Normalized content words of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            list[str]: Lowercase words longer than two letters that are
+                not stopwords, in order.
+        """
+        return [
+            word
+            for word in _WORD_PATTERN.findall(text.lower())
+            if len(word) > 2 and word not in _STOPWORDS
+        ]
+
+    @staticmethod
+    def _metric(key: str, value: str, sentence: str) -> FactSchema:
+        number = _NUMBER_PATTERN.search(value)
+        return FactSchema(
+            kind="metric",
+            key=key,
+            value=value.strip(),
+            number=FactExtractor._number(number[0]) if number else None,
+            year=FactExtractor._year(sentence),
+            sentence=sentence.strip(),
+        )
+
+    @staticmethod
+    def _year(text: str) -> int | None:
+        match = _YEAR_PATTERN.search(text)
+        return int(match[0]) if match else None
+
+    @staticmethod
+    def _number(value: str) -> float | None:
+        """
+        Numeric value of a number as written, e.g. "$5.2 billion" or
+        "R$ 1.234,5 mil".
+        """
+        match = re.search(r"\d+(?:[.,]\d+)*", value)
+        if match is None:
+            return None
+        digits = match[0]
+        if "," in digits and "." in digits:
+            decimal = max(digits.rfind(","), digits.rfind("."))
+            digits = (
+                re.sub(r"[.,]", "", digits[:decimal])
+                + "." + digits[decimal + 1:]
+            )
+        elif re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", digits):
+            digits = re.sub(r"[.,]", "", digits)
+        else:
+            digits = digits.replace(",", ".")
+        try:
+            number = float(digits)
+        except ValueError:
+            return None
+        unit = value[match.end():].strip().lower()
+        return number * _MULTIPLIERS.get(unit, 1.0)
+
+
+__all__ = ["FactExtractor"]
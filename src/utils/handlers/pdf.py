@@ -1,6 +1,15 @@
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+
 from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from src.utils.splitter import IncrementalTextSplitter
+
+# most pages a worker extracts with one opened reader
+_RANGE_PAGES = 256
 
 
 class PDFHandler:
@@ -9,6 +18,9 @@ class PDFHandler:
 
     Methods:
         load_pdf: Load a PDF file and return its documents.
+        count_pages: Count the pages of a PDF file.
+        load_pdf_pages: Load a range of pages from a PDF file.
+        lazy_load_pdf: Stream the pages of a PDF file in batches.
         split_documents: Split documents into smaller chunks.
     """
     @staticmethod
@@ -25,6 +37,147 @@ class PDFHandler:
         loader = PyPDFLoader(file_path)
         return loader.load()
 
+    @staticmethod
+    def count_pages(file_path: str) -> int:
+        """
+        Count the pages of a PDF file without extracting any text.
+
+        Args:
+            file_path (str): The path to the PDF file.
+
+        Returns:
+            int: The number of pages in the PDF.
+        """
+        return len(PdfReader(file_path).pages)
+
+    @staticmethod
+    def load_pdf_pages(
+        file_path: str,
+        start: int,
+        stop: int,
+        page_labels: list[str] | None = None
+    ) -> list[Document]:
+        """
+        Load the pages in the range [start, stop) of a PDF file.
+
+        The metadata matches the one produced by `PyPDFLoader`, so pages
+        loaded here are interchangeable with the ones from `load_pdf`.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            start (int): Index of the first page to load.
+            stop (int): Index after the last page to load.
+            page_labels (list[str] | None): The labels of every page of
+                the file. pypdf recomputes them on each access, so callers
+                loading several ranges should compute them once and pass
+                them in.
+
+        Returns:
+            list[Document]: One Document per page in the range.
+        """
+        reader = PdfReader(file_path)
+        if page_labels is None:
+            page_labels = reader.page_labels
+        return PDFHandler._extract_pages(
+            reader, file_path, start, stop, page_labels
+        )
+
+    @staticmethod
+    def lazy_load_pdf(
+        file_path: str,
+        batch_size: int = 16,
+        workers: int = 4
+    ) -> Iterator[list[Document]]:
+        """
+        Stream the pages of a PDF file in batches, in page order.
+
+        Opening a reader parses the whole page tree, so each worker gets
+        a large contiguous range of pages and opens the file once for
+        it; the page labels are computed once per file. At most
+        `2 * workers` ranges are in flight at once, so a slow consumer
+        holds back extraction instead of letting pages pile up in memory.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            batch_size (int): Number of pages per batch.
+            workers (int): Number of extraction processes. With 1 or less
+                the pages are extracted in the calling process.
+
+        Yields:
+            list[Document]: The next batch of pages.
+        """
+        reader = PdfReader(file_path)
+        total_pages = len(reader.pages)
+        page_labels = reader.page_labels
+
+        if workers <= 1 or total_pages <= batch_size:
+            for start in range(0, total_pages, batch_size):
+                yield PDFHandler._extract_pages(
+                    reader, file_path, start, start + batch_size, page_labels
+                )
+            return
+
+        # whole batches per range, so every yielded batch stays full
+        span = min(_RANGE_PAGES, -(-total_pages // workers))
+        span = max(1, -(-span // batch_size)) * batch_size
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending: deque[Future[list[Document]]] = deque()
+            for start in range(0, total_pages, span):
+                if len(pending) >= 2 * workers:
+                    yield from PDFHandler._batched(
+                        pending.popleft().result(), batch_size
+                    )
+                pending.append(
+                    executor.submit(
+                        PDFHandler.load_pdf_pages,
+                        file_path,
+                        start,
+                        start + span,
+                        page_labels,
+                    )
+                )
+            while pending:
+                yield from PDFHandler._batched(
+                    pending.popleft().result(), batch_size
+                )
+
+    @staticmethod
+    def _extract_pages(
+        reader: PdfReader,
+        file_path: str,
+        start: int,
+        stop: int,
+        page_labels: list[str]
+    ) -> list[Document]:
+        """
+        Extract the pages in the range [start, stop) from an open reader.
+        """
+        pages = reader.pages
+        total_pages = len(pages)
+        return [
+            Document(
+                page_content=pages[page_number].extract_text(),
+                metadata={
+                    "source": file_path,
+                    "total_pages": total_pages,
+                    "page": page_number,
+                    "page_label": page_labels[page_number],
+                },
+            )
+            for page_number in range(start, min(stop, total_pages))
+        ]
+
+    @staticmethod
+    def _batched(
+        documents: list[Document],
+        batch_size: int
+    ) -> Iterator[list[Document]]:
+        """
+        Split the pages of one extracted range into batches.
+        """
+        for start in range(0, len(documents), batch_size):
+            yield documents[start:start + batch_size]
+
     @staticmethod
     def split_documents(
         documents: list[Document],
@@ -34,6 +187,9 @@ class PDFHandler:
         """
         Split documents into smaller chunks.
 
+        Every chunk keeps the metadata of its page and records its offset
+        in the page text as `start_index`.
+
         Args:
             documents (list[Document]): The list of Document objects to split.
             chunk_size (int): The size of each chunk.
@@ -42,10 +198,9 @@ class PDFHandler:
         Returns:
             list[Document]: A list of split Document objects.
         """
-        text_splitter = RecursiveCharacterTextSplitter(
+        text_splitter = IncrementalTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            add_start_index=True
         )
         return text_splitter.split_documents(documents)
 
@@ -1,9 +1,58 @@
-from typing import Any
+from __future__ import annotations
+
+import asyncio
+import logging
+from functools import cache
+from typing import TYPE_CHECKING, Any
 from typing_extensions import Literal
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
 from langchain_core.documents import Document
 from langchain_core.vectorstores import VectorStoreRetriever
-from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
+
+from src.utils.mmr import maximal_marginal_relevance
+
+
+# only annotations use the clients, so their libraries are not imported
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+    from langchain_ollama import OllamaEmbeddings
+
+
+logger = logging.getLogger(__name__)
+
+
+def _chroma_collection(vector_store: Any) -> Any | None:
+    """
+    The chromadb collection behind a langchain Chroma store, for the
+    batched upsert of precomputed embeddings and the batched query that
+    the public API of the store lacks. It is reached through the private
+    `_collection` attribute, so it is only used when the store has one
+    with the methods needed.
+
+    Returns:
+        Any | None: The collection, None for other stores, whose callers
+            fall back to the public API.
+    """
+    collection = getattr(vector_store, "_collection", None)
+    if not all(
+        callable(getattr(collection, method, None))
+        for method in ("upsert", "query")
+    ):
+        return None
+    return collection
+
+
+@cache
+def _warn_reembedding(store_type: type) -> None:
+    logger.warning(
+        "Vector store cannot take precomputed embeddings, "
+        "its add_texts embeds every chunk again",
+        extra={"store": store_type.__name__},
+    )
 
 
 class VectorHandler:
@@ -25,6 +74,43 @@ class VectorHandler:
         """
         return embeddings.embed_query(text)
 
+    @staticmethod
+    async def amap_text_to_vector(
+        text: str,
+        embeddings: OllamaEmbeddings
+    ) -> list[float]:
+        """
+        Asynchronously generate an embedding vector for a given text.
+
+        Args:
+            text (str): The text to embed.
+            embeddings (OllamaEmbeddings): The OllamaEmbeddings instance
+                to use.
+        Returns:
+            list[float]: The embedding vector for the text.
+        """
+        return await embeddings.aembed_query(text)
+
+    @staticmethod
+    def map_texts_to_vectors(
+        texts: list[str],
+        embeddings: OllamaEmbeddings
+    ) -> list[list[float]]:
+        """
+        Generate embedding vectors for many texts in one batched call.
+
+        Queries are embedded like documents, which is what
+        `OllamaEmbeddings.embed_query` does for a single text.
+
+        Args:
+            texts (list[str]): The texts to embed.
+            embeddings (OllamaEmbeddings): The OllamaEmbeddings instance
+                to use.
+        Returns:
+            list[list[float]]: One embedding vector per text.
+        """
+        return embeddings.embed_documents(texts)
+
     @staticmethod
     def map_document_to_vector(
         document: Document,
@@ -42,6 +128,25 @@ class VectorHandler:
         """
         return embeddings.embed_query(document.page_content)
 
+    @staticmethod
+    def map_documents_to_vectors(
+        documents: list[Document],
+        embeddings: OllamaEmbeddings
+    ) -> list[list[float]]:
+        """
+        Generate embedding vectors for many documents in batched calls.
+
+        Args:
+            documents (list[Document]): The Document objects to embed.
+            embeddings (OllamaEmbeddings): The OllamaEmbeddings instance
+                to use.
+        Returns:
+            list[list[float]]: One embedding vector per document.
+        """
+        return embeddings.embed_documents(
+            [document.page_content for document in documents]
+        )
+
     @staticmethod
     def create_vector_store(
         embedding_function: OllamaEmbeddings,
@@ -60,6 +165,8 @@ class VectorHandler:
         Returns:
             Chroma: The created Chroma vector store.
         """
+        from langchain_chroma import Chroma
+
         return Chroma(
             collection_name=collection_name,
             embedding_function=embedding_function,
@@ -82,6 +189,68 @@ class VectorHandler:
         """
         vector_store.add_documents(documents=documents, ids=ids)
 
+    @staticmethod
+    def save_embeddings_on_vector_store(
+        vector_store: Chroma,
+        documents: list[Document],
+        embeddings: list[list[float]],
+        ids: list[str]
+    ) -> None:
+        """
+        Save documents whose embeddings were already computed.
+
+        Unlike `save_documents_on_vector_store`, the vector store does
+        not call the embedding model again, so embedding and writing can
+        run as separate stages. Stores without a way to take the
+        vectors get the texts, embedded again by their embedding model.
+
+        Args:
+            vector_store (Chroma): The Chroma vector store.
+            documents (list[Document]): List of Document objects to save.
+            embeddings (list[list[float]]): One embedding per document.
+            ids (list[str]): List of IDs corresponding to the documents.
+        """
+        if hasattr(vector_store, "add_embeddings"):
+            vector_store.add_embeddings(
+                text_embeddings=[
+                    (doc.page_content, vector)
+                    for doc, vector in zip(documents, embeddings)
+                ],
+                metadatas=[doc.metadata for doc in documents],
+                ids=ids,
+            )
+            return
+
+        collection = _chroma_collection(vector_store)
+        if collection is None:
+            _warn_reembedding(type(vector_store))
+            vector_store.add_texts(
+                texts=[doc.page_content for doc in documents],
+                metadatas=[doc.metadata for doc in documents],
+                ids=ids,
+            )
+            return
+        # Chroma rejects empty metadata dicts, but accepts None.
+        collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            metadatas=[doc.metadata or None for doc in documents],
+            documents=[doc.page_content for doc in documents],
+        )
+
+    @staticmethod
+    def persist_vector_store(vector_store: Chroma) -> None:
+        """
+        Save a vector store kept in memory (NumPy, FAISS, compressed) to
+        its directory. Chroma writes every change itself.
+
+        Args:
+            vector_store (Chroma): The vector store.
+        """
+        persist = getattr(vector_store, "persist", None)
+        if callable(persist):
+            persist()
+
     @staticmethod
     def update_document_on_vector_store(
         vector_store: Chroma,
@@ -115,6 +284,25 @@ class VectorHandler:
         """
         vector_store.delete(ids=ids)
 
+    @staticmethod
+    def get_documents_by_ids(
+        vector_store: Chroma,
+        ids: list[str]
+    ) -> list[Document]:
+        """
+        Get documents from the vector store by their IDs.
+
+        Args:
+            vector_store (Chroma): The Chroma vector store.
+            ids (list[str]): List of IDs of the documents to get.
+
+        Returns:
+            list[Document]: The documents found, with their `id` set.
+        """
+        if not ids:
+            return []
+        return vector_store.get_by_ids(ids)
+
     @staticmethod
     def find_documents_by_similarity(
         vector_store: Chroma,
@@ -136,6 +324,99 @@ class VectorHandler:
         """
         return vector_store.similarity_search(query, k=k, filter=filter)
 
+    @staticmethod
+    def find_documents_by_similarity_batch(
+        vector_store: Chroma,
+        queries: list[str],
+        k: int = 4
+    ) -> list[list[Document]]:
+        """
+        Find documents similar to many queries at once.
+
+        The queries are embedded in one batched call and searched in one
+        call to the vector store.
+
+        Args:
+            vector_store (Chroma): The Chroma vector store.
+            queries (list[str]): The query strings.
+            k (int): Number of similar documents to retrieve per query.
+
+        Returns:
+            list[list[Document]]: The similar documents of each query, in
+                the order of `queries`.
+        """
+        if not queries:
+            return []
+        return VectorHandler.find_documents_by_vectors(
+            vector_store,
+            VectorHandler.map_texts_to_vectors(
+                queries, vector_store.embeddings
+            ),
+            k=k
+        )
+
+    @staticmethod
+    def find_documents_by_vectors(
+        vector_store: Chroma,
+        embeddings: list[list[float]],
+        k: int = 4
+    ) -> list[list[Document]]:
+        """
+        Find documents similar to many embedding vectors in one search.
+
+        In-memory stores search all vectors with one matrix product;
+        Chroma answers all of them in one query, and other stores are
+        searched once per vector. A chunk retrieved by several queries
+        is returned as the same `Document` object.
+
+        Args:
+            vector_store (Chroma): The Chroma vector store.
+            embeddings (list[list[float]]): The embedding vectors.
+            k (int): Number of similar documents to retrieve per vector.
+
+        Returns:
+            list[list[Document]]: The similar documents of each vector,
+                in the order of `embeddings`.
+        """
+        if not embeddings:
+            return []
+        collection = _chroma_collection(vector_store)
+        if hasattr(vector_store, "similarity_search_by_vectors"):
+            results = vector_store.similarity_search_by_vectors(
+                embeddings, k=k
+            )
+        elif collection is None:
+            results = [
+                vector_store.similarity_search_by_vector(embedding, k=k)
+                for embedding in embeddings
+            ]
+        else:
+            response = collection.query(
+                query_embeddings=embeddings,
+                n_results=k,
+                include=["documents", "metadatas"],
+            )
+            results = [
+                [
+                    Document(
+                        page_content=text or "",
+                        metadata=metadata or {},
+                        id=id,
+                    )
+                    for id, text, metadata in zip(*hits)
+                ]
+                for hits in zip(
+                    response["ids"],
+                    response["documents"],
+                    response["metadatas"],
+                )
+            ]
+        shared: dict[str, Document] = {}
+        return [
+            [shared.setdefault(doc.id, doc) for doc in documents]
+            for documents in results
+        ]
+
     @staticmethod
     def find_documents_by_vector(
         vector_store: Chroma,
@@ -161,6 +442,332 @@ class VectorHandler:
             filter=filter
         )
 
+    @staticmethod
+    async def afind_documents_by_vector(
+        vector_store: Chroma,
+        embedding: list[float],
+        k: int = 4,
+        filter: dict[str, str] | None = None
+    ) -> list[Document]:
+        """
+        Asynchronously find documents similar to the given embedding vector.
+
+        Args:
+            vector_store (Chroma): The Chroma vector store.
+            embedding (list[float]): The embedding vector to search with.
+            k (int): Number of similar documents to retrieve.
+            filter (dict[str, str] | None): Optional filter for the search.
+
+        Returns:
+            list[Document]: List of similar Document objects.
+        """
+        return await vector_store.asimilarity_search_by_vector(
+            embedding=embedding,
+            k=k,
+            filter=filter
+        )
+
+    @staticmethod
+    def find_documents_by_mmr(
+        vector_store: Chroma,
+        embedding: list[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None
+    ) -> list[Document]:
+        """
+        Find documents similar to the embedding but diverse among
+        themselves, with maximal marginal relevance, as
+        `find_documents_by_mmr_batch`.
+
+        Args:
+            vector_store (Chroma): The vector store.
+            embedding (list[float]): The embedding vector to search with.
+            k (int): Number of documents to retrieve.
+            fetch_k (int): Number of candidates to select from.
+            lambda_mult (float): 1 for pure relevance, 0 for pure
+                diversity.
+            filter (dict[str, Any] | None): Optional metadata equality
+                filter.
+
+        Returns:
+            list[Document]: The selected documents, in selection order.
+        """
+        return VectorHandler.find_documents_by_mmr_batch(
+            vector_store, [embedding], k, fetch_k, lambda_mult, filter
+        )[0]
+
+    @staticmethod
+    def find_documents_by_mmr_batch(
+        vector_store: Chroma,
+        embeddings: list[list[float]],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: dict[str, Any] | None = None
+    ) -> list[list[Document]]:
+        """
+        Find documents similar to each embedding but diverse among
+        themselves, with maximal marginal relevance, selected by
+        `maximal_marginal_relevance` for every backend.
+
+        The in-memory stores search and select all queries natively.
+        Chroma returns the `fetch_k` candidates of every query with their
+        stored vectors in one query. For other stores the candidates are
+        found by similarity and their vectors come from the embedding
+        model, which the embedding cache answers for every ingested
+        chunk.
+
+        Args:
+            vector_store (Chroma): The vector store.
+            embeddings (list[list[float]]): The embedding vectors.
+            k (int): Number of documents to retrieve per vector.
+            fetch_k (int): Number of candidates to select from.
+            lambda_mult (float): 1 for pure relevance, 0 for pure
+                diversity.
+            filter (dict[str, Any] | None): Optional metadata equality
+                filter applied to all vectors.
+
+        Returns:
+            list[list[Document]]: The selected documents of each vector,
+                in selection order.
+        """
+        if not embeddings:
+            return []
+        if hasattr(vector_store, "max_marginal_relevance_search_by_vectors"):
+            return vector_store.max_marginal_relevance_search_by_vectors(
+                embeddings,
+                k=k,
+                fetch_k=fetch_k,
+                lambda_mult=lambda_mult,
+                filter=filter,
+            )
+
+        fetch_k = max(k, fetch_k)
+        collection = _chroma_collection(vector_store)
+        if collection is not None:
+            where = None
+            if filter and len(filter) > 1:
+                where = {
+                    "$and": [{key: value} for key, value in filter.items()]
+                }
+            elif filter:
+                where = dict(filter)
+            response = collection.query(
+                query_embeddings=embeddings,
+                n_results=fetch_k,
+                where=where,
+                include=["documents", "metadatas", "embeddings"],
+            )
+            candidates = [
+                [
+                    Document(
+                        page_content=text or "",
+                        metadata=metadata or {},
+                        id=id,
+                    )
+                    for id, text, metadata in zip(ids, texts, metadatas)
+                ]
+                for ids, texts, metadatas in zip(
+                    response["ids"],
+                    response["documents"],
+                    response["metadatas"],
+                )
+            ]
+            vectors = [
+                np.asarray(rows, dtype=np.float32).reshape(
+                    len(documents), -1
+                )
+                for rows, documents in zip(
+                    response["embeddings"], candidates
+                )
+            ]
+        else:
+            candidates = [
+                vector_store.similarity_search_by_vector(
+                    embedding=embedding, k=fetch_k, filter=filter
+                )
+                for embedding in embeddings
+            ]
+            texts = list(dict.fromkeys(
+                doc.page_content for documents in candidates
+                for doc in documents
+            ))
+            embedded = dict(zip(
+                texts, vector_store.embeddings.embed_documents(texts)
+            ))
+            vectors = [
+                np.asarray(
+                    [embedded[doc.page_content] for doc in documents],
+                    dtype=np.float32,
+                ).reshape(len(documents), -1)
+                for documents in candidates
+            ]
+
+        results = []
+        for embedding, documents, matrix in zip(
+            embeddings, candidates, vectors
+        ):
+            if not documents:
+                results.append([])
+                continue
+            selected = maximal_marginal_relevance(
+                np.asarray(embedding, dtype=np.float32),
+                matrix,
+                k,
+                lambda_mult,
+            )
+            results.append([documents[index] for index in selected])
+        return results
+
+    @staticmethod
+    def fuse_rankings(
+        rankings: list[list[str]],
+        k: int = 4,
+        rrf_k: int = 60
+    ) -> list[str]:
+        """
+        Fuse rankings of IDs with reciprocal rank fusion.
+
+        Each ID scores the sum of `1 / (rrf_k + rank)` over the rankings
+        it appears in, so it only depends on ranks and rankings with
+        incomparable scores, such as BM25 and cosine, can be combined.
+
+        Args:
+            rankings (list[list[str]]): The rankings, best first.
+            k (int): Number of IDs to return.
+            rrf_k (int): Constant damping the weight of the top ranks.
+
+        Returns:
+            list[str]: The `k` IDs with the highest fused score. Ties
+                keep the order of the first ranking.
+        """
+        scores: dict[str, float] = {}
+        for ranking in rankings:
+            for rank, id in enumerate(ranking, start=1):
+                scores[id] = scores.get(id, 0.0) + 1.0 / (rrf_k + rank)
+        return sorted(scores, key=scores.__getitem__, reverse=True)[:k]
+
+    @staticmethod
+    def find_documents_by_hybrid(
+        vector_store: Chroma,
+        embedding: list[float],
+        lexical_ids: list[str],
+        k: int = 4,
+        candidates: int = 20,
+        rrf_k: int = 60
+    ) -> list[Document]:
+        """
+        Find documents by fusing a vector search with a lexical ranking.
+
+        Args:
+            vector_store (Chroma): The Chroma vector store.
+            embedding (list[float]): The embedding vector to search with.
+            lexical_ids (list[str]): IDs ranked by a lexical index, best
+                first.
+            k (int): Number of documents to retrieve.
+            candidates (int): Number of documents taken from the vector
+                search before fusion.
+            rrf_k (int): Reciprocal rank fusion constant.
+
+        Returns:
+            list[Document]: The fused top `k` documents, best first.
+        """
+        return VectorHandler.find_documents_by_hybrid_batch(
+            vector_store, [embedding], [lexical_ids], k, candidates, rrf_k
+        )[0]
+
+    @staticmethod
+    def find_documents_by_hybrid_batch(
+        vector_store: Chroma,
+        embeddings: list[list[float]],
+        lexical_ids: list[list[str]],
+        k: int = 4,
+        candidates: int = 20,
+        rrf_k: int = 60
+    ) -> list[list[Document]]:
+        """
+        Find documents for many queries by fusing one batched vector
+        search with a lexical ranking per query. The chunks only found
+        by the lexical rankings are fetched in one call.
+
+        Args:
+            vector_store (Chroma): The Chroma vector store.
+            embeddings (list[list[float]]): The embedding vectors.
+            lexical_ids (list[list[str]]): IDs ranked by a lexical index
+                for each query, best first.
+            k (int): Number of documents to retrieve per query.
+            candidates (int): Number of documents taken from the vector
+                search before fusion.
+            rrf_k (int): Reciprocal rank fusion constant.
+
+        Returns:
+            list[list[Document]]: The fused top `k` documents of each
+                query, best first.
+        """
+        dense = VectorHandler.find_documents_by_vectors(
+            vector_store, embeddings, k=candidates
+        )
+        rankings = [
+            VectorHandler.fuse_rankings(
+                [[doc.id for doc in documents], ids], k, rrf_k
+            )
+            for documents, ids in zip(dense, lexical_ids)
+        ]
+        found = {doc.id: doc for documents in dense for doc in documents}
+        missing = list(dict.fromkeys(
+            id for ranking in rankings for id in ranking if id not in found
+        ))
+        for document in VectorHandler.get_documents_by_ids(
+            vector_store, missing
+        ):
+            found[document.id] = document
+        return [
+            [found[id] for id in ranking if id in found]
+            for ranking in rankings
+        ]
+
+    @staticmethod
+    async def afind_documents_by_hybrid(
+        vector_store: Chroma,
+        embedding: list[float],
+        lexical_ids: list[str],
+        k: int = 4,
+        candidates: int = 20,
+        rrf_k: int = 60
+    ) -> list[Document]:
+        """
+        Asynchronously find documents by fusing a vector search with a
+        lexical ranking.
+
+        Args:
+            vector_store (Chroma): The Chroma vector store.
+            embedding (list[float]): The embedding vector to search with.
+            lexical_ids (list[str]): IDs ranked by a lexical index, best
+                first.
+            k (int): Number of documents to retrieve.
+            candidates (int): Number of documents taken from the vector
+                search before fusion.
+            rrf_k (int): Reciprocal rank fusion constant.
+
+        Returns:
+            list[Document]: The fused top `k` documents, best first.
+        """
+        dense = await vector_store.asimilarity_search_by_vector(
+            embedding=embedding,
+            k=candidates
+        )
+        ids = VectorHandler.fuse_rankings(
+            [[doc.id for doc in dense], lexical_ids], k, rrf_k
+        )
+        documents = {doc.id: doc for doc in dense}
+        missing = [id for id in ids if id not in documents]
+        if missing:
+            for document in await vector_store.aget_by_ids(missing):
+                documents[document.id] = document
+        return [documents[id] for id in ids if id in documents]
+
     @staticmethod
     def find_by_query_on_retriever(
         retriever: VectorStoreRetriever,
@@ -186,7 +793,8 @@ class VectorHandler:
         search_kwargs: dict[str, Any] = {"k": 1}
     ) -> VectorStoreRetriever:
         """
-        Map the vector store to a retriever.
+        Map the vector store to a retriever. MMR retrievers select with
+        `find_documents_by_mmr`, whatever the backend.
 
         Args:
             vector_store (Chroma): The Chroma vector store.
@@ -196,10 +804,50 @@ class VectorHandler:
         Returns:
             Retriever: The retriever object.
         """
+        if search_type == "mmr":
+            return _MMRRetriever(
+                vectorstore=vector_store,
+                search_type=search_type,
+                search_kwargs=search_kwargs,
+            )
         return vector_store.as_retriever(
             search_type=search_type,
             search_kwargs=search_kwargs
         )
 
 
+class _MMRRetriever(VectorStoreRetriever):
+    """
+    Retriever whose MMR search goes through `VectorHandler`, so every
+    backend selects with the same batched implementation.
+    """
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        **kwargs: Any
+    ) -> list[Document]:
+        return VectorHandler.find_documents_by_mmr(
+            self.vectorstore,
+            self.vectorstore.embeddings.embed_query(query),
+            **{**self.search_kwargs, **kwargs},
+        )
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+        **kwargs: Any
+    ) -> list[Document]:
+        embedding = await self.vectorstore.embeddings.aembed_query(query)
+        return await asyncio.to_thread(
+            VectorHandler.find_documents_by_mmr,
+            self.vectorstore,
+            embedding,
+            **{**self.search_kwargs, **kwargs},
+        )
+
+
 __all__ = ["VectorHandler"]
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+def maximal_marginal_relevance(
+    queries: np.ndarray,
+    candidates: np.ndarray,
+    k: int = 4,
+    lambda_mult: float = 0.5,
+) -> np.ndarray:
+    """
+    Maximal marginal relevance selection for a batch of queries.
+
+    Each step takes the candidate maximizing `lambda_mult` times its
+    similarity to the query minus `1 - lambda_mult` times its highest
+    similarity to the candidates already taken. That highest similarity
+    is kept in a vector updated with the similarities to the last
+    candidate taken, so a step costs one O(n·d) product per query
+    instead of comparing every candidate with every selected one, and
+    all queries of the batch advance together.
+
+    Args:
+        queries (np.ndarray): The query vectors, shape (b, d), or (d,)
+            for a single query.
+        candidates (np.ndarray): The candidate vectors of each query,
+            shape (b, n, d), or (n, d) for a single query.
+        k (int): Number of candidates to select.
+        lambda_mult (float): 1 for pure relevance, 0 for pure diversity.
+
+    Returns:
+        np.ndarray: The indices of the selected candidates in selection
+            order, shape (b, min(k, n)), or (min(k, n),) for a single
+            query.
+    """
+    single = np.ndim(queries) == 1
+    queries = _normalize(np.atleast_2d(np.asarray(queries, np.float32)))
+    candidates = np.asarray(candidates, dtype=np.float32)
+    if candidates.ndim == 2:
+        candidates = candidates[np.newaxis]
+    candidates = _normalize(candidates)
+    batch, size, _ = candidates.shape
+    k = min(k, size)
+    selected = np.zeros((batch, k), dtype=np.int64)
+    if k == 0:
+        return selected[0] if single else selected
+
+    rows = np.arange(batch)
+    relevance = np.einsum("bnd,bd->bn", candidates, queries)
+    available = np.ones((batch, size), dtype=bool)
+    closest = np.empty((batch, size), dtype=np.float32)
+    for step in range(k):
+        if step == 0:
+            scores = relevance.copy()
+        else:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * closest
+        scores[~available] = -np.inf
+        best = scores.argmax(axis=1)
+        selected[:, step] = best
+        available[rows, best] = False
+        similarity = np.einsum(
+            "bnd,bd->bn", candidates, candidates[rows, best]
+        )
+        if step == 0:
+            closest[:] = similarity
+        else:
+            np.maximum(closest, similarity, out=closest)
+    return selected[0] if single else selected
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+__all__ = ["maximal_marginal_relevance"]
@@ -0,0 +1,148 @@
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.utils.context import tokenize
+
+
+class Reranker:
+    """
+    Cheap local reranker for the second stage of retrieval.
+
+    The first stage oversamples candidates from the vector store; the
+    reranker scores each candidate against the query and keeps the best
+    few. The default score mixes the exact cosine similarity of the
+    chunk vectors, which the embedding cache already holds for every
+    ingested chunk, with the share of query terms found in the chunk.
+    Other scorers plug in by overriding `score`.
+
+    Attributes:
+        embeddings (Embeddings): Model whose cached vectors of the
+            chunks are compared with the query embedding.
+        lexical_weight (float): Weight of the term overlap, between 0
+            and 1; the cosine similarity gets the rest.
+
+    Methods:
+        score(query, embedding, documents, vectors) -> np.ndarray:
+            Relevance of each candidate to the query.
+        rerank(query, embedding, documents, k, vectors) -> list[Document]:
+            Keep the `k` best candidates.
+        arerank(query, embedding, documents, k) -> list[Document]:
+            Asynchronously keep the `k` best candidates.
+    """
+    def __init__(self, embeddings: Embeddings, lexical_weight: float = 0.3):
+        self.embeddings = embeddings
+        self.lexical_weight = lexical_weight
+
+    def score(
+        self,
+        query: str,
+        embedding: list[float],
+        documents: list[Document],
+        vectors: list[list[float]],
+    ) -> np.ndarray:
+        """
+        Relevance of each candidate to the query.
+
+        Args:
+            query (str): The query text.
+            embedding (list[float]): The query embedding.
+            documents (list[Document]): The candidates.
+            vectors (list[list[float]]): The embedding of each candidate.
+
+        Returns:
+            np.ndarray: One score per candidate, higher is better.
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        cosine = matrix @ query_vector / (
+            norms * (np.linalg.norm(query_vector) or 1.0)
+        )
+
+        terms = set(tokenize(query))
+        overlap = np.array(
+            [
+                len(terms.intersection(tokenize(doc.page_content)))
+                / (len(terms) or 1)
+                for doc in documents
+            ],
+            dtype=np.float32,
+        )
+        return (
+            (1 - self.lexical_weight) * cosine
+            + self.lexical_weight * overlap
+        )
+
+    def rerank(
+        self,
+        query: str,
+        embedding: list[float],
+        documents: list[Document],
+        k: int,
+        vectors: list[list[float]] | None = None,
+    ) -> list[Document]:
+        """
+        Keep the `k` best candidates.
+
+        Args:
+            query (str): The query text.
+            embedding (list[float]): The query embedding.
+            documents (list[Document]): The candidates.
+            k (int): Number of candidates to keep.
+            vectors (list[list[float]] | None): The embedding of each
+                candidate, when already known.
+
+        Returns:
+            list[Document]: The best candidates, best first.
+        """
+        if len(documents) <= 1:
+            return documents[:k]
+        if vectors is None:
+            vectors = self.embeddings.embed_documents(
+                [doc.page_content for doc in documents]
+            )
+        return self._top(query, embedding, documents, vectors, k)
+
+    async def arerank(
+        self,
+        query: str,
+        embedding: list[float],
+        documents: list[Document],
+        k: int,
+    ) -> list[Document]:
+        """
+        Asynchronously keep the `k` best candidates.
+
+        Args:
+            query (str): The query text.
+            embedding (list[float]): The query embedding.
+            documents (list[Document]): The candidates.
+            k (int): Number of candidates to keep.
+
+        Returns:
+            list[Document]: The best candidates, best first.
+        """
+        if len(documents) <= 1:
+            return documents[:k]
+        vectors = await self.embeddings.aembed_documents(
+            [doc.page_content for doc in documents]
+        )
+        return self._top(query, embedding, documents, vectors, k)
+
+    def _top(
+        self,
+        query: str,
+        embedding: list[float],
+        documents: list[Document],
+        vectors: list[list[float]],
+        k: int,
+    ) -> list[Document]:
+        scores = self.score(query, embedding, documents, vectors)
+        # stable, so ties keep the first stage order
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [documents[index] for index in order]
+
+
+__all__ = ["Reranker"]
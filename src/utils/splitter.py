@@ -0,0 +1,141 @@
+import re
+
+from langchain_core.documents import Document
+
+
+# Separators grouped by preference: paragraph, line, sentence and word
+# boundaries.
+_SEPARATORS = (
+    ("\n\n",),
+    ("\n",),
+    (". ", "! ", "? ", "; ", ": "),
+    (" ", "\t"),
+)
+_WHITESPACE = re.compile(r"\s")
+
+
+class IncrementalTextSplitter:
+    """
+    Character splitter that chunks a text in a single pass.
+
+    `RecursiveCharacterTextSplitter` splits on the first separator, then
+    re-splits every oversized piece on the next one and finally merges
+    the pieces back, and with `add_start_index` it searches every chunk
+    again in the original text. This splitter walks forward once and
+    only looks for separators inside the window of the current chunk,
+    cutting at the coarsest paragraph, line, sentence or word boundary
+    that keeps the chunk at least half of `chunk_size` long. Offsets are
+    known while cutting, so `start_index` comes for free.
+
+    Attributes:
+        chunk_size (int): Maximum number of characters per chunk.
+        chunk_overlap (int): Number of characters shared by consecutive
+            chunks.
+
+    Methods:
+        split_text(text: str) -> list[tuple[int, str]]:
+            Split a text into (start_index, chunk) pairs.
+        split_documents(documents: list[Document]) -> list[Document]:
+            Split documents, keeping their metadata and the start index.
+    """
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(
+                f"Chunk overlap ({chunk_overlap}) must be smaller than "
+                f"chunk size ({chunk_size})."
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_text(self, text: str) -> list[tuple[int, str]]:
+        """
+        Split a text into chunks.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            list[tuple[int, str]]: The start offset of each chunk in
+                `text` and the chunk itself, without surrounding
+                whitespace.
+        """
+        chunks = []
+        start = 0
+        length = len(text)
+        while start < length:
+            limit = start + self.chunk_size
+            if limit >= length:
+                end = length
+            else:
+                end = self._find_break(text, start, limit)
+            self._append(chunks, text, start, end)
+            if end >= length:
+                break
+
+            # start the overlapping chunk on a word boundary
+            space = _WHITESPACE.search(text, end - self.chunk_overlap, end)
+            next_start = space.end() if space else end
+            start = max(next_start, start + 1)
+        return chunks
+
+    def split_documents(self, documents: list[Document]) -> list[Document]:
+        """
+        Split documents into chunks.
+
+        Args:
+            documents (list[Document]): The documents to split.
+
+        Returns:
+            list[Document]: The chunks, each one with a copy of its
+                document's metadata plus `start_index`.
+        """
+        chunks = []
+        for document in documents:
+            for start_index, text in self.split_text(document.page_content):
+                chunks.append(
+                    Document(
+                        page_content=text,
+                        metadata={
+                            **document.metadata,
+                            "start_index": start_index
+                        },
+                    )
+                )
+        return chunks
+
+    def _find_break(self, text: str, start: int, limit: int) -> int:
+        """
+        Find where to cut the chunk that starts at `start`.
+        """
+        lower = start + self.chunk_size // 2
+        fallback = start
+        for separators in _SEPARATORS:
+            cut = start
+            for separator in separators:
+                position = text.rfind(separator, start, limit)
+                if position >= 0:
+                    cut = max(cut, position + len(separator))
+            if cut >= lower:
+                return cut
+            fallback = max(fallback, cut)
+        return fallback if fallback > start else limit
+
+    @staticmethod
+    def _append(
+        chunks: list[tuple[int, str]],
+        text: str,
+        start: int,
+        end: int
+    ) -> None:
+        """
+        Append text[start:end] without surrounding whitespace.
+        """
+        piece = text[start:end]
+        stripped = piece.lstrip()
+        start += len(piece) - len(stripped)
+        stripped = stripped.rstrip()
+        if stripped:
+            chunks.append((start, stripped))
+
+
+__all__ = ["IncrementalTextSplitter"]
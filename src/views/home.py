@@ -1,9 +1,36 @@
+import logging
 import os
+import time
 
-from src.controllers import ChatController
+from src.core import Lazy, settings
 
 
-controller = ChatController()
+logger = logging.getLogger(__name__)
+
+
+def _build_controller():
+    # the controller pulls in the models and the vector store, so it is
+    # only imported and built when the first option needs it
+    started = time.perf_counter()
+    from src.controllers import ChatController
+
+    imported = time.perf_counter() - started
+    controller = ChatController()
+    if settings.STARTUP_REPORT:
+        logger.info(
+            "Startup report",
+            extra={
+                "imports_ms": round(imported * 1000),
+                **{
+                    f"{name}_ms": round(elapsed * 1000)
+                    for name, elapsed in Lazy.report().items()
+                },
+            },
+        )
+    return controller
+
+
+_controller = Lazy("controller", _build_controller)
 
 
 def home_view() -> None:
@@ -21,6 +48,8 @@ def options_view() -> bool:
     print("1. Carregar PDF")
     print("2. Listar PDFs carregados")
     print("3. Interagir com um PDF")
+    print("4. Resumir um PDF")
+    print("5. Remover todos os PDFs")
     print("0. Sair")
     choice = input("Escolha uma opção: ")
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -28,11 +57,10 @@ def options_view() -> bool:
     match choice:
         case '0':
             print("Saindo do ChatPDF. Até a próxima!")
-            controller.clear_session()
             return False
         case '1':
             pdf_path = input("Digite o caminho do arquivo PDF: ")
-            if controller.load_pdf(pdf_path):
+            if _controller.get().load_pdf(pdf_path):
                 print(f"PDF '{pdf_path}' carregado com sucesso!")
             else:
                 print(f"Falha ao carregar o PDF {pdf_path}")
@@ -41,7 +69,7 @@ def options_view() -> bool:
             os.system('cls' if os.name == 'nt' else 'clear')
             return True
         case '2':
-            pdfs = controller.list_pdf()
+            pdfs = _controller.get().list_pdf()
             if pdfs:
                 print("PDFs carregados:")
                 for pdf in pdfs:
@@ -53,8 +81,26 @@ def options_view() -> bool:
             return True
         case '3':
             message = input("Digite sua pergunta sobre os PDFs carregados: ")
-            response = controller.chat(message)
-            print(f"Resposta: {response}")
+            print("Resposta: ", end="", flush=True)
+            for chunk in _controller.get().chat_stream(message):
+                print(chunk, end="", flush=True)
+            print()
+            input("Pressione Enter para continuar...")
+            os.system('cls' if os.name == 'nt' else 'clear')
+            return True
+        case '4':
+            pdf_path = input("Digite o caminho do arquivo PDF: ")
+            summary = _controller.get().summarize_pdf(pdf_path)
+            if summary is not None:
+                print(f"Resumo:\n{summary}")
+            else:
+                print(f"Falha ao resumir o PDF {pdf_path}")
+            input("Pressione Enter para continuar...")
+            os.system('cls' if os.name == 'nt' else 'clear')
+            return True
+        case '5':
+            _controller.get().clear_session()
+            print("Todos os PDFs foram removidos.")
             input("Pressione Enter para continuar...")
             os.system('cls' if os.name == 'nt' else 'clear')
             return True